@@ -0,0 +1,384 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional, Dict, Any, List, Iterable, Tuple
+
+from mistralai import DocumentURLChunk
+from mistralai.models import OCRResponse
+from ocr_engine import OCREngine, merge_ocr_responses, covers_exact_pages
+from pdf_utils import count_pdf_pages, split_page_ranges, split_page_list, page_fingerprints
+from metrics import DocumentMetrics
+from job_journal import JobJournal
+
+
+class AsyncOCREngine(OCREngine):
+    """基于asyncio的Mistral OCR引擎，可在同一事件循环中并发处理大量PDF文件"""
+
+    def __init__(self, api_key: str, max_concurrency: int = 16, io_workers: int = 4, **kwargs):
+        """
+        初始化异步OCR引擎
+
+        Args:
+            api_key: Mistral API密钥
+            max_concurrency: 同时处理的PDF文件数上限
+            io_workers: 用于读取PDF和写入结果的线程数
+            **kwargs: 传递给OCREngine的其他参数
+        """
+        super().__init__(api_key, **kwargs)
+        self.max_concurrency = max_concurrency
+        self._io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="ocr-io")
+        # 流式接收在整个OCR请求期间占用一个线程，使用单独的线程池，避免挤占磁盘操作并限制并发文件数
+        self._stream_executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="ocr-stream")
+        self._semaphore = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """在当前事件循环中延迟创建并发信号量"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _call_api_async(self, func, *args, page_cost: int = 0, **kwargs):
+        """调用异步API方法，经过调度器限流和重试"""
+        if self.scheduler is not None:
+            return await self.scheduler.call_async(func, *args, page_cost=page_cost, **kwargs)
+        return await func(*args, **kwargs)
+
+    async def _run_io(self, func, *args):
+        """在IO线程池中执行阻塞的磁盘操作，避免阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_executor, func, *args)
+
+    async def process_pdf_async(self, pdf_path: str, output_dir: str, progress_callback: Optional[Callable[[str, float], None]] = None) -> Dict[str, Any]:
+        """
+        异步处理PDF文件，返回值与OCREngine.process_pdf一致
+
+        Args:
+            pdf_path: PDF文件路径
+            output_dir: 输出目录
+            progress_callback: 进度回调函数，接收状态消息和进度百分比
+
+        Returns:
+            处理结果信息的字典
+        """
+        async with self._get_semaphore():
+            return await self._process_pdf_async(pdf_path, output_dir, progress_callback)
+
+    async def _request_signed_url_async(self, file_id: str, doc_metrics: DocumentMetrics,
+                                        journal: Optional[JobJournal]) -> str:
+        """异步获取已上传文件的签名URL并记录到任务日志"""
+        with doc_metrics.stage("signed_url"):
+            signed_url = await self._call_api_async(self.client.files.get_signed_url_async,
+                                                    file_id=file_id, expiry=self.signed_url_expiry)
+        if journal:
+            journal.record_signed_url(signed_url.url, self.signed_url_expiry)
+        return signed_url.url
+
+    async def _get_document_url_async(self, pdf_file: Path, progress_callback: Optional[Callable[[str, float], None]],
+                                      doc_metrics: DocumentMetrics, journal: Optional[JobJournal]) -> str:
+        """_get_document_url的异步版本"""
+        if journal:
+            document_url = journal.signed_url()
+            if document_url:
+                return document_url
+
+            file_id = journal.uploaded_file_id()
+            if file_id:
+                try:
+                    return await self._request_signed_url_async(file_id, doc_metrics, journal)
+                except Exception as e:
+                    print(f"之前上传的文件已不可用，重新上传: {e}")
+
+        # 上传文件，以文件句柄分块流式发送，内存占用与文件大小无关
+        try:
+            with doc_metrics.stage("upload"), open(pdf_file, 'rb') as f:
+                uploaded_file = await self._call_api_async(
+                    self.client.files.upload_async,
+                    file={
+                        "file_name": pdf_file.stem,
+                        "content": f,
+                    },
+                    purpose="ocr",
+                )
+        except Exception as e:
+            raise Exception(f"上传PDF文件失败: {str(e)}")
+        doc_metrics.add("bytes_uploaded", pdf_file.stat().st_size)
+        if journal:
+            journal.record_upload(uploaded_file.id)
+
+        # 通知进度：上传完成
+        if progress_callback:
+            progress_callback("PDF上传完成，正在处理...", 0.3)
+
+        # 获取签名URL
+        try:
+            return await self._request_signed_url_async(uploaded_file.id, doc_metrics, journal)
+        except Exception as e:
+            raise Exception(f"获取签名URL失败: {str(e)}")
+
+    async def _run_remote_ocr_async(self, pdf_file: Path, progress_callback: Optional[Callable[[str, float], None]] = None,
+                                    doc_metrics: Optional[DocumentMetrics] = None,
+                                    journal: Optional[JobJournal] = None,
+                                    pages: Optional[List[int]] = None) -> OCRResponse:
+        """
+        异步上传PDF并调用OCR接口
+
+        Args:
+            pdf_file: PDF文件路径
+            progress_callback: 进度回调函数
+            doc_metrics: 文档指标，记录上传、签名URL和OCR阶段的耗时
+            journal: 任务日志，记录上传的文件、签名URL和已完成的分片
+            pages: 需要处理的页码列表（从0开始），为None时处理全部页面
+
+        Returns:
+            OCR响应对象
+        """
+        doc_metrics = doc_metrics or DocumentMetrics(str(pdf_file))
+        document_url = await self._get_document_url_async(pdf_file, progress_callback, doc_metrics, journal)
+
+        # 通知进度：开始OCR
+        if progress_callback:
+            progress_callback("正在进行OCR处理...", 0.5)
+
+        # 处理PDF，超过分片页数的文档切分后并发处理
+        page_count = 0
+        if pages is None and self._needs_page_count():
+            with doc_metrics.stage("read"):
+                page_count = await self._run_io(count_pdf_pages, str(pdf_file))
+        ocr_page_count = len(pages) if pages is not None else page_count
+        with doc_metrics.stage("ocr"):
+            if self.shard_pages and ocr_page_count > self.shard_pages:
+                pdf_response = await self._run_sharded_ocr_async(document_url, page_count, progress_callback, journal,
+                                                                 pages)
+            else:
+                try:
+                    pdf_response = await self._ocr_pages_async(document_url, pages, page_count=page_count)
+                except Exception as e:
+                    raise Exception(f"OCR处理失败: {str(e)}")
+        doc_metrics.add("pages", len(pdf_response.pages))
+
+        # 通知进度：OCR完成，保存结果
+        if progress_callback:
+            progress_callback("OCR处理完成，正在保存结果...", 0.8)
+
+        return pdf_response
+
+    async def _ocr_pages_async(self, document_url: str, pages: Optional[List[int]] = None, page_count: int = 0) -> OCRResponse:
+        """异步对文档（或其中的指定页）调用OCR接口"""
+        kwargs = {"pages": pages} if pages is not None else {}
+        return await self._call_api_async(
+            self.client.ocr.process_async,
+            document=DocumentURLChunk(document_url=document_url),
+            model=self.model,
+            include_image_base64=self.include_image_base64,
+            page_cost=len(pages) if pages is not None else page_count,
+            **kwargs
+        )
+
+    async def _run_sharded_ocr_async(self, document_url: str, page_count: int, progress_callback: Optional[Callable[[str, float], None]] = None,
+                                     journal: Optional[JobJournal] = None,
+                                     pages: Optional[List[int]] = None) -> OCRResponse:
+        """
+        按页码范围切分文档并发OCR，失败的分片单独重试，最后按页码顺序合并
+
+        Args:
+            document_url: 文档的签名URL
+            page_count: 文档总页数
+            progress_callback: 进度回调函数
+            journal: 任务日志，记录已完成的分片，之前完成的分片不再重复请求
+            pages: 只处理的页码列表，为None时处理全部页面
+
+        Returns:
+            合并后的OCR响应对象
+        """
+        if pages is None:
+            shards = split_page_ranges(page_count, self.shard_pages)
+        else:
+            shards = split_page_list(pages, self.shard_pages)
+        semaphore = asyncio.Semaphore(max(1, self.shard_workers))
+        responses = {}
+        errors = {}
+        if journal:
+            for i in range(len(shards)):
+                response = await self._run_io(journal.load_shard, i, shards)
+                if response is not None:
+                    responses[i] = response
+
+        async def run_shard(i: int):
+            async with semaphore:
+                try:
+                    responses[i] = await self._ocr_pages_async(document_url, shards[i])
+                    errors.pop(i, None)
+                except Exception as e:
+                    errors[i] = e
+                    return
+            if journal:
+                await self._run_io(journal.save_shard, i, shards, responses[i])
+
+            # 通知进度：OCR阶段按完成的分片比例推进
+            if progress_callback:
+                progress_callback(f"正在进行OCR处理（{len(responses)}/{len(shards)}）...",
+                                  0.5 + 0.3 * len(responses) / len(shards))
+
+        pending = [i for i in range(len(shards)) if i not in responses]
+        for attempt in range(self.shard_retries + 1):
+            await asyncio.gather(*(run_shard(i) for i in pending))
+            pending = sorted(errors)
+            if not pending:
+                break
+
+        if pending:
+            first = shards[pending[0]]
+            raise Exception(f"OCR处理失败: {len(pending)}个分片重试后仍失败，"
+                            f"第{first[0] + 1}-{first[-1] + 1}页: {str(errors[pending[0]])}")
+
+        return merge_ocr_responses([responses[i] for i in range(len(shards))])
+
+    async def _run_incremental_ocr_async(self, pdf_file: Path, output_dir: str, fingerprints: Optional[List[str]],
+                                         progress_callback: Optional[Callable[[str, float], None]],
+                                         doc_metrics: DocumentMetrics, journal: Optional[JobJournal]) -> OCRResponse:
+        """异步只OCR变化或新增的页，与复用的页按页码顺序拼接；没有可复用的结果时处理全部页面"""
+        with doc_metrics.stage("read"):
+            previous, changed = await self._run_io(self._reuse_previous_pages, fingerprints, output_dir, pdf_file.stem)
+        if previous is None:
+            return await self._run_remote_ocr_async(pdf_file, progress_callback, doc_metrics, journal)
+
+        if not changed:
+            doc_metrics.add("pages_reused", len(previous.pages))
+            return previous
+        if progress_callback:
+            progress_callback(f"复用上次结果中的{len(previous.pages)}页，重新处理{len(changed)}页...", 0.1)
+        fresh = await self._run_remote_ocr_async(pdf_file, progress_callback, doc_metrics, journal, changed)
+        if not covers_exact_pages(fresh, changed):
+            # 返回的页与请求的页不一致时拼接会重复或缺页，改为重新处理全部页面
+            print(f"{pdf_file.name} 按页重新处理的结果与请求的页不一致，改为处理全部页面")
+            return await self._run_remote_ocr_async(pdf_file, progress_callback, doc_metrics, journal)
+        doc_metrics.add("pages_reused", len(previous.pages))
+        return merge_ocr_responses([fresh, previous])
+
+    async def _process_pdf_async(self, pdf_path: str, output_dir: str, progress_callback: Optional[Callable[[str, float], None]] = None) -> Dict[str, Any]:
+        """process_pdf_async的具体实现，调用方负责并发控制"""
+        result = {
+            "success": False,
+            "message": "",
+            "output_file": "",
+            "output_dir": ""
+        }
+        doc_metrics = self._document_metrics(pdf_path)
+        journal = None
+
+        try:
+            # 确认PDF文件存在
+            pdf_file = Path(pdf_path)
+            if not pdf_file.is_file():
+                raise FileNotFoundError(f"PDF文件不存在: {pdf_path}")
+            output_dir = output_dir or f"ocr_results_{pdf_file.stem}"
+
+            # 通知进度：开始处理
+            if progress_callback:
+                progress_callback("正在准备PDF文件...", 0.1)
+
+            fingerprints = None
+            if self.incremental:
+                with doc_metrics.stage("read"):
+                    fingerprints = await self._run_io(page_fingerprints, str(pdf_file))
+
+            # 查询缓存，命中时直接保存结果，不发起任何网络请求
+            pdf_response = None
+            cache_key = None
+            if self.cache or self.journal_dir:
+                with doc_metrics.stage("read"):
+                    cache_key = await self._run_io(self.cache_key, pdf_path)
+                    if self.cache:
+                        pdf_response = await self._run_io(self.cache.get, cache_key)
+
+            # 之前的处理中断时，从任务日志中恢复已完成的阶段
+            journal = self._open_journal(cache_key, output_dir, pdf_file.stem)
+            output_file = None
+            if pdf_response is not None:
+                doc_metrics.add("cache_hits")
+                if progress_callback:
+                    progress_callback("命中OCR缓存，正在保存结果...", 0.8)
+            else:
+                if journal and journal.resumed:
+                    if progress_callback:
+                        progress_callback("发现未完成的处理记录，从中断处继续...", 0.1)
+                    pdf_response = await self._run_io(journal.load_response)
+
+                if pdf_response is None and self._can_stream():
+                    # 流式接收和逐页写入都是阻塞操作，整体在流式线程池中执行
+                    loop = asyncio.get_running_loop()
+                    output_file = await loop.run_in_executor(self._stream_executor, self._run_streaming_ocr, pdf_file,
+                                                             output_dir, progress_callback, None, doc_metrics, journal,
+                                                             fingerprints)
+                elif pdf_response is None:
+                    pdf_response = await self._run_incremental_ocr_async(pdf_file, output_dir, fingerprints,
+                                                                         progress_callback, doc_metrics, journal)
+                    # 启用缓存时OCR结果已保存在缓存中，任务日志不再重复保存
+                    if self.cache:
+                        await self._run_io(self.cache.put, cache_key, pdf_response)
+                    elif journal:
+                        await self._run_io(journal.save_response, pdf_response)
+
+            # 在线程池中保存结果，流式接收时已在接收过程中写入
+            if output_file is None:
+                with doc_metrics.stage("save"):
+                    output_file = await self._run_io(self.save_ocr_results, pdf_response, output_dir, pdf_file.stem,
+                                                     None, doc_metrics, journal, fingerprints)
+            if journal:
+                await self._run_io(journal.complete)
+
+            # 通知进度：处理完成
+            if progress_callback:
+                progress_callback("处理完成！", 1.0)
+
+            result["success"] = True
+            result["message"] = "PDF处理成功"
+            result["output_file"] = output_file
+            result["output_dir"] = output_dir
+
+        except FileNotFoundError as e:
+            result["message"] = str(e)
+        except Exception as e:
+            result["message"] = f"处理PDF时出错: {str(e)}"
+
+        result["metrics"] = doc_metrics.to_dict()
+        if self.metrics:
+            self.metrics.observe(doc_metrics, result)
+        return result
+
+    async def process_many(self, jobs: Iterable[Tuple[str, str]], on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        并发处理多个PDF文件，同时进行中的文件数不超过max_concurrency
+
+        Args:
+            jobs: (PDF文件路径, 输出目录) 元组的可迭代对象
+            on_result: 每个文件处理完成时的回调，接收PDF路径和结果字典
+
+        Returns:
+            处理结果列表，顺序与输入一致
+        """
+        async def run(pdf_path: str, output_dir: str) -> Dict[str, Any]:
+            result = await self.process_pdf_async(pdf_path, output_dir)
+            if on_result:
+                on_result(pdf_path, result)
+            return result
+
+        return await asyncio.gather(*(run(pdf_path, output_dir) for pdf_path, output_dir in jobs))
+
+    async def validate_connection_async(self) -> bool:
+        """
+        异步验证API连接是否有效
+
+        Returns:
+            连接有效返回True，否则返回False
+        """
+        try:
+            await self.client.models.list_async()
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        """关闭IO线程池和流式线程池"""
+        self._stream_executor.shutdown(wait=True)
+        self._io_executor.shutdown(wait=True)
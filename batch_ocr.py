@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mistral OCR 批量处理命令行工具
+无需图形界面，并发处理目录或通配符匹配到的所有PDF文件
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional
+
+from ocr_engine import OCREngine
+from ocr_cache import OCRCache
+from result_writer import TRANSCODE_FORMATS
+from pdf_utils import collect_pdf_files
+from request_scheduler import RequestScheduler
+from client_pool import get_registry
+from metrics import PipelineMetrics
+from search_index import SearchIndex, default_index_path
+
+
+def assign_output_dirs(pdf_files: List[Path], output_root: str) -> Dict[Path, str]:
+    """
+    为每个PDF分配独立的输出子目录，避免不同文档的图片互相覆盖
+
+    Args:
+        pdf_files: PDF文件路径列表
+        output_root: 输出根目录
+
+    Returns:
+        PDF路径到输出目录的映射
+    """
+    output_dirs = {}
+    used_names = {}
+    for pdf_file in pdf_files:
+        name = pdf_file.stem
+        count = used_names.get(name, 0) + 1
+        used_names[name] = count
+        if count > 1:
+            name = f"{name}_{count}"
+        output_dirs[pdf_file] = str(Path(output_root) / name)
+    return output_dirs
+
+
+def resolve_api_key(api_key: str = None) -> str:
+    """按命令行参数、环境变量、已保存配置的顺序获取API密钥"""
+    if api_key:
+        return api_key
+
+    env_key = os.environ.get("MISTRAL_API_KEY", "")
+    if env_key:
+        return env_key
+
+    from config_manager import ConfigManager
+    return ConfigManager().get_api_key()
+
+
+def process_one(engine: OCREngine, pdf_file: Path, output_dir: str,
+                cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """处理单个PDF并记录耗时"""
+    start = time.perf_counter()
+    try:
+        result = engine.process_pdf(str(pdf_file), output_dir, cancel_event=cancel_event)
+    except Exception as e:
+        result = {
+            "success": False,
+            "message": f"处理PDF时出错: {str(e)}",
+            "output_file": "",
+            "output_dir": output_dir
+        }
+    result["pdf_path"] = str(pdf_file)
+    result["duration"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(engine: OCREngine, pdf_files: List[Path], output_root: str,
+              workers: int = 4, quiet: bool = False) -> List[Dict[str, Any]]:
+    """
+    使用线程池并发处理PDF文件
+
+    Args:
+        engine: OCR引擎实例（可在多个线程间共享）
+        pdf_files: PDF文件路径列表
+        output_root: 输出根目录
+        workers: 并发工作线程数
+        quiet: 是否关闭逐个文件的进度输出
+
+    Returns:
+        每个文件的处理结果列表，顺序与输入一致
+    """
+    output_dirs = assign_output_dirs(pdf_files, output_root)
+    results = {}
+    total = len(pdf_files)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(process_one, engine, pdf_file, output_dirs[pdf_file]): pdf_file
+            for pdf_file in pdf_files
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            pdf_file = futures[future]
+            result = future.result()
+            results[pdf_file] = result
+            if not quiet:
+                status = "成功" if result["success"] else "失败"
+                line = f"[{done}/{total}] {status} {pdf_file.name} ({result['duration']:.1f}s)"
+                if not result["success"]:
+                    line += f" - {result['message']}"
+                print(line, flush=True)
+
+    return [results[pdf_file] for pdf_file in pdf_files]
+
+
+def run_batch_async(api_key: str, pdf_files: List[Path], output_root: str,
+                    workers: int = 4, quiet: bool = False,
+                    cache: OCRCache = None, **engine_options) -> List[Dict[str, Any]]:
+    """
+    使用异步OCR引擎在单个事件循环中并发处理PDF文件
+
+    Args:
+        api_key: Mistral API密钥
+        pdf_files: PDF文件路径列表
+        output_root: 输出根目录
+        workers: 同时处理的文件数上限
+        quiet: 是否关闭逐个文件的进度输出
+        cache: OCR结果缓存
+        **engine_options: 传递给AsyncOCREngine的其他参数
+
+    Returns:
+        每个文件的处理结果列表，顺序与输入一致
+    """
+    import asyncio
+    from async_ocr_engine import AsyncOCREngine
+
+    output_dirs = assign_output_dirs(pdf_files, output_root)
+    total = len(pdf_files)
+    done = 0
+
+    async def run_one(engine: AsyncOCREngine, pdf_file: Path) -> Dict[str, Any]:
+        nonlocal done
+        start = time.perf_counter()
+        result = await engine.process_pdf_async(str(pdf_file), output_dirs[pdf_file])
+        result["pdf_path"] = str(pdf_file)
+        result["duration"] = round(time.perf_counter() - start, 3)
+        done += 1
+        if not quiet:
+            status = "成功" if result["success"] else "失败"
+            line = f"[{done}/{total}] {status} {pdf_file.name} ({result['duration']:.1f}s)"
+            if not result["success"]:
+                line += f" - {result['message']}"
+            print(line, flush=True)
+        return result
+
+    async def run_all() -> List[Dict[str, Any]]:
+        engine = AsyncOCREngine(api_key, max_concurrency=max(1, workers), cache=cache, **engine_options)
+        try:
+            return await asyncio.gather(*(run_one(engine, pdf_file) for pdf_file in pdf_files))
+        finally:
+            engine.close()
+
+    return asyncio.run(run_all())
+
+
+def build_summary(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """汇总批量处理结果"""
+    succeeded = [r for r in results if r["success"]]
+    failed = [r for r in results if not r["success"]]
+    return {
+        "total": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(failed),
+        "elapsed": round(elapsed, 3),
+        "files": results,
+        "failures": [{"pdf_path": r["pdf_path"], "message": r["message"]} for r in failed]
+    }
+
+
+def print_summary(summary: Dict[str, Any]):
+    """打印汇总报告"""
+    print("=" * 50)
+    print(f"共 {summary['total']} 个文件，成功 {summary['succeeded']} 个，"
+          f"失败 {summary['failed']} 个，总耗时 {summary['elapsed']:.1f}s")
+    cache_stats = summary.get("cache")
+    if cache_stats:
+        print(f"缓存命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次，"
+              f"淘汰 {cache_stats['evictions']} 个条目")
+    scheduler_stats = summary.get("scheduler")
+    if scheduler_stats:
+        print(f"API请求 {scheduler_stats['requests']} 次，重试 {scheduler_stats['retries']} 次，"
+              f"限流等待 {scheduler_stats['throttle_wait_seconds']:.1f}s，"
+              f"退避等待 {scheduler_stats['backoff_wait_seconds']:.1f}s")
+    metrics = summary.get("metrics")
+    if metrics:
+        stages = "，".join(f"{name} {seconds:.1f}s" for name, seconds in metrics["stage_seconds"].items() if seconds)
+        if stages:
+            print(f"各阶段累计耗时: {stages}")
+        counters = metrics["counters"]
+        print(f"OCR {counters['pages']} 页，保存 {counters['images']} 张图片，"
+              f"上传 {counters['bytes_uploaded'] / 1024 / 1024:.1f}MB，写入 {counters['bytes_written'] / 1024 / 1024:.1f}MB")
+    if summary["failures"]:
+        print("失败列表:")
+        for failure in summary["failures"]:
+            print(f"  {failure['pdf_path']}: {failure['message']}")
+
+
+def add_engine_arguments(parser: argparse.ArgumentParser):
+    """添加OCR引擎、缓存、任务日志和指标相关的命令行参数（批量处理和监视目录共用）"""
+    parser.add_argument("--api-key", help="Mistral API密钥，默认读取MISTRAL_API_KEY环境变量或已保存的配置")
+    parser.add_argument("--shard-pages", type=int, help="页数超过该值的PDF按页码范围切分后并发OCR")
+    parser.add_argument("--shard-workers", type=int, default=4, help="每个PDF并发处理的分片数（默认4）")
+    parser.add_argument("--rpm", type=float, help="每分钟API请求数上限")
+    parser.add_argument("--ppm", type=float, help="每分钟OCR页数上限")
+    parser.add_argument("--max-retries", type=int, default=5, help="限流和服务端临时错误的最大重试次数（默认5）")
+    parser.add_argument("--cache-dir", help="OCR结果缓存目录，默认使用应用数据目录下的ocr_cache")
+    parser.add_argument("--cache-size", type=int, default=2048, help="缓存容量上限（MB，默认2048）")
+    parser.add_argument("--no-cache", action="store_true", help="禁用OCR结果缓存")
+    parser.add_argument("--journal-dir", help="任务日志目录，默认使用应用数据目录下的journal")
+    parser.add_argument("--no-journal", action="store_true", help="不记录任务日志，中断后需要从头处理")
+    parser.add_argument("--no-images", action="store_true",
+                        help="不请求图片数据，只保存Markdown（响应更小、写入更快）")
+    parser.add_argument("--image-format", choices=sorted(TRANSCODE_FORMATS),
+                        help="将图片转码为指定格式以减小磁盘占用（需要Pillow），默认按原格式保存")
+    parser.add_argument("--image-quality", type=int, default=80, help="图片转码的压缩质量（1-100，默认80）")
+    parser.add_argument("--incremental", action="store_true",
+                        help="按页增量处理：与上次保存的原始结果比较页面指纹，只OCR变化或新增的页（需要pypdf，隐含--keep-raw）")
+    parser.add_argument("--keep-raw", action="store_true",
+                        help="在结果旁保存OCR原始结果（<PDF名称>.ocr），之后可用raw_store.py离线重新生成")
+    parser.add_argument("--page-index", action="store_true",
+                        help="在结果旁写入页索引（<PDF名称>.index.json），记录每页在Markdown中的字节偏移和引用的图片")
+    parser.add_argument("--stream", action="store_true",
+                        help="流式接收OCR响应，每页接收完整后立即写入，内存占用与文档大小无关"
+                             "（结果不写入缓存，与--shard-pages或--incremental同时使用时不生效）")
+    parser.add_argument("--search-index", nargs="?", const="", metavar="DB",
+                        help="保存后按页更新全文搜索索引，不指定路径时使用应用数据目录下的search_index.db")
+    parser.add_argument("--metrics-log", help="将各阶段耗时等事件以JSON Lines格式追加到指定文件")
+    parser.add_argument("--metrics-port", type=int, help="在指定端口的 /metrics 路径提供Prometheus格式的指标")
+
+
+def prepare_engine(args) -> Optional[Dict[str, Any]]:
+    """
+    根据add_engine_arguments添加的参数准备API密钥、输出目录、缓存、调度器和指标
+
+    Args:
+        args: 解析后的命令行参数，还需包含output_dir和workers
+
+    Returns:
+        包含api_key、output_root、cache、scheduler、metrics和engine_options（传给OCR引擎的其他参数）的字典，
+        参数有误时输出原因并返回None
+    """
+    api_key = resolve_api_key(args.api_key)
+    if not api_key:
+        print("未找到API密钥，请使用 --api-key 参数或设置 MISTRAL_API_KEY 环境变量", file=sys.stderr)
+        return None
+
+    if args.image_format:
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            print("图片转码需要安装Pillow: pip install pillow", file=sys.stderr)
+            return None
+
+    if args.incremental:
+        try:
+            import pypdf  # noqa: F401
+        except ImportError:
+            print("按页增量处理需要安装pypdf: pip install pypdf", file=sys.stderr)
+            return None
+
+    output_root = args.output_dir
+    cache_dir = args.cache_dir
+    journal_dir = None if args.no_journal else args.journal_dir
+    if not output_root or (not cache_dir and not args.no_cache) or (not journal_dir and not args.no_journal):
+        from config_manager import ConfigManager
+        config_manager = ConfigManager()
+        output_root = output_root or config_manager.get_output_dir()
+        cache_dir = cache_dir or config_manager.get_cache_dir()
+        if not args.no_journal:
+            journal_dir = journal_dir or config_manager.get_journal_dir()
+
+    cache = None
+    if not args.no_cache:
+        cache = OCRCache(cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+
+    # 连接池大小与最大并发请求数一致，保证每个请求都能复用长连接
+    get_registry().set_pool_size(args.workers * max(1, args.shard_workers if args.shard_pages else 1))
+
+    scheduler = RequestScheduler(requests_per_minute=args.rpm, pages_per_minute=args.ppm,
+                                 max_retries=args.max_retries)
+    metrics = PipelineMetrics(args.metrics_log)
+    search_index = None
+    if args.search_index is not None:
+        search_index = SearchIndex(args.search_index or default_index_path())
+    engine_options = {"shard_pages": args.shard_pages, "shard_workers": args.shard_workers,
+                      "scheduler": scheduler, "metrics": metrics, "journal_dir": journal_dir,
+                      "keep_raw": args.keep_raw, "include_image_base64": not args.no_images,
+                      "image_format": args.image_format, "image_quality": args.image_quality,
+                      "incremental": args.incremental, "page_index": args.page_index,
+                      "search_index": search_index, "stream_response": args.stream}
+    return {"api_key": api_key, "output_root": output_root, "cache": cache, "scheduler": scheduler,
+            "metrics": metrics, "engine_options": engine_options}
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Mistral OCR 批量处理工具")
+    parser.add_argument("inputs", nargs="+", help="PDF文件、目录或通配符（如 'scans/**/*.pdf'）")
+    parser.add_argument("-o", "--output-dir", help="输出根目录，默认使用已保存的输出目录")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="并发处理的文件数（默认4）")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="使用异步引擎在单个事件循环中处理，适合大量并发")
+    add_engine_arguments(parser)
+    parser.add_argument("--report", help="将汇总报告以JSON格式写入指定文件")
+    parser.add_argument("--no-recursive", action="store_true", help="不递归搜索子目录")
+    parser.add_argument("-q", "--quiet", action="store_true", help="只输出汇总报告")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """命令行入口函数，全部成功返回0，否则返回1"""
+    args = parse_args(argv)
+
+    pdf_files = collect_pdf_files(args.inputs, recursive=not args.no_recursive)
+    if not pdf_files:
+        print("未找到任何PDF文件", file=sys.stderr)
+        return 1
+
+    setup = prepare_engine(args)
+    if setup is None:
+        return 1
+    api_key, output_root, cache = setup["api_key"], setup["output_root"], setup["cache"]
+    scheduler, metrics, engine_options = setup["scheduler"], setup["metrics"], setup["engine_options"]
+    metrics_server = metrics.serve(args.metrics_port) if args.metrics_port else None
+
+    start = time.perf_counter()
+    if args.use_async:
+        results = run_batch_async(api_key, pdf_files, output_root, workers=args.workers,
+                                  quiet=args.quiet, cache=cache, **engine_options)
+    else:
+        engine = OCREngine(api_key, cache=cache, **engine_options)
+        results = run_batch(engine, pdf_files, output_root, workers=args.workers, quiet=args.quiet)
+    summary = build_summary(results, time.perf_counter() - start)
+    if cache:
+        summary["cache"] = cache.stats()
+    summary["scheduler"] = scheduler.metrics()
+    summary["metrics"] = metrics.snapshot()
+    if metrics_server:
+        metrics_server.shutdown()
+    metrics.close()
+
+    print_summary(summary)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
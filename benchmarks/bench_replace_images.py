@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+图片引用替换性能测试
+在包含大量图片的模拟页面上，对比逐个str.replace的原有实现与单次扫描实现的耗时，
+并在随机生成的页面上校验两者输出完全一致
+
+用法:
+    python benchmarks/bench_replace_images.py --images 500 --cases 2000
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from result_writer import replace_images_in_markdown
+
+
+def legacy_replace(markdown_str: str, images_dict: dict) -> str:
+    """原有实现：每张图片对整页Markdown做一次str.replace"""
+    for img_name, img_path in images_dict.items():
+        markdown_str = markdown_str.replace(f"![{img_name}]({img_name})", f"![{img_name}]({img_path})")
+    return markdown_str
+
+
+def build_page(images: int, text_bytes: int, rng: random.Random):
+    """构造一页带大量图片引用的Markdown和对应的图片映射"""
+    filler = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. "
+    parts = []
+    images_dict = {}
+    for i in range(images):
+        img_id = f"img-{i}.jpeg"
+        images_dict[img_id] = f"images/{img_id}.png"
+        parts.append(filler * (text_bytes // len(filler) // max(1, images) + 1))
+        parts.append(f"![{img_id}]({img_id})")
+    return "\n\n".join(parts), images_dict
+
+
+def random_case(rng: random.Random):
+    """生成包含各种边界情况的随机页面：重复引用、名称不匹配、未知图片、嵌套括号等"""
+    count = rng.randint(0, 300)
+    ids = [f"img-{i}.{rng.choice(['jpeg', 'png'])}" for i in range(count)]
+    images_dict = {img_id: f"images/{img_id}.png" for img_id in ids if rng.random() < 0.9}
+    tokens = []
+    for _ in range(rng.randint(0, 400)):
+        img_id = rng.choice(ids) if ids else "img-x.jpeg"
+        other = rng.choice(ids) if ids else "img-y.jpeg"
+        tokens.append(rng.choice([
+            f"![{img_id}]({img_id})",
+            f"![{img_id}]({other})",
+            f"![{img_id}]({img_id}",
+            f"[{img_id}]({img_id})",
+            f"![![{img_id}]({img_id})]({img_id})",
+            "![]()",
+            f"![{img_id}](images/{img_id}.png)",
+            "plain text with (parens) and [brackets]",
+            "\n",
+            "!",
+        ]))
+    return "".join(tokens), images_dict
+
+
+def check_equivalence(cases: int, seed: int) -> int:
+    """在随机页面上比较两种实现，返回不一致的用例数"""
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(cases):
+        markdown_str, images_dict = random_case(rng)
+        if legacy_replace(markdown_str, images_dict) != replace_images_in_markdown(markdown_str, images_dict):
+            mismatches += 1
+    return mismatches
+
+
+def timeit(func, markdown_str: str, images_dict: dict, repeat: int) -> float:
+    """返回多次执行中的最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(markdown_str, images_dict)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图片引用替换性能测试")
+    parser.add_argument("--images", type=int, nargs="+", default=[10, 100, 500, 1000], help="每页图片数")
+    parser.add_argument("--text-bytes", type=int, default=50000, help="每页正文的字节数")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cases", type=int, default=2000, help="随机一致性校验的用例数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'图片数':<8}{'legacy(ms)':>12}{'single-pass(ms)':>18}{'加速比':>10}")
+    for images in args.images:
+        markdown_str, images_dict = build_page(images, args.text_bytes, rng)
+        assert legacy_replace(markdown_str, images_dict) == replace_images_in_markdown(markdown_str, images_dict)
+        legacy = timeit(legacy_replace, markdown_str, images_dict, args.repeat)
+        single = timeit(replace_images_in_markdown, markdown_str, images_dict, args.repeat)
+        print(f"{images:<8}{legacy * 1000:>12.2f}{single * 1000:>18.2f}{legacy / single:>10.1f}x")
+
+    mismatches = check_equivalence(args.cases, args.seed)
+    print(f"随机一致性校验: {args.cases} 个用例，{mismatches} 个不一致")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+OCR结果写入性能测试
+对比原有的逐个写入实现与ResultWriter流式写入在大规模响应下的耗时和峰值内存
+
+用法:
+    python benchmarks/bench_save_results.py --pages 1000 --images 5000
+"""
+
+import os
+import sys
+import time
+import base64
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from result_writer import (ResultWriter, replace_images_in_markdown, data_url_mime, detect_image_extension,
+                           image_file_name)
+
+
+def build_response(pages: int, images: int, image_bytes: int, text_bytes: int):
+    """构造与OCRResponse结构相同的模拟响应，图片平均分配到各页"""
+    payload = "data:image/jpeg;base64," + base64.b64encode(os.urandom(image_bytes)).decode()
+    text = ("Lorem ipsum dolor sit amet. " * (text_bytes // 28 + 1))[:text_bytes]
+    result_pages = []
+    img_index = 0
+    for index in range(pages):
+        count = images // pages + (1 if index < images % pages else 0)
+        page_images = []
+        for _ in range(count):
+            page_images.append(SimpleNamespace(id=f"img-{img_index}.jpeg", image_base64=payload))
+            img_index += 1
+        refs = "\n".join(f"![{img.id}]({img.id})" for img in page_images)
+        result_pages.append(SimpleNamespace(index=index, markdown=f"# Page {index}\n\n{text}\n\n{refs}", images=page_images))
+    return SimpleNamespace(pages=result_pages)
+
+
+def legacy_save(ocr_response, output_dir: str, pdf_name: str) -> str:
+    """原有实现：串行解码和写入图片，最后一次性拼接全部Markdown（图片扩展名与ResultWriter规则相同）"""
+    output_dir = Path(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    images_dir = output_dir / "images"
+    os.makedirs(images_dir, exist_ok=True)
+
+    all_markdowns = []
+    for page in ocr_response.pages:
+        page_images = {}
+        for img in page.images:
+            img_data = base64.b64decode(img.image_base64.split(',')[1])
+            file_name = image_file_name(img.id, detect_image_extension(img_data, data_url_mime(img.image_base64)))
+            with open(images_dir / file_name, 'wb') as f:
+                f.write(img_data)
+            page_images[img.id] = f"images/{file_name}"
+        all_markdowns.append(replace_images_in_markdown(page.markdown, page_images))
+
+    md_file_path = output_dir / f"{pdf_name}.md"
+    with open(md_file_path, 'w', encoding='utf-8') as f:
+        f.write("\n\n".join(all_markdowns))
+    return str(md_file_path)
+
+
+def streaming_save(ocr_response, output_dir: str, pdf_name: str, image_workers: int) -> str:
+    """ResultWriter实现"""
+    with ResultWriter(output_dir, pdf_name, image_workers=image_workers) as writer:
+        for page in ocr_response.pages:
+            writer.write_page(page)
+    return str(writer.md_file_path)
+
+
+def measure(func, *args):
+    """返回函数的耗时（秒）和执行期间新增的峰值内存（字节）"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR结果写入性能测试")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--images", type=int, default=5000)
+    parser.add_argument("--image-bytes", type=int, default=20000, help="每张图片解码后的字节数")
+    parser.add_argument("--text-bytes", type=int, default=3000, help="每页正文的字节数")
+    parser.add_argument("--image-workers", type=int, default=4)
+    args = parser.parse_args()
+
+    response = build_response(args.pages, args.images, args.image_bytes, args.text_bytes)
+    print(f"{args.pages} 页，{args.images} 张图片，每张 {args.image_bytes} 字节")
+
+    work_dir = tempfile.mkdtemp(prefix="bench_save_")
+    try:
+        legacy_dir = os.path.join(work_dir, "legacy")
+        streaming_dir = os.path.join(work_dir, "streaming")
+        legacy = measure(legacy_save, response, legacy_dir, "bench")
+        streaming = measure(streaming_save, response, streaming_dir, "bench", args.image_workers)
+
+        with open(os.path.join(legacy_dir, "bench.md"), 'rb') as a, open(os.path.join(streaming_dir, "bench.md"), 'rb') as b:
+            identical = a.read() == b.read()
+        identical = identical and (sorted(os.listdir(os.path.join(legacy_dir, "images"))) ==
+                                   sorted(os.listdir(os.path.join(streaming_dir, "images"))))
+
+        print(f"{'实现':<12}{'耗时(s)':>10}{'峰值内存(MB)':>16}")
+        for name, (elapsed, peak) in (("legacy", legacy), ("streaming", streaming)):
+            print(f"{name:<12}{elapsed:>10.3f}{peak / 1024 / 1024:>16.1f}")
+        print(f"Markdown和图片输出一致: {identical}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # 输出不一致时以非零状态退出，避免等价性检查失效后无人察觉
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
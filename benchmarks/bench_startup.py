@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+启动时间测试
+统计导入main_window的各模块耗时，并在子进程中测量从解释器启动到主窗口首次显示的时间
+
+用法:
+    python benchmarks/bench_startup.py --offscreen --repeat 5 --max-seconds 1.5
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import subprocess
+import statistics
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 启动阶段不应加载的重量级模块
+HEAVY_MODULES = ("mistralai", "cryptography", "httpx", "pypdf", "ocr_engine", "client_pool")
+
+# 在子进程中执行：创建应用和主窗口，事件循环处理完首次显示后输出耗时和已加载的重量级模块
+FIRST_WINDOW_SCRIPT = r"""
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QTimer
+app = QApplication([])
+from main_window import MainWindow
+window = MainWindow()
+window.show()
+# 窗口显示前已导入的模块；密钥解密等延后任务在之后执行，不计入
+loaded = sorted(name for name in json.loads(sys.argv[2]) if name in sys.modules)
+
+def report():
+    print(json.dumps({"seconds": time.perf_counter() - start, "loaded": loaded}))
+    app.quit()
+
+QTimer.singleShot(0, report)
+app.exec()
+"""
+
+
+def child_env(offscreen: bool, home: str = None) -> dict:
+    """子进程环境变量"""
+    env = dict(os.environ)
+    if offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+    if home:
+        # 使用全新的配置目录，模拟首次启动
+        env["HOME"] = home
+        env["APPDATA"] = home
+    return env
+
+
+def import_breakdown(top: int) -> list:
+    """
+    解析python -X importtime的输出，返回累计耗时最多的模块
+
+    Returns:
+        (累计微秒, 模块名)列表，按耗时降序
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main_window"],
+        cwd=str(ROOT), capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "导入main_window失败")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue
+        rows.append((cumulative, parts[2].strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def first_window(offscreen: bool, fresh_profile: bool) -> dict:
+    """在新进程中测量到主窗口首次显示的时间"""
+    home = tempfile.mkdtemp(prefix="bench_startup_") if fresh_profile else None
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-c", FIRST_WINDOW_SCRIPT, str(ROOT), json.dumps(HEAVY_MODULES)],
+            cwd=str(ROOT), capture_output=True, text=True, env=child_env(offscreen, home)
+        )
+    finally:
+        if home:
+            shutil.rmtree(home, ignore_errors=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip() or "启动主窗口失败")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动时间测试")
+    parser.add_argument("--repeat", type=int, default=5, help="测量首次显示时间的次数")
+    parser.add_argument("--top", type=int, default=15, help="显示导入耗时最多的模块数")
+    parser.add_argument("--offscreen", action="store_true", help="使用offscreen平台，无需显示器")
+    parser.add_argument("--fresh-profile", action="store_true", help="每次使用全新的配置目录（首次启动）")
+    parser.add_argument("--max-seconds", type=float, help="首次显示时间中位数的上限，超出时返回非零退出码")
+    args = parser.parse_args()
+
+    print("导入耗时（累计，毫秒）:")
+    for cumulative, name in import_breakdown(args.top):
+        print(f"  {cumulative / 1000:>8.1f}  {name}")
+
+    samples = []
+    loaded = set()
+    for _ in range(args.repeat):
+        result = first_window(args.offscreen, args.fresh_profile)
+        samples.append(result["seconds"])
+        loaded.update(result["loaded"])
+
+    median = statistics.median(samples)
+    print(f"\n主窗口首次显示: 中位数 {median:.3f}s，最小 {min(samples):.3f}s，最大 {max(samples):.3f}s（{args.repeat} 次）")
+    print(f"启动时已加载的重量级模块: {', '.join(sorted(loaded)) or '无'}")
+
+    failed = False
+    if loaded:
+        print("警告: 重量级模块应在首次使用时才导入")
+        failed = True
+    if args.max_seconds is not None and median > args.max_seconds:
+        print(f"启动时间超过上限 {args.max_seconds:.3f}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
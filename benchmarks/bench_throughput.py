@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+OCR吞吐量测试
+启动本地模拟OCR服务，用OCREngine.process_pdf并发处理生成的PDF，
+统计每分钟文档数、每秒页数、延迟分位数和峰值内存，不消耗API额度
+
+用法:
+    python benchmarks/bench_throughput.py --docs 50 --pages 20 --workers 4
+    python benchmarks/bench_throughput.py --docs 20 --pages 200 --shard-pages 50 --error-rate 0.05
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_server import MockOCRServer
+from ocr_engine import OCREngine
+from request_scheduler import RequestScheduler
+from client_pool import get_registry
+
+
+def write_pdf(path: str, pages: int, page_bytes: int = 0):
+    """生成指定页数的最简PDF，page_bytes为每页内容流的填充字节数"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    for i in range(pages):
+        content = f"BT /F1 12 Tf 72 720 Td (Page {i + 1}) Tj ET\n".encode() + b"%" * page_bytes
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R >>".encode())
+        objects.append(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """按最近秩法计算分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class BenchEngine(OCREngine):
+    """记录保存结果耗时的OCR引擎"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.save_seconds = []
+        self._save_lock = threading.Lock()
+
+    def save_ocr_results(self, *args, **kwargs) -> str:
+        start = time.perf_counter()
+        try:
+            return super().save_ocr_results(*args, **kwargs)
+        finally:
+            with self._save_lock:
+                self.save_seconds.append(time.perf_counter() - start)
+
+
+def run(args, work_dir: str) -> dict:
+    """生成输入、启动模拟服务并处理所有文档，返回统计结果"""
+    input_dir = os.path.join(work_dir, "input")
+    output_dir = os.path.join(work_dir, "output")
+    os.makedirs(input_dir)
+    pdf_files = []
+    for i in range(args.docs):
+        pdf_path = os.path.join(input_dir, f"doc_{i:04d}.pdf")
+        write_pdf(pdf_path, args.pages, args.page_bytes)
+        pdf_files.append(pdf_path)
+
+    server = MockOCRServer(
+        latency=args.latency, page_latency=args.page_latency, upload_latency=args.upload_latency,
+        images_per_page=args.images_per_page, image_bytes=args.image_bytes, text_bytes=args.text_bytes,
+        error_rate=args.error_rate, retry_after=args.retry_after, seed=args.seed
+    )
+    get_registry().set_pool_size(args.workers * max(1, args.shard_workers) + 4)
+    scheduler = RequestScheduler(max_retries=args.max_retries, base_delay=args.base_delay)
+    engine = BenchEngine(
+        "mock-api-key", server_url=server.url, scheduler=scheduler, shard_pages=args.shard_pages,
+        shard_workers=args.shard_workers, image_workers=args.image_workers, stream_response=args.stream
+    )
+
+    latencies = []
+    failures = []
+    wrong_pages = []
+    lock = threading.Lock()
+
+    def process(pdf_path: str):
+        start = time.perf_counter()
+        result = engine.process_pdf(pdf_path, os.path.join(output_dir, Path(pdf_path).stem))
+        elapsed = time.perf_counter() - start
+        with lock:
+            if result["success"]:
+                latencies.append(elapsed)
+                # 分片时每个请求只应返回本分片的页，写入的页数必须与文档页数一致
+                pages = result["metrics"]["counters"].get("pages", 0)
+                if pages != args.pages:
+                    wrong_pages.append(f"{Path(pdf_path).name}: 写入 {pages} 页，应为 {args.pages} 页")
+            else:
+                failures.append(result["message"])
+
+    with server:
+        if args.tracemalloc:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(process, pdf_files))
+        wall = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+        if args.tracemalloc:
+            tracemalloc.stop()
+
+    succeeded = len(latencies)
+    return {
+        "docs": args.docs,
+        "succeeded": succeeded,
+        "failed": len(failures),
+        "wall_seconds": round(wall, 3),
+        "docs_per_minute": round(succeeded / wall * 60, 2) if wall else 0.0,
+        "pages_per_second": round(succeeded * args.pages / wall, 2) if wall else 0.0,
+        "latency_p50": round(percentile(latencies, 50), 3),
+        "latency_p95": round(percentile(latencies, 95), 3),
+        "save_p50": round(percentile(engine.save_seconds, 50), 3),
+        "save_p95": round(percentile(engine.save_seconds, 95), 3),
+        "peak_memory_mb": round(peak / 1024 / 1024, 1) if peak is not None else None,
+        "server": dict(server.stats),
+        "scheduler": scheduler.metrics(),
+        "errors": failures[:5],
+        "page_count_errors": wrong_pages[:5]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR吞吐量测试（本地模拟服务）")
+    parser.add_argument("--docs", type=int, default=20, help="处理的文档数")
+    parser.add_argument("--pages", type=int, default=10, help="每个文档的页数")
+    parser.add_argument("--page-bytes", type=int, default=0, help="生成的PDF每页填充字节数，用于模拟上传大小")
+    parser.add_argument("--workers", type=int, default=4, help="同时处理的文档数")
+    parser.add_argument("--shard-pages", type=int, help="分片页数")
+    parser.add_argument("--shard-workers", type=int, default=4)
+    parser.add_argument("--image-workers", type=int, default=4)
+    parser.add_argument("--stream", action="store_true", help="流式接收OCR响应并逐页写入（不统计单独的保存耗时）")
+    parser.add_argument("--latency", type=float, default=0.2, help="每次OCR请求的固定延迟（秒）")
+    parser.add_argument("--page-latency", type=float, default=0.02, help="OCR请求每页增加的延迟（秒）")
+    parser.add_argument("--upload-latency", type=float, default=0.05, help="上传和签名URL请求的延迟（秒）")
+    parser.add_argument("--images-per-page", type=int, default=1)
+    parser.add_argument("--image-bytes", type=int, default=20000, help="每张图片解码后的字节数")
+    parser.add_argument("--text-bytes", type=int, default=3000, help="每页正文的字节数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="请求随机失败的概率（0-1）")
+    parser.add_argument("--retry-after", type=float, help="失败响应的Retry-After秒数")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--base-delay", type=float, default=0.1, help="重试退避的初始等待秒数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false",
+                        help="不统计峰值内存（tracemalloc会降低速度）")
+    parser.add_argument("--json", help="将结果写入JSON文件，便于对比不同版本")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_throughput_")
+    try:
+        stats = run(args, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{args.docs} 个文档 × {args.pages} 页，{args.workers} 个并发，耗时 {stats['wall_seconds']:.2f}s")
+    print(f"成功 {stats['succeeded']}，失败 {stats['failed']}")
+    print(f"吞吐量: {stats['docs_per_minute']:.1f} 文档/分钟，{stats['pages_per_second']:.1f} 页/秒")
+    print(f"文档延迟: p50 {stats['latency_p50']:.3f}s，p95 {stats['latency_p95']:.3f}s")
+    print(f"保存结果: p50 {stats['save_p50']:.3f}s，p95 {stats['save_p95']:.3f}s")
+    if stats["peak_memory_mb"] is not None:
+        print(f"峰值内存: {stats['peak_memory_mb']:.1f} MB")
+    print(f"模拟服务: {json.dumps(stats['server'], ensure_ascii=False)}")
+    print(f"调度器: {json.dumps(stats['scheduler'], ensure_ascii=False)}")
+    for message in stats["errors"]:
+        print(f"  失败: {message}")
+    for message in stats["page_count_errors"]:
+        print(f"  页数错误: {message}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+
+    sys.exit(1 if stats["failed"] or stats["page_count_errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
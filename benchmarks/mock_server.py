@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本地模拟OCR服务
+模拟Mistral API的文件上传、签名URL和OCR接口，可配置延迟、页数、图片大小和错误率，
+用于在不消耗API额度的情况下测量吞吐量
+
+用法:
+    python benchmarks/mock_server.py --port 8765 --latency 0.5 --error-rate 0.05
+    然后以 server_url="http://127.0.0.1:8765" 创建OCREngine
+"""
+
+import os
+import re
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict
+from urllib.parse import urlparse
+
+# 统计上传文件页数的模式，匹配 /Type /Page 但不匹配 /Type /Pages
+_PAGE_PATTERN = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_DOCUMENT_URL_PATTERN = re.compile(r"/files/([^/]+)/content")
+
+
+class MockOCRServer:
+    """模拟OCR服务，在后台线程中运行HTTP服务"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.2,
+                 page_latency: float = 0.02, upload_latency: float = 0.05, pages: Optional[int] = None,
+                 images_per_page: int = 1, image_bytes: int = 20000, text_bytes: int = 3000,
+                 error_rate: float = 0.0, error_status: int = 503, retry_after: Optional[float] = None,
+                 seed: Optional[int] = None):
+        """
+        初始化模拟服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口，为0时自动分配
+            latency: 每次OCR请求的固定延迟（秒）
+            page_latency: OCR请求每页增加的延迟（秒）
+            upload_latency: 上传和签名URL请求的延迟（秒）
+            pages: 每个文档的页数，为None时按上传的PDF内容统计
+            images_per_page: 每页返回的图片数
+            image_bytes: 每张图片解码后的字节数
+            text_bytes: 每页Markdown正文的字节数
+            error_rate: 请求随机失败的概率（0-1）
+            error_status: 随机失败时返回的HTTP状态码
+            retry_after: 随机失败时返回的Retry-After秒数，为None时不返回该头
+            seed: 随机数种子，用于复现错误序列
+        """
+        self.latency = latency
+        self.page_latency = page_latency
+        self.upload_latency = upload_latency
+        self.pages = pages
+        self.images_per_page = images_per_page
+        self.text_bytes = text_bytes
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._files: Dict[str, int] = {}
+        self._next_file_id = 1
+        self.stats = {
+            "uploads": 0,
+            "signed_urls": 0,
+            "ocr_requests": 0,
+            "pages": 0,
+            "errors": 0,
+            "bytes_received": 0,
+            "bytes_sent": 0
+        }
+
+        # 所有图片共用同一份数据，避免生成响应本身成为瓶颈
+        self._image_base64 = "data:image/jpeg;base64," + base64.b64encode(os.urandom(image_bytes)).decode()
+        self._text = ("Lorem ipsum dolor sit amet. " * (text_bytes // 28 + 1))[:text_bytes]
+
+        handler = type("Handler", (_MockHandler,), {"server_state": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """服务地址，可直接作为OCREngine的server_url"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockOCRServer":
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-ocr-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def record(self, key: str, value: int = 1):
+        """累加统计数据"""
+        with self._lock:
+            self.stats[key] += value
+
+    def should_fail(self) -> bool:
+        """按错误率决定本次请求是否失败"""
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.stats["errors"] += 1
+        return failed
+
+    def add_file(self, data: bytes) -> str:
+        """保存上传文件的页数，返回文件ID"""
+        page_count = self.pages or sum(1 for _ in _PAGE_PATTERN.finditer(data)) or 1
+        with self._lock:
+            file_id = f"mock-{self._next_file_id}"
+            self._next_file_id += 1
+            self._files[file_id] = page_count
+            self.stats["uploads"] += 1
+            self.stats["bytes_received"] += len(data)
+        return file_id
+
+    def page_count(self, document_url: str) -> int:
+        """签名URL对应文档的页数"""
+        match = _DOCUMENT_URL_PATTERN.search(document_url)
+        with self._lock:
+            count = self._files.get(match.group(1)) if match else None
+        return count or self.pages or 1
+
+    def build_page(self, index: int, include_images: bool) -> dict:
+        """构造单页OCR结果"""
+        images = []
+        for i in range(self.images_per_page):
+            images.append({
+                "id": f"img-{index}-{i}.jpeg",
+                "top_left_x": 0,
+                "top_left_y": 0,
+                "bottom_right_x": 100,
+                "bottom_right_y": 100,
+                "image_base64": self._image_base64 if include_images else None
+            })
+        refs = "\n".join(f"![{img['id']}]({img['id']})" for img in images)
+        return {
+            "index": index,
+            "markdown": f"# Page {index + 1}\n\n{self._text}\n\n{refs}",
+            "images": images,
+            "dimensions": {"dpi": 200, "height": 2200, "width": 1700}
+        }
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    """处理模拟API请求"""
+
+    server_state: MockOCRServer = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    # 跳过结尾的trailer
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server_state.record("bytes_sent", len(body))
+
+    def _maybe_fail(self) -> bool:
+        """按错误率返回错误响应"""
+        state = self.server_state
+        if not state.should_fail():
+            return False
+        headers = {"Retry-After": f"{state.retry_after:g}"} if state.retry_after is not None else None
+        self._send_json(state.error_status, {"object": "error", "message": "mock error", "type": "mock_error"}, headers)
+        return True
+
+    def do_GET(self):
+        state = self.server_state
+        path = urlparse(self.path).path
+
+        if path == "/v1/models":
+            self._send_json(200, {"object": "list", "data": []})
+            return
+
+        match = re.fullmatch(r"/v1/files/([^/]+)/url", path)
+        if match:
+            time.sleep(state.upload_latency)
+            if self._maybe_fail():
+                return
+            state.record("signed_urls")
+            self._send_json(200, {"url": f"{state.url}/files/{match.group(1)}/content"})
+            return
+
+        self._send_json(404, {"object": "error", "message": f"unknown path {path}"})
+
+    def do_POST(self):
+        state = self.server_state
+        path = urlparse(self.path).path
+        body = self._read_body()
+
+        if path == "/v1/files":
+            time.sleep(state.upload_latency)
+            if self._maybe_fail():
+                return
+            file_id = state.add_file(body)
+            self._send_json(200, {
+                "id": file_id,
+                "object": "file",
+                "bytes": len(body),
+                "created_at": int(time.time()),
+                "filename": "upload.pdf",
+                "purpose": "ocr",
+                "sample_type": "ocr_input",
+                "source": "upload"
+            })
+            return
+
+        if path == "/v1/ocr":
+            request = json.loads(body or b"{}")
+            document_url = (request.get("document") or {}).get("document_url", "")
+            pages = request.get("pages")
+            if pages is None:
+                pages = list(range(state.page_count(document_url)))
+
+            time.sleep(state.latency + state.page_latency * len(pages))
+            if self._maybe_fail():
+                return
+
+            include_images = bool(request.get("include_image_base64"))
+            state.record("ocr_requests")
+            state.record("pages", len(pages))
+            self._send_json(200, {
+                "pages": [state.build_page(index, include_images) for index in pages],
+                "model": request.get("model", "mistral-ocr-latest"),
+                "usage_info": {"pages_processed": len(pages), "doc_size_bytes": None}
+            })
+            return
+
+        self._send_json(404, {"object": "error", "message": f"unknown path {path}"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟OCR服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="每次OCR请求的固定延迟（秒）")
+    parser.add_argument("--page-latency", type=float, default=0.02, help="OCR请求每页增加的延迟（秒）")
+    parser.add_argument("--upload-latency", type=float, default=0.05, help="上传和签名URL请求的延迟（秒）")
+    parser.add_argument("--pages", type=int, help="每个文档的页数，默认按上传的PDF统计")
+    parser.add_argument("--images-per-page", type=int, default=1)
+    parser.add_argument("--image-bytes", type=int, default=20000, help="每张图片解码后的字节数")
+    parser.add_argument("--text-bytes", type=int, default=3000, help="每页正文的字节数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="请求随机失败的概率（0-1）")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, help="失败响应的Retry-After秒数")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = MockOCRServer(
+        args.host, args.port, latency=args.latency, page_latency=args.page_latency,
+        upload_latency=args.upload_latency, pages=args.pages, images_per_page=args.images_per_page,
+        image_bytes=args.image_bytes, text_bytes=args.text_bytes, error_rate=args.error_rate,
+        error_status=args.error_status, retry_after=args.retry_after, seed=args.seed
+    )
+    print(f"模拟OCR服务已启动: {server.url}（Ctrl+C退出）")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.stats, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
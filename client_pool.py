@@ -0,0 +1,127 @@
+import time
+import threading
+from typing import Optional, Dict, Tuple
+
+import httpx
+from mistralai import Mistral
+
+
+class ClientRegistry:
+    """
+    进程内共享的Mistral客户端注册表
+
+    同一API密钥（和服务地址）只创建一个客户端，底层HTTP连接池保持长连接，
+    多个引擎和工作线程复用，避免每次处理都重新建立TLS连接。
+    """
+
+    def __init__(self, pool_size: int = 32, keepalive_expiry: float = 60.0,
+                 validation_ttl: float = 300.0, failed_validation_ttl: float = 30.0):
+        """
+        初始化注册表
+
+        Args:
+            pool_size: 每个客户端的最大连接数，应不小于并发工作线程数
+            keepalive_expiry: 空闲连接的保持时间（秒）
+            validation_ttl: API密钥验证成功结果的缓存时间（秒）
+            failed_validation_ttl: API密钥验证失败结果的缓存时间（秒）
+        """
+        self.pool_size = pool_size
+        self.keepalive_expiry = keepalive_expiry
+        self.validation_ttl = validation_ttl
+        self.failed_validation_ttl = failed_validation_ttl
+        self._clients: Dict[Tuple[str, Optional[str]], Mistral] = {}
+        self._validations: Dict[Tuple[str, Optional[str]], Tuple[bool, float]] = {}
+        self._lock = threading.Lock()
+
+    def set_pool_size(self, pool_size: int):
+        """设置连接池大小，只对之后创建的客户端生效"""
+        with self._lock:
+            self.pool_size = max(1, pool_size)
+
+    def _limits(self) -> httpx.Limits:
+        """连接池限制"""
+        return httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def get_client(self, api_key: str, server_url: Optional[str] = None) -> Mistral:
+        """
+        获取（或创建）API密钥对应的共享客户端
+
+        Args:
+            api_key: Mistral API密钥
+            server_url: API服务地址，为None时使用默认地址
+
+        Returns:
+            Mistral客户端
+        """
+        key = (api_key, server_url)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                limits = self._limits()
+                kwargs = {"server_url": server_url} if server_url else {}
+                client = Mistral(
+                    api_key=api_key,
+                    client=httpx.Client(limits=limits, follow_redirects=True),
+                    async_client=httpx.AsyncClient(limits=limits, follow_redirects=True),
+                    **kwargs
+                )
+                self._clients[key] = client
+            return client
+
+    def validate(self, api_key: str, server_url: Optional[str] = None) -> bool:
+        """
+        验证API密钥是否有效，结果在有效期内缓存，避免重复请求模型列表
+
+        Args:
+            api_key: Mistral API密钥
+            server_url: API服务地址
+
+        Returns:
+            密钥有效返回True，否则返回False
+        """
+        key = (api_key, server_url)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._validations.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        try:
+            self.get_client(api_key, server_url).models.list()
+            valid = True
+        except Exception:
+            valid = False
+
+        ttl = self.validation_ttl if valid else self.failed_validation_ttl
+        with self._lock:
+            self._validations[key] = (valid, now + ttl)
+        return valid
+
+    def invalidate(self, api_key: str, server_url: Optional[str] = None):
+        """清除API密钥的验证缓存"""
+        with self._lock:
+            self._validations.pop((api_key, server_url), None)
+
+    def close(self):
+        """关闭所有客户端的连接池"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._validations.clear()
+        for client in clients:
+            try:
+                client.sdk_configuration.client.close()
+            except Exception:
+                pass
+
+
+_registry = ClientRegistry()
+
+
+def get_registry() -> ClientRegistry:
+    """获取进程内共享的客户端注册表"""
+    return _registry
@@ -1,27 +1,40 @@
 import os
 import json
 import base64
+import atexit
+import tempfile
+import threading
 from pathlib import Path
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from mistralai import Mistral
 
 class ConfigManager:
     """配置管理类，负责API密钥和应用设置的存储和验证"""
     
-    def __init__(self):
-        """初始化配置管理器，创建必要的目录和文件"""
+    def __init__(self, save_delay: float = 0.5):
+        """
+        初始化配置管理器，创建必要的目录和文件
+        
+        Args:
+            save_delay: 设置变更后延迟写入的秒数，期间的多次变更合并为一次写入
+        """
         self.app_data_dir = self._get_app_data_dir()
         self.config_file = self.app_data_dir / "config.json"
         self.key_file = self.app_data_dir / "key.bin"
+        self.save_delay = save_delay
+        
+        # 缓存的加密器和最近一次加密结果，避免重复读取密钥文件和重复加密
+        self._fernet = None
+        self._encrypted_api_key = ("", "")
+        
+        # 延迟写入状态
+        self._lock = threading.RLock()
+        self._save_timer = None
+        self._dirty = False
+        atexit.register(self.flush)
         
         # 确保应用数据目录存在
         os.makedirs(self.app_data_dir, exist_ok=True)
         
-        # 初始化或加载加密密钥
-        if not self.key_file.exists():
-            self._generate_encryption_key()
+        # 加密密钥和加密库在首次需要加解密API密钥时才加载，不影响启动速度
         
         # 加载或创建默认配置
         self.config = self._load_config()
@@ -37,6 +50,9 @@ class ConfigManager:
     
     def _generate_encryption_key(self):
         """生成并保存新的加密密钥"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+        
         # 使用随机盐生成密钥
         salt = os.urandom(16)
         kdf = PBKDF2HMAC(
@@ -47,12 +63,18 @@ class ConfigManager:
         )
         key = base64.urlsafe_b64encode(kdf.derive(b"MistralOCR"))
         
-        # 保存密钥和盐
-        with open(self.key_file, 'wb') as f:
-            f.write(salt + key)
+        # 保存密钥和盐，以独占方式创建，多个实例同时首次运行时只保留最先写入的密钥
+        try:
+            with open(self.key_file, 'xb') as f:
+                f.write(salt + key)
+        except FileExistsError:
+            pass
     
     def _get_encryption_key(self):
-        """获取加密密钥"""
+        """获取加密密钥，不存在时先生成"""
+        if not self.key_file.exists():
+            self._generate_encryption_key()
+        
         with open(self.key_file, 'rb') as f:
             data = f.read()
         
@@ -61,6 +83,13 @@ class ConfigManager:
         key = data[16:]
         return key
     
+    def _get_fernet(self):
+        """获取加密器，加密库和密钥只在首次使用时加载"""
+        if self._fernet is None:
+            from cryptography.fernet import Fernet
+            self._fernet = Fernet(self._get_encryption_key())
+        return self._fernet
+    
     def _load_config(self) -> dict:
         """加载配置，如果不存在则创建默认配置"""
         if not self.config_file.exists():
@@ -77,12 +106,10 @@ class ConfigManager:
             with open(self.config_file, 'r', encoding='utf-8') as f:
                 config = json.load(f)
             
-            # 解密API密钥
+            # API密钥延迟到首次读取时再解密，此处只记住密文
             if config.get("api_key"):
-                key = self._get_encryption_key()
-                fernet = Fernet(key)
-                encrypted_api_key = config["api_key"].encode()
-                config["api_key"] = fernet.decrypt(encrypted_api_key).decode()
+                self._encrypted_api_key = (None, config["api_key"])
+                config["api_key"] = None
             
             return config
         except Exception as e:
@@ -99,25 +126,74 @@ class ConfigManager:
         # 创建一个副本以避免修改原始配置
         config_to_save = config.copy()
         
-        # 加密API密钥
-        if config_to_save.get("api_key"):
-            key = self._get_encryption_key()
-            fernet = Fernet(key)
-            encrypted_api_key = fernet.encrypt(config_to_save["api_key"].encode())
-            config_to_save["api_key"] = encrypted_api_key.decode()
+        # 加密API密钥，密钥未变化时复用上次的密文
+        api_key = config_to_save.get("api_key")
+        if api_key is None:
+            # 从未解密过的API密钥直接保存原密文
+            config_to_save["api_key"] = self._encrypted_api_key[1]
+        elif api_key:
+            if self._encrypted_api_key[0] != api_key:
+                encrypted_api_key = self._get_fernet().encrypt(api_key.encode()).decode()
+                self._encrypted_api_key = (api_key, encrypted_api_key)
+            config_to_save["api_key"] = self._encrypted_api_key[1]
         
-        # 保存配置
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(config_to_save, f, indent=2)
+        # 先写入临时文件再原子替换，其他进程不会读到写了一半的配置
+        fd, tmp_path = tempfile.mkstemp(dir=self.app_data_dir, prefix="config.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(config_to_save, f, indent=2)
+            os.replace(tmp_path, self.config_file)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+    
+    def _schedule_save(self):
+        """标记配置已修改，延迟save_delay秒后写入，期间的多次修改只写入一次"""
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+    
+    def flush(self):
+        """立即写入尚未保存的配置修改"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            try:
+                self._save_config(self.config)
+            except Exception as e:
+                print(f"保存配置时出错: {e}")
     
     def get_api_key(self) -> str:
-        """获取API密钥"""
-        return self.config.get("api_key", "")
+        """获取API密钥，首次调用时解密"""
+        with self._lock:
+            if self.config.get("api_key") is None:
+                encrypted_api_key = self._encrypted_api_key[1]
+                try:
+                    api_key = self._get_fernet().decrypt(encrypted_api_key.encode()).decode()
+                    self._encrypted_api_key = (api_key, encrypted_api_key)
+                except Exception as e:
+                    print(f"解密API密钥时出错: {e}")
+                    api_key = ""
+                self.config["api_key"] = api_key
+            return self.config.get("api_key", "")
     
     def set_api_key(self, api_key: str):
         """设置API密钥"""
+        if self.config.get("api_key") == api_key:
+            return
         self.config["api_key"] = api_key
-        self._save_config(self.config)
+        self._schedule_save()
     
     def get_output_dir(self) -> str:
         """获取输出目录"""
@@ -125,8 +201,22 @@ class ConfigManager:
     
     def set_output_dir(self, output_dir: str):
         """设置输出目录"""
+        if self.config.get("output_dir") == output_dir:
+            return
         self.config["output_dir"] = output_dir
-        self._save_config(self.config)
+        self._schedule_save()
+    
+    def get_cache_dir(self) -> str:
+        """获取OCR结果缓存目录"""
+        return str(self.app_data_dir / "ocr_cache")
+    
+    def get_journal_dir(self) -> str:
+        """获取任务日志目录"""
+        return str(self.app_data_dir / "journal")
+    
+    def get_search_index_path(self) -> str:
+        """获取全文搜索索引文件路径"""
+        return str(self.app_data_dir / "search_index.db")
     
     def get_theme(self) -> str:
         """获取主题设置"""
@@ -134,8 +224,10 @@ class ConfigManager:
     
     def set_theme(self, theme: str):
         """设置主题"""
+        if self.config.get("theme") == theme:
+            return
         self.config["theme"] = theme
-        self._save_config(self.config)
+        self._schedule_save()
     
     def validate_api_key(self, api_key: str = None) -> bool:
         """验证API密钥是否有效"""
@@ -145,11 +237,6 @@ class ConfigManager:
         if not api_key:
             return False
         
-        try:
-            # 创建Mistral客户端并尝试一个简单请求
-            client = Mistral(api_key=api_key)
-            # 获取模型列表
-            client.models.list()
-            return True
-        except Exception:
-            return False 
\ No newline at end of file
+        # 使用共享客户端验证，结果在有效期内缓存
+        from client_pool import get_registry
+        return get_registry().validate(api_key) 
\ No newline at end of file
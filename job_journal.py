@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, List, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from mistralai.models import OCRResponse
+
+# 签名URL剩余有效期不足该秒数时重新获取
+SIGNED_URL_MARGIN = 300
+
+
+class JobJournal:
+    """
+    单个PDF处理任务的日志，记录已完成的阶段，进程中断后重新处理时从最后完成的阶段继续
+
+    日志目录中保存state.json（上传文件ID、签名URL及过期时间、已写入的页数）、
+    完整的OCR响应response.json，以及分片OCR时已完成分片的响应shard-N.json。
+    每次更新都先写临时文件再重命名，进程在任意时刻退出都不会留下损坏的日志。
+    """
+
+    # 保存结果时每写入多少页记录一次进度
+    checkpoint_pages = 20
+
+    def __init__(self, journal_dir: str, key: str):
+        """
+        打开（或创建）任务日志
+
+        Args:
+            journal_dir: 日志根目录
+            key: 任务键，由PDF内容哈希、OCR选项和结果文件路径生成
+        """
+        self.path = Path(journal_dir) / key
+        self._lock = threading.Lock()
+        self.state = {}
+        try:
+            self.state = json.loads((self.path / "state.json").read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"读取任务日志时出错，将重新处理: {e}")
+
+    @property
+    def resumed(self) -> bool:
+        """是否存在之前中断的处理记录"""
+        return bool(self.state)
+
+    def _write(self, name: str, data: bytes):
+        """原子写入日志目录中的文件"""
+        os.makedirs(self.path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path / name)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _update(self, **values):
+        """更新并保存状态，日志写入失败不影响处理流程"""
+        with self._lock:
+            self.state.update(values)
+            data = json.dumps(self.state, ensure_ascii=False).encode('utf-8')
+            try:
+                self._write("state.json", data)
+            except Exception as e:
+                print(f"写入任务日志时出错: {e}")
+
+    def _read_response(self, name: str) -> Optional["OCRResponse"]:
+        """读取保存的OCR响应，不存在或已损坏时返回None"""
+        from mistralai.models import OCRResponse
+
+        try:
+            return OCRResponse.model_validate_json((self.path / name).read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"读取任务日志中的OCR结果时出错: {e}")
+            return None
+
+    def _write_response(self, name: str, response: "OCRResponse"):
+        """保存OCR响应"""
+        try:
+            self._write(name, response.model_dump_json().encode('utf-8'))
+        except Exception as e:
+            print(f"写入任务日志时出错: {e}")
+
+    def uploaded_file_id(self) -> Optional[str]:
+        """之前上传的文件ID"""
+        return self.state.get("file_id")
+
+    def record_upload(self, file_id: str):
+        """记录上传完成，旧的签名URL随之失效"""
+        self._update(file_id=file_id, signed_url=None, signed_url_expires=0)
+
+    def signed_url(self) -> Optional[str]:
+        """之前获取的签名URL，已过期或即将过期时返回None"""
+        if self.state.get("signed_url") and self.state.get("signed_url_expires", 0) - time.time() > SIGNED_URL_MARGIN:
+            return self.state["signed_url"]
+        return None
+
+    def record_signed_url(self, url: str, expiry_hours: float):
+        """记录签名URL及其过期时间"""
+        self._update(signed_url=url, signed_url_expires=time.time() + expiry_hours * 3600)
+
+    def load_shard(self, index: int, shards: List[List[int]]) -> Optional["OCRResponse"]:
+        """读取已完成分片的响应，分片方式与之前不同时返回None"""
+        if self.state.get("shards") != shards:
+            return None
+        return self._read_response(f"shard-{index}.json")
+
+    def save_shard(self, index: int, shards: List[List[int]], response: "OCRResponse"):
+        """保存已完成分片的响应"""
+        if self.state.get("shards") != shards:
+            self._update(shards=shards)
+        self._write_response(f"shard-{index}.json", response)
+
+    def load_response(self) -> Optional["OCRResponse"]:
+        """读取完整的OCR响应"""
+        if not self.state.get("ocr_done"):
+            return None
+        return self._read_response("response.json")
+
+    def save_response(self, response: "OCRResponse"):
+        """保存完整的OCR响应，之后不再需要分片响应"""
+        self._write_response("response.json", response)
+        self._update(ocr_done=True)
+        for shard_file in self.path.glob("shard-*.json"):
+            try:
+                os.remove(shard_file)
+            except OSError:
+                pass
+
+    def save_progress(self, md_file_path: str) -> Tuple[int, int]:
+        """
+        之前写入结果的进度
+
+        Args:
+            md_file_path: 结果Markdown文件路径
+
+        Returns:
+            (已写入的页数, Markdown文件中这些页的字节数)，无法继续写入时返回(0, 0)
+        """
+        progress = self.state.get("progress")
+        if not progress or progress.get("md_file") != str(md_file_path):
+            return 0, 0
+        try:
+            if os.path.getsize(md_file_path) < progress["md_bytes"]:
+                return 0, 0
+        except OSError:
+            return 0, 0
+        return progress["pages"], progress["md_bytes"]
+
+    def record_progress(self, md_file_path: str, pages: int, md_bytes: int):
+        """记录已完整写入（包括图片）的页数和Markdown字节数"""
+        self._update(progress={"md_file": str(md_file_path), "pages": pages, "md_bytes": md_bytes})
+
+    def reset_progress(self):
+        """已写入的结果被删除后清除写入进度"""
+        if self.state.get("progress"):
+            self._update(progress=None)
+
+    def complete(self):
+        """任务成功完成，删除日志"""
+        with self._lock:
+            self.state = {}
+            shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,226 @@
+from collections import deque
+from pathlib import Path
+from typing import List, Optional
+
+from PySide6.QtCore import QObject, QThreadPool, Signal, Slot
+
+from ocr_cache import OCRCache
+from request_scheduler import RequestScheduler
+from search_index import SearchIndex
+from workers import OCRWorker
+
+
+class OCRJob:
+    """队列中的单个PDF处理任务"""
+
+    PENDING = "等待中"
+    RUNNING = "处理中"
+    SUCCEEDED = "成功"
+    FAILED = "失败"
+    CANCELLED = "已取消"
+
+    def __init__(self, job_id: int, pdf_path: str, output_dir: str):
+        self.job_id = job_id
+        self.pdf_path = pdf_path
+        self.output_dir = output_dir
+        self.status = OCRJob.PENDING
+        self.progress = 0.0
+        self.message = ""
+        self.worker: Optional[OCRWorker] = None
+
+    @property
+    def finished(self) -> bool:
+        """任务是否已结束（无论成功与否）"""
+        return self.status in (OCRJob.SUCCEEDED, OCRJob.FAILED, OCRJob.CANCELLED)
+
+
+class JobQueue(QObject):
+    """PDF处理任务队列，在后台线程池中同时处理最多max_concurrent个任务，支持暂停和继续"""
+
+    jobAdded = Signal(int)       # 任务ID
+    jobUpdated = Signal(int)     # 任务ID
+    queueFinished = Signal()     # 所有任务结束
+
+    def __init__(self, thread_pool: QThreadPool, cache: Optional[OCRCache] = None,
+                 scheduler: Optional[RequestScheduler] = None, max_concurrent: int = 2,
+                 journal_dir: Optional[str] = None, search_index: Optional[SearchIndex] = None, parent=None):
+        """
+        初始化任务队列
+
+        Args:
+            thread_pool: 执行任务的线程池
+            cache: OCR结果缓存
+            scheduler: 各任务共享的请求调度器
+            max_concurrent: 同时处理的任务数
+            journal_dir: 任务日志目录
+            search_index: 全文搜索索引
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self.thread_pool = thread_pool
+        self.cache = cache
+        self.scheduler = scheduler
+        self.max_concurrent = max_concurrent
+        self.journal_dir = journal_dir
+        self.search_index = search_index
+        self.api_key = ""
+        self.paused = True
+        self.jobs = {}
+        self._pending = deque()
+        self._running = set()
+        self._next_id = 1
+        self._output_dirs = {}
+
+    def _output_dir_for(self, pdf_path: str, output_root: str) -> str:
+        """
+        为每个PDF分配独立的输出子目录，避免不同文档的图片互相覆盖
+
+        同一文件再次处理时沿用之前的目录，不同目录下的同名文件依次加上序号。
+        """
+        key = (pdf_path, output_root)
+        if key in self._output_dirs:
+            return self._output_dirs[key]
+
+        used = set(self._output_dirs.values())
+        stem = Path(pdf_path).stem
+        candidate = str(Path(output_root) / stem)
+        count = 1
+        while candidate in used:
+            count += 1
+            candidate = str(Path(output_root) / f"{stem}_{count}")
+        self._output_dirs[key] = candidate
+        return candidate
+
+    def add_jobs(self, pdf_paths: List[str], output_root: str) -> List[int]:
+        """
+        添加任务，已在队列中等待或处理中的文件不会重复添加
+
+        Args:
+            pdf_paths: PDF文件路径列表
+            output_root: 输出根目录
+
+        Returns:
+            新添加任务的ID列表
+        """
+        active = {job.pdf_path for job in self.jobs.values() if not job.finished}
+        added = []
+        for pdf_path in pdf_paths:
+            if pdf_path in active:
+                continue
+            job = OCRJob(self._next_id, pdf_path, self._output_dir_for(pdf_path, output_root))
+            self._next_id += 1
+            self.jobs[job.job_id] = job
+            self._pending.append(job.job_id)
+            active.add(pdf_path)
+            added.append(job.job_id)
+            self.jobAdded.emit(job.job_id)
+
+        self._dispatch()
+        return added
+
+    def start(self, api_key: str):
+        """使用指定的API密钥开始（或继续）处理队列"""
+        self.api_key = api_key
+        self.resume()
+
+    def pause(self):
+        """暂停队列：不再启动新任务，处理中的任务继续完成"""
+        self.paused = True
+
+    def resume(self):
+        """继续处理队列"""
+        self.paused = False
+        self._dispatch()
+
+    def set_max_concurrent(self, max_concurrent: int):
+        """调整同时处理的任务数"""
+        self.max_concurrent = max(1, max_concurrent)
+        self._dispatch()
+
+    def cancel_all(self):
+        """取消所有等待中和处理中的任务"""
+        while self._pending:
+            job = self.jobs[self._pending.popleft()]
+            job.status = OCRJob.CANCELLED
+            self.jobUpdated.emit(job.job_id)
+        for job_id in list(self._running):
+            self.jobs[job_id].worker.cancel()
+        self._check_finished()
+
+    def clear_finished(self) -> List[int]:
+        """移除已结束的任务，返回被移除的任务ID"""
+        removed = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in removed:
+            del self.jobs[job_id]
+        return removed
+
+    def is_active(self) -> bool:
+        """是否还有等待中或处理中的任务"""
+        return bool(self._pending or self._running)
+
+    def counts(self) -> dict:
+        """各状态的任务数"""
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def overall_progress(self) -> float:
+        """所有任务的整体进度（0-1）"""
+        if not self.jobs:
+            return 0.0
+        total = sum(1.0 if job.finished else job.progress for job in self.jobs.values())
+        return total / len(self.jobs)
+
+    def _dispatch(self):
+        """在未暂停时启动等待中的任务，直到达到并发上限"""
+        while not self.paused and self._pending and len(self._running) < self.max_concurrent:
+            job = self.jobs[self._pending.popleft()]
+            job.status = OCRJob.RUNNING
+            job.worker = OCRWorker(self.api_key, job.pdf_path, job.output_dir,
+                                   cache=self.cache, scheduler=self.scheduler, journal_dir=self.journal_dir,
+                                   search_index=self.search_index)
+            # 连接到本对象的槽，信号从线程池中发出时排队到GUI线程执行，_running和_pending只在GUI线程中修改
+            job.worker.signals.setProperty("job_id", job.job_id)
+            job.worker.signals.progress.connect(self._on_progress)
+            job.worker.signals.finished.connect(self._on_finished)
+            self._running.add(job.job_id)
+            self.jobUpdated.emit(job.job_id)
+            self.thread_pool.start(job.worker)
+
+    @Slot(str, float)
+    def _on_progress(self, message: str, progress: float):
+        """任务进度更新"""
+        job_id = self.sender().property("job_id")
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        job.message = message
+        job.progress = progress
+        self.jobUpdated.emit(job_id)
+
+    @Slot(dict)
+    def _on_finished(self, result: dict):
+        """任务结束"""
+        job_id = self.sender().property("job_id")
+        self._running.discard(job_id)
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.worker = None
+            job.message = result["message"]
+            if result.get("cancelled"):
+                job.status = OCRJob.CANCELLED
+            elif result["success"]:
+                job.status = OCRJob.SUCCEEDED
+                job.progress = 1.0
+            else:
+                job.status = OCRJob.FAILED
+            self.jobUpdated.emit(job_id)
+
+        self._dispatch()
+        self._check_finished()
+
+    def _check_finished(self):
+        """没有等待中和处理中的任务时发出queueFinished信号"""
+        if not self.is_active():
+            self.queueFinished.emit()
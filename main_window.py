@@ -4,17 +4,23 @@ from pathlib import Path
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
     QPushButton, QLineEdit, QFileDialog, QProgressBar, 
-    QGroupBox, QMessageBox, QSizePolicy, QSpacerItem, QStackedWidget
+    QGroupBox, QMessageBox, QSizePolicy, QSpacerItem, QStackedWidget,
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QSpinBox, QDialog
 )
-from PySide6.QtCore import Qt, QSize, Signal, QUrl, QMimeData, QTimer, QFileInfo
-from PySide6.QtGui import QDrag, QDragEnterEvent, QDropEvent, QIcon, QPixmap
+from PySide6.QtCore import Qt, QSize, Signal, QUrl, QMimeData, QTimer, QFileInfo, QThreadPool
+from PySide6.QtGui import QDrag, QDragEnterEvent, QDropEvent, QIcon, QPixmap, QDesktopServices
 from config_manager import ConfigManager
-from ocr_engine import OCREngine
+from ocr_cache import OCRCache
+from workers import ValidateWorker, SearchWorker
+from job_queue import JobQueue, OCRJob
+from pdf_utils import collect_pdf_files
+from request_scheduler import RequestScheduler
+from search_index import SearchIndex
 
 class DropArea(QWidget):
-    """自定义拖放区域，支持PDF文件拖放"""
+    """自定义拖放区域，支持拖放多个PDF文件或文件夹"""
     
-    fileDropped = Signal(str)  # 文件拖放信号
+    filesDropped = Signal(list)  # 文件拖放信号，参数为PDF文件路径列表
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -34,7 +40,7 @@ class DropArea(QWidget):
         # 这里可以添加自定义图标
         # self.icon_label.setPixmap(QPixmap("resources/icons/pdf_icon.png").scaled(48, 48, Qt.KeepAspectRatio, Qt.SmoothTransformation))
         
-        self.text_label = QLabel("拖放PDF文件到这里，或点击选择文件", self)
+        self.text_label = QLabel("拖放PDF文件或文件夹到这里，或点击选择文件", self)
         self.text_label.setAlignment(Qt.AlignCenter)
         
         layout.addWidget(self.icon_label)
@@ -69,31 +75,109 @@ class DropArea(QWidget):
         
         mime_data = event.mimeData()
         if mime_data.hasUrls() and self._is_valid_drop(mime_data):
-            file_path = mime_data.urls()[0].toLocalFile()
-            self.fileDropped.emit(file_path)
+            # 展开文件夹中的PDF文件
+            paths = [url.toLocalFile() for url in mime_data.urls() if url.isLocalFile()]
+            pdf_files = [str(path) for path in collect_pdf_files(paths)]
+            if pdf_files:
+                self.filesDropped.emit(pdf_files)
             event.acceptProposedAction()
         else:
             event.ignore()
     
     def _is_valid_drop(self, mime_data: QMimeData) -> bool:
-        """检查拖放的是否为有效的PDF文件"""
-        if not mime_data.hasUrls() or len(mime_data.urls()) != 1:
+        """检查拖放的内容中是否包含PDF文件或文件夹"""
+        if not mime_data.hasUrls():
             return False
         
-        file_url = mime_data.urls()[0]
-        if not file_url.isLocalFile():
-            return False
-        
-        file_path = file_url.toLocalFile()
-        return file_path.lower().endswith('.pdf')
+        for file_url in mime_data.urls():
+            if not file_url.isLocalFile():
+                continue
+            file_path = file_url.toLocalFile()
+            if file_path.lower().endswith('.pdf') or os.path.isdir(file_path):
+                return True
+        return False
     
     def browse_file(self):
-        """打开文件选择对话框"""
-        file_path, _ = QFileDialog.getOpenFileName(
+        """打开文件选择对话框，可同时选择多个文件"""
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self, "选择PDF文件", "", "PDF文件 (*.pdf)"
         )
-        if file_path:
-            self.fileDropped.emit(file_path)
+        if file_paths:
+            self.filesDropped.emit(file_paths)
+
+
+class SearchDialog(QDialog):
+    """搜索已处理的OCR结果，双击结果打开对应的Markdown文件"""
+    
+    def __init__(self, search_index: SearchIndex, thread_pool: QThreadPool, parent=None):
+        super().__init__(parent)
+        self.search_index = search_index
+        self.thread_pool = thread_pool
+        self.search_worker = None
+        self.results = []
+        self.setWindowTitle("搜索OCR结果")
+        self.resize(800, 520)
+        
+        layout = QVBoxLayout(self)
+        self.query_input = QLineEdit(self)
+        self.query_input.setPlaceholderText("输入搜索词，多个词以空格分隔")
+        self.query_input.textChanged.connect(self._schedule_search)
+        self.query_input.returnPressed.connect(self.search)
+        layout.addWidget(self.query_input)
+        
+        self.result_table = QTableWidget(0, 3, self)
+        self.result_table.setHorizontalHeaderLabels(["文件", "页码", "摘要"])
+        self.result_table.verticalHeader().setVisible(False)
+        self.result_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.result_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        header = self.result_table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(2, QHeaderView.Stretch)
+        self.result_table.cellDoubleClicked.connect(self.open_result)
+        layout.addWidget(self.result_table, 1)
+        
+        self.status_label = QLabel("", self)
+        layout.addWidget(self.status_label)
+        
+        # 输入停顿后再搜索，避免每输入一个字符都查询一次
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.search)
+    
+    def _schedule_search(self):
+        self.search_timer.start()
+    
+    def search(self):
+        """在后台线程中搜索当前输入的内容"""
+        self.search_timer.stop()
+        query = self.query_input.text().strip()
+        if not query:
+            self._show_results(query, [])
+            return
+        self.search_worker = SearchWorker(self.search_index, query)
+        self.search_worker.signals.searched.connect(self._show_results)
+        self.thread_pool.start(self.search_worker)
+    
+    def _show_results(self, query: str, results: list):
+        """显示搜索结果，忽略输入已改变后才返回的旧结果"""
+        if query != self.query_input.text().strip():
+            return
+        self.results = results
+        self.result_table.setRowCount(len(results))
+        for row, result in enumerate(results):
+            file_item = QTableWidgetItem(result["title"])
+            file_item.setToolTip(result["md_path"])
+            self.result_table.setItem(row, 0, file_item)
+            self.result_table.setItem(row, 1, QTableWidgetItem(str(result["page"] or "-")))
+            self.result_table.setItem(row, 2, QTableWidgetItem(result["snippet"]))
+        self.status_label.setText(f"共 {len(results)} 条结果" if query else "")
+    
+    def open_result(self, row: int, column: int):
+        """用系统默认程序打开结果Markdown"""
+        if 0 <= row < len(self.results):
+            QDesktopServices.openUrl(QUrl.fromLocalFile(self.results[row]["md_path"]))
 
 
 class MainWindow(QMainWindow):
@@ -107,8 +191,8 @@ class MainWindow(QMainWindow):
         
         # 设置窗口属性
         self.setWindowTitle("Mistral OCR")
-        self.setMinimumSize(700, 500)
-        self.resize(800, 600)
+        self.setMinimumSize(700, 600)
+        self.resize(900, 760)
         
         # 应用主题
         self.theme = self.config_manager.get_theme()
@@ -133,11 +217,35 @@ class MainWindow(QMainWindow):
         # 加载保存的配置
         self._load_config()
         
-        # OCR引擎实例
-        self.ocr_engine = None
+        # 后台线程池，OCR和API验证都不在界面线程中执行
+        self.thread_pool = QThreadPool(self)
+        self.validate_worker = None
+        
+        # OCR结果缓存，重复处理相同的PDF时不再上传
+        self.ocr_cache = OCRCache(self.config_manager.get_cache_dir())
         
-        # 保持打开文件的路径
-        self.current_pdf_path = ""
+        # 所有任务共享的请求调度器，遇到限流和服务端临时错误时自动退避重试
+        self.request_scheduler = RequestScheduler()
+        
+        # 全文搜索索引，每个文档处理完成后按页更新
+        try:
+            self.search_index = SearchIndex(self.config_manager.get_search_index_path())
+        except Exception as e:
+            print(f"打开搜索索引时出错: {e}")
+            self.search_index = None
+        self.search_button.setEnabled(self.search_index is not None)
+        self.search_dialog = None
+        
+        # 任务队列，任务ID到表格行号的映射
+        self.job_queue = JobQueue(self.thread_pool, cache=self.ocr_cache, scheduler=self.request_scheduler,
+                                  max_concurrent=self.concurrency_input.value(),
+                                  journal_dir=self.config_manager.get_journal_dir(),
+                                  search_index=self.search_index, parent=self)
+        self.job_queue.jobAdded.connect(self.on_job_added)
+        self.job_queue.jobUpdated.connect(self.on_job_updated)
+        self.job_queue.queueFinished.connect(self.on_queue_finished)
+        self._update_thread_count()
+        self.job_rows = {}
     
     def _load_stylesheet(self):
         """加载应用样式表"""
@@ -180,20 +288,61 @@ class MainWindow(QMainWindow):
         
         # 创建拖放区域
         self.drop_area = DropArea(self)
-        self.drop_area.fileDropped.connect(self.handle_file_dropped)
+        self.drop_area.filesDropped.connect(self.handle_files_dropped)
         file_layout.addWidget(self.drop_area)
         
-        # 文件路径显示
+        # 文件路径输入
         path_layout = QHBoxLayout()
         path_layout.addWidget(QLabel("PDF路径:", self))
         self.pdf_path_input = QLineEdit(self)
-        self.pdf_path_input.setPlaceholderText("输入PDF文件路径或拖放文件")
+        self.pdf_path_input.setPlaceholderText("输入PDF文件或文件夹路径后点击添加，或直接拖放")
+        self.pdf_path_input.returnPressed.connect(self.add_path_from_input)
         path_layout.addWidget(self.pdf_path_input, 1)
         
+        self.add_path_button = QPushButton("添加", self)
+        self.add_path_button.setObjectName("secondaryButton")
+        self.add_path_button.clicked.connect(self.add_path_from_input)
+        path_layout.addWidget(self.add_path_button)
+        
         file_layout.addLayout(path_layout)
         
         self.main_layout.addWidget(file_group)
         
+        # ===== 任务列表区域 =====
+        queue_group = QGroupBox("任务列表", self)
+        queue_layout = QVBoxLayout(queue_group)
+        
+        self.job_table = QTableWidget(0, 4, self)
+        self.job_table.setHorizontalHeaderLabels(["文件", "状态", "进度", "信息"])
+        self.job_table.verticalHeader().setVisible(False)
+        self.job_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.job_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        header = self.job_table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(2, QHeaderView.Fixed)
+        header.setSectionResizeMode(3, QHeaderView.Stretch)
+        self.job_table.setColumnWidth(2, 120)
+        queue_layout.addWidget(self.job_table)
+        
+        queue_control_layout = QHBoxLayout()
+        queue_control_layout.addWidget(QLabel("同时处理:", self))
+        self.concurrency_input = QSpinBox(self)
+        self.concurrency_input.setRange(1, 16)
+        self.concurrency_input.setValue(2)
+        self.concurrency_input.valueChanged.connect(self.set_concurrency)
+        queue_control_layout.addWidget(self.concurrency_input)
+        queue_control_layout.addStretch(1)
+        
+        self.clear_finished_button = QPushButton("清除已完成", self)
+        self.clear_finished_button.setObjectName("secondaryButton")
+        self.clear_finished_button.clicked.connect(self.clear_finished_jobs)
+        queue_control_layout.addWidget(self.clear_finished_button)
+        
+        queue_layout.addLayout(queue_control_layout)
+        
+        self.main_layout.addWidget(queue_group, 1)
+        
         # ===== 设置区域 =====
         settings_group = QGroupBox("设置", self)
         settings_layout = QVBoxLayout(settings_group)
@@ -259,6 +408,23 @@ class MainWindow(QMainWindow):
         self.theme_button.clicked.connect(self.toggle_theme)
         button_layout.addWidget(self.theme_button)
         
+        self.search_button = QPushButton("搜索结果", self)
+        self.search_button.setObjectName("secondaryButton")
+        self.search_button.clicked.connect(self.open_search)
+        button_layout.addWidget(self.search_button)
+        
+        self.cancel_button = QPushButton("全部取消", self)
+        self.cancel_button.setObjectName("secondaryButton")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_processing)
+        button_layout.addWidget(self.cancel_button)
+        
+        self.pause_button = QPushButton("暂停", self)
+        self.pause_button.setObjectName("secondaryButton")
+        self.pause_button.setEnabled(False)
+        self.pause_button.clicked.connect(self.toggle_pause)
+        button_layout.addWidget(self.pause_button)
+        
         self.process_button = QPushButton("开始处理", self)
         self.process_button.clicked.connect(self.process_pdf)
         button_layout.addWidget(self.process_button)
@@ -266,20 +432,45 @@ class MainWindow(QMainWindow):
         control_layout.addLayout(button_layout)
         
         self.main_layout.addWidget(control_group)
-        
-        # 底部间距
-        self.main_layout.addStretch(1)
     
     def _load_config(self):
         """加载保存的配置"""
-        self.api_key_input.setText(self.config_manager.get_api_key())
         self.output_dir_input.setText(self.config_manager.get_output_dir())
+        # API密钥需要加载加密库解密，推迟到窗口显示之后
+        QTimer.singleShot(0, self._load_api_key)
+    
+    def _load_api_key(self):
+        """加载并解密保存的API密钥"""
+        if not self.api_key_input.text():
+            self.api_key_input.setText(self.config_manager.get_api_key())
+    
+    def handle_files_dropped(self, file_paths: list):
+        """将拖放或选择的文件加入任务队列"""
+        added = self.job_queue.add_jobs(file_paths, self._get_output_root())
+        if len(file_paths) == 1:
+            self.status_label.setText(f"已添加文件: {Path(file_paths[0]).name}")
+        else:
+            self.status_label.setText(f"已添加 {len(added)} 个文件")
+    
+    def add_path_from_input(self):
+        """将路径输入框中的文件或文件夹加入任务队列"""
+        path = self.pdf_path_input.text().strip()
+        if not path:
+            return
+        pdf_files = [str(pdf_file) for pdf_file in collect_pdf_files([path])]
+        if not pdf_files:
+            QMessageBox.warning(self, "路径错误", f"未找到PDF文件: {path}")
+            return
+        self.handle_files_dropped(pdf_files)
+        self.pdf_path_input.clear()
     
-    def handle_file_dropped(self, file_path: str):
-        """处理拖放的文件"""
-        self.pdf_path_input.setText(file_path)
-        self.current_pdf_path = file_path
-        self.status_label.setText(f"已选择文件: {Path(file_path).name}")
+    def _get_output_root(self) -> str:
+        """获取输出根目录，未填写时使用默认输出目录"""
+        output_dir = self.output_dir_input.text().strip()
+        if not output_dir:
+            output_dir = self.config_manager.get_output_dir()
+            self.output_dir_input.setText(output_dir)
+        return output_dir
     
     def browse_output_dir(self):
         """浏览并选择输出目录"""
@@ -301,30 +492,39 @@ class MainWindow(QMainWindow):
         self.validate_api_button.setEnabled(False)
         self.validate_api_button.setText("验证中...")
         
-        # 创建OCR引擎并验证
-        try:
-            temp_engine = OCREngine(api_key)
-            valid = temp_engine.validate_connection()
-            
-            if valid:
-                QMessageBox.information(self, "验证成功", "API密钥有效")
-                self.config_manager.set_api_key(api_key)
-                self.status_label.setText("API密钥验证成功")
-            else:
-                QMessageBox.warning(self, "验证失败", "API密钥无效或网络连接问题")
-                self.status_label.setText("API密钥验证失败")
-        except Exception as e:
-            QMessageBox.critical(self, "验证错误", f"验证过程中出错: {str(e)}")
+        # 在后台线程中验证，避免界面卡顿
+        self.validate_worker = ValidateWorker(api_key)
+        self.validate_worker.signals.validated.connect(
+            lambda valid, error: self.on_validate_finished(api_key, valid, error)
+        )
+        self.thread_pool.start(self.validate_worker)
+    
+    def on_validate_finished(self, api_key: str, valid: bool, error: str):
+        """API密钥验证完成"""
+        self.validate_worker = None
+        
+        if error:
+            QMessageBox.critical(self, "验证错误", f"验证过程中出错: {error}")
             self.status_label.setText("API密钥验证出错")
+        elif valid:
+            QMessageBox.information(self, "验证成功", "API密钥有效")
+            self.config_manager.set_api_key(api_key)
+            self.status_label.setText("API密钥验证成功")
+        else:
+            QMessageBox.warning(self, "验证失败", "API密钥无效或网络连接问题")
+            self.status_label.setText("API密钥验证失败")
         
         self.validate_api_button.setEnabled(True)
         self.validate_api_button.setText("验证")
     
     def process_pdf(self):
-        """处理PDF文件"""
-        # 检查PDF路径
-        pdf_path = self.pdf_path_input.text().strip()
-        if not pdf_path:
+        """开始处理任务队列"""
+        # 路径输入框中还有未添加的路径时先加入队列
+        if self.pdf_path_input.text().strip():
+            self.add_path_from_input()
+        
+        # 检查任务队列
+        if not self.job_queue.is_active():
             QMessageBox.warning(self, "路径错误", "请选择PDF文件")
             return
         
@@ -334,53 +534,139 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "API密钥错误", "请输入API密钥")
             return
         
-        # 检查输出目录
-        output_dir = self.output_dir_input.text().strip()
-        if not output_dir:
-            # 使用默认输出目录
-            output_dir = self.config_manager.get_output_dir()
-            self.output_dir_input.setText(output_dir)
-        
-        # 禁用处理按钮
-        self.process_button.setEnabled(False)
-        self.process_button.setText("处理中...")
-        
         # 保存API密钥和输出目录
         self.config_manager.set_api_key(api_key)
-        self.config_manager.set_output_dir(output_dir)
+        self.config_manager.set_output_dir(self._get_output_root())
         
-        # 创建OCR引擎
-        self.ocr_engine = OCREngine(api_key)
+        # 禁用处理按钮，允许暂停和取消
+        self.process_button.setEnabled(False)
+        self.process_button.setText("处理中...")
+        self.pause_button.setEnabled(True)
+        self.pause_button.setText("暂停")
+        self.cancel_button.setEnabled(True)
         
-        # 开始处理
-        try:
-            self.status_label.setText("开始处理PDF...")
-            self.progress_bar.setValue(0)
-            
-            def progress_callback(message, progress):
-                self.status_label.setText(message)
-                self.progress_bar.setValue(int(progress * 100))
-            
-            # 处理PDF
-            result = self.ocr_engine.process_pdf(pdf_path, output_dir, progress_callback)
-            
-            if result["success"]:
-                self.status_label.setText(f"处理成功: {result['message']}")
-                QMessageBox.information(
-                    self, 
-                    "处理成功", 
-                    f"PDF处理成功！\n\n结果保存在: {result['output_dir']}"
-                )
-            else:
-                self.status_label.setText(f"处理失败: {result['message']}")
-                QMessageBox.warning(self, "处理失败", f"PDF处理失败: {result['message']}")
-        except Exception as e:
-            self.status_label.setText(f"处理出错: {str(e)}")
-            QMessageBox.critical(self, "处理错误", f"处理过程中出错: {str(e)}")
+        # 在后台线程池中处理，进度通过信号更新界面
+        self.status_label.setText("开始处理PDF...")
+        self.job_queue.start(api_key)
+    
+    def on_job_added(self, job_id: int):
+        """在任务列表中添加一行"""
+        job = self.job_queue.jobs[job_id]
+        row = self.job_table.rowCount()
+        self.job_table.insertRow(row)
+        self.job_rows[job_id] = row
+        
+        name_item = QTableWidgetItem(Path(job.pdf_path).name)
+        name_item.setToolTip(job.pdf_path)
+        name_item.setData(Qt.UserRole, job_id)
+        self.job_table.setItem(row, 0, name_item)
+        self.job_table.setItem(row, 1, QTableWidgetItem(job.status))
+        
+        progress_bar = QProgressBar(self)
+        progress_bar.setRange(0, 100)
+        progress_bar.setValue(0)
+        progress_bar.setTextVisible(False)
+        progress_bar.setFixedHeight(10)
+        self.job_table.setCellWidget(row, 2, progress_bar)
+        
+        self.job_table.setItem(row, 3, QTableWidgetItem(""))
+        self._update_overall_progress()
+    
+    def on_job_updated(self, job_id: int):
+        """刷新任务的状态和进度"""
+        job = self.job_queue.jobs.get(job_id)
+        row = self.job_rows.get(job_id)
+        if job is None or row is None:
+            return
         
-        # 重新启用处理按钮
+        self.job_table.item(row, 1).setText(job.status)
+        self.job_table.cellWidget(row, 2).setValue(int(job.progress * 100))
+        message_item = self.job_table.item(row, 3)
+        message_item.setText(job.message)
+        message_item.setToolTip(job.output_dir if job.status == OCRJob.SUCCEEDED else job.message)
+        self._update_overall_progress()
+    
+    def _update_overall_progress(self):
+        """更新整体进度和状态栏"""
+        self.progress_bar.setValue(int(self.job_queue.overall_progress() * 100))
+        counts = self.job_queue.counts()
+        total = len(self.job_queue.jobs)
+        finished = sum(counts.get(status, 0) for status in (OCRJob.SUCCEEDED, OCRJob.FAILED, OCRJob.CANCELLED))
+        if self.job_queue.is_active() and not self.job_queue.paused:
+            self.status_label.setText(
+                f"已完成 {finished}/{total}，处理中 {counts.get(OCRJob.RUNNING, 0)}，"
+                f"失败 {counts.get(OCRJob.FAILED, 0)}"
+            )
+    
+    def on_queue_finished(self):
+        """队列中的任务全部结束"""
         self.process_button.setEnabled(True)
         self.process_button.setText("开始处理")
+        self.pause_button.setEnabled(False)
+        self.pause_button.setText("暂停")
+        self.cancel_button.setEnabled(False)
+        self.job_queue.pause()
+        
+        counts = self.job_queue.counts()
+        self.status_label.setText(
+            f"处理结束：成功 {counts.get(OCRJob.SUCCEEDED, 0)}，失败 {counts.get(OCRJob.FAILED, 0)}，"
+            f"取消 {counts.get(OCRJob.CANCELLED, 0)}"
+        )
+    
+    def toggle_pause(self):
+        """暂停或继续处理队列"""
+        if self.job_queue.paused:
+            self.job_queue.resume()
+            self.pause_button.setText("暂停")
+            self._update_overall_progress()
+        else:
+            self.job_queue.pause()
+            self.pause_button.setText("继续")
+            self.status_label.setText("队列已暂停，处理中的任务完成后停止")
+    
+    def set_concurrency(self, value: int):
+        """调整同时处理的任务数"""
+        self.job_queue.set_max_concurrent(value)
+        self._update_thread_count()
+    
+    def _update_thread_count(self):
+        """线程池大小为并发任务数加一，保证API验证不必排队"""
+        self.thread_pool.setMaxThreadCount(self.job_queue.max_concurrent + 1)
+    
+    def clear_finished_jobs(self):
+        """从任务列表中移除已结束的任务"""
+        removed = set(self.job_queue.clear_finished())
+        for row in reversed(range(self.job_table.rowCount())):
+            if self.job_table.item(row, 0).data(Qt.UserRole) in removed:
+                self.job_table.removeRow(row)
+        
+        # 重新建立任务ID到行号的映射
+        self.job_rows = {
+            self.job_table.item(row, 0).data(Qt.UserRole): row
+            for row in range(self.job_table.rowCount())
+        }
+        self._update_overall_progress()
+    
+    def cancel_processing(self):
+        """取消所有等待中和处理中的任务"""
+        self.job_queue.cancel_all()
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText("正在取消...")
+    
+    def open_search(self):
+        """打开搜索窗口"""
+        if self.search_dialog is None:
+            self.search_dialog = SearchDialog(self.search_index, self.thread_pool, self)
+        self.search_dialog.show()
+        self.search_dialog.raise_()
+        self.search_dialog.activateWindow()
+    
+    def closeEvent(self, event):
+        """关闭窗口时取消正在进行的处理"""
+        self.job_queue.cancel_all()
+        self.thread_pool.waitForDone(3000)
+        self.config_manager.flush()
+        super().closeEvent(event)
     
     def toggle_theme(self):
         """切换明亮/暗黑主题"""
@@ -0,0 +1,211 @@
+import json
+import time
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Optional, Dict, Any
+
+# 处理流程的各个阶段
+STAGES = ("read", "upload", "signed_url", "ocr", "save", "image_decode", "image_transcode", "disk_write")
+
+# 累计计数项及其说明
+COUNTERS = {
+    "bytes_uploaded": "上传的PDF字节数",
+    "bytes_written": "写入磁盘的结果字节数",
+    "bytes_downloaded": "流式接收的OCR响应字节数",
+    "pages": "OCR处理的页数",
+    "images": "保存的图片数",
+    "cache_hits": "命中OCR缓存的文档数",
+    "pages_reused": "增量处理时复用上次结果的页数"
+}
+
+
+class DocumentMetrics:
+    """
+    单个文档处理过程中的阶段耗时和计数
+
+    分片OCR和图片写入在多个线程中进行，image_decode和disk_write是各线程耗时的累计值，可能超过实际经过的时间。
+    """
+
+    def __init__(self, pdf_path: str, listener: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        初始化文档指标
+
+        Args:
+            pdf_path: PDF文件路径
+            listener: 阶段结束时接收事件字典的回调
+        """
+        self.pdf_path = pdf_path
+        self.listener = listener
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """统计代码块的耗时，结束时发出stage事件"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.add_time(name, seconds)
+            if self.listener:
+                self.listener({"event": "stage", "pdf_path": self.pdf_path, "stage": name,
+                               "seconds": round(seconds, 6)})
+
+    def add_time(self, name: str, seconds: float):
+        """累加阶段耗时（不发出事件，用于按图片统计的高频阶段）"""
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add(self, name: str, value: int = 1):
+        """累加计数"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """返回各阶段耗时（秒）和计数"""
+        with self._lock:
+            return {
+                "total_seconds": round(time.perf_counter() - self._start, 6),
+                "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+                "counters": dict(self.counters)
+            }
+
+
+class PipelineMetrics:
+    """汇总所有文档的处理指标，可写入JSON Lines文件并导出为Prometheus文本格式"""
+
+    def __init__(self, jsonl_path: Optional[str] = None):
+        """
+        初始化指标汇总
+
+        Args:
+            jsonl_path: 事件日志文件路径，每个事件写为一行JSON，为None时不记录事件
+        """
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._file = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+        self._stage_seconds = {name: 0.0 for name in STAGES}
+        self._stage_counts = {name: 0 for name in STAGES}
+        self._counters = {name: 0 for name in COUNTERS}
+        self._documents = {"success": 0, "failed": 0, "cancelled": 0}
+
+    def document(self, pdf_path: str) -> DocumentMetrics:
+        """创建文档指标，阶段事件写入事件日志"""
+        return DocumentMetrics(pdf_path, listener=self.emit)
+
+    def emit(self, event: Dict[str, Any]):
+        """写入一条事件"""
+        if self._file is None:
+            return
+        line = json.dumps(dict(event, ts=round(time.time(), 3)), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def observe(self, doc: DocumentMetrics, result: Dict[str, Any]):
+        """
+        汇总一个文档的指标并发出document事件
+
+        Args:
+            doc: 文档指标
+            result: process_pdf返回的结果字典
+        """
+        if result.get("cancelled"):
+            status = "cancelled"
+        elif result.get("success"):
+            status = "success"
+        else:
+            status = "failed"
+
+        summary = doc.to_dict()
+        with self._lock:
+            self._documents[status] += 1
+            for name, seconds in summary["stages"].items():
+                self._stage_seconds[name] = self._stage_seconds.get(name, 0.0) + seconds
+                self._stage_counts[name] = self._stage_counts.get(name, 0) + 1
+            for name, value in summary["counters"].items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+        self.emit(dict(summary, event="document", pdf_path=doc.pdf_path, status=status,
+                       message=result.get("message", "")))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回累计的阶段耗时、计数和文档数"""
+        with self._lock:
+            return {
+                "documents": dict(self._documents),
+                "stage_seconds": {name: round(seconds, 3) for name, seconds in self._stage_seconds.items()},
+                "counters": dict(self._counters)
+            }
+
+    def prometheus_text(self) -> str:
+        """以Prometheus文本格式导出累计指标"""
+        with self._lock:
+            stage_seconds = dict(self._stage_seconds)
+            stage_counts = dict(self._stage_counts)
+            counters = dict(self._counters)
+            documents = dict(self._documents)
+
+        lines = [
+            "# HELP mistral_ocr_documents_total 处理完成的文档数",
+            "# TYPE mistral_ocr_documents_total counter"
+        ]
+        for status, value in documents.items():
+            lines.append(f'mistral_ocr_documents_total{{status="{status}"}} {value}')
+
+        lines.append("# HELP mistral_ocr_stage_seconds 各阶段的累计耗时")
+        lines.append("# TYPE mistral_ocr_stage_seconds summary")
+        for name in stage_seconds:
+            lines.append(f'mistral_ocr_stage_seconds_sum{{stage="{name}"}} {stage_seconds[name]:.6f}')
+            lines.append(f'mistral_ocr_stage_seconds_count{{stage="{name}"}} {stage_counts.get(name, 0)}')
+
+        for name, value in counters.items():
+            metric = f"mistral_ocr_{name}_total"
+            lines.append(f"# HELP {metric} {COUNTERS.get(name, name)}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        在后台线程中启动HTTP服务，通过 /metrics 提供Prometheus文本格式的指标
+
+        Args:
+            port: 监听端口
+            host: 监听地址
+
+        Returns:
+            HTTP服务对象，调用shutdown()停止
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+    def close(self):
+        """关闭事件日志文件"""
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
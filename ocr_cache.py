@@ -0,0 +1,175 @@
+import os
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Dict, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from mistralai.models import OCRResponse
+
+
+class OCRCache:
+    """OCR结果的磁盘缓存，按PDF内容哈希和OCR选项寻址，超出容量时按LRU淘汰"""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024 ** 3):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存占用的最大字节数，超出后淘汰最久未使用的条目
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # 条目路径 -> (大小, 最近访问时间)
+        self._entries: Dict[Path, tuple] = {}
+        self._total_bytes = 0
+        for entry in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            self._entries[entry] = (stat.st_size, stat.st_mtime)
+            self._total_bytes += stat.st_size
+
+    @staticmethod
+    def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+        """
+        分块计算文件的SHA-256，避免一次性读入整个文件
+
+        Args:
+            path: 文件路径
+            chunk_size: 每次读取的字节数
+
+        Returns:
+            十六进制的哈希字符串
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(file_hash: str, model: str, include_image_base64: bool) -> str:
+        """根据PDF哈希和OCR选项生成缓存键"""
+        options = f"{file_hash}|{model}|{int(bool(include_image_base64))}"
+        return hashlib.sha256(options.encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        """缓存键对应的文件路径，按前两位分目录存放"""
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional["OCRResponse"]:
+        """
+        读取缓存的OCR响应
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            命中时返回OCR响应对象，否则返回None
+        """
+        from mistralai.models import OCRResponse
+
+        path = self._entry_path(key)
+        try:
+            data = path.read_text(encoding='utf-8')
+            response = OCRResponse.model_validate_json(data)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                self._forget(path)
+            return None
+        except Exception as e:
+            print(f"读取OCR缓存时出错: {e}")
+            with self._lock:
+                self.misses += 1
+                self._remove(path)
+            return None
+
+        # 更新访问时间，作为LRU淘汰依据
+        now = None
+        try:
+            os.utime(path)
+            now = path.stat().st_mtime
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+            size = len(data.encode('utf-8'))
+            if path not in self._entries:
+                self._total_bytes += size
+            self._entries[path] = (size, now or 0)
+
+        return response
+
+    def put(self, key: str, response: "OCRResponse"):
+        """
+        写入OCR响应，写入失败不影响OCR流程
+
+        Args:
+            key: 缓存键
+            response: OCR响应对象
+        """
+        path = self._entry_path(key)
+        try:
+            os.makedirs(path.parent, exist_ok=True)
+            data = response.model_dump_json().encode('utf-8')
+            # 先写入临时文件再重命名，避免并发读取到不完整的条目
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"写入OCR缓存时出错: {e}")
+            return
+
+        with self._lock:
+            self._forget(path)
+            self._entries[path] = (len(data), path.stat().st_mtime)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _forget(self, path: Path):
+        """从索引中移除条目（调用方需持有锁）"""
+        size, _ = self._entries.pop(path, (0, 0))
+        self._total_bytes -= size
+
+    def _remove(self, path: Path):
+        """删除条目文件并从索引中移除（调用方需持有锁）"""
+        self._forget(path)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """淘汰最久未使用的条目直到占用不超过上限（调用方需持有锁）"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        for path, _ in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._remove(path)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        """返回缓存命中统计信息"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size_bytes": self._total_bytes
+            }
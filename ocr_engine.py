@@ -1,24 +1,139 @@
-from mistralai import Mistral
 from mistralai import DocumentURLChunk
 from mistralai.models import OCRResponse
 from pathlib import Path
 import os
-import base64
 import time
-from typing import Callable, Optional, Dict, Any, List
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional, Dict, Any, List, Tuple, Iterable
+from ocr_cache import OCRCache
+from pdf_utils import count_pdf_pages, split_page_ranges, split_page_list, page_fingerprints
+from result_writer import ResultWriter, replace_images_in_markdown, decode_data_url, data_url_mime
+from request_scheduler import RequestScheduler
+from client_pool import get_registry
+from metrics import DocumentMetrics, PipelineMetrics
+from job_journal import JobJournal
+from raw_store import RawStore, RawStoreWriter, save_raw_response, raw_store_path
+from ocr_stream import OCRResponseStream
+from search_index import SearchIndex
+
+
+class OCRCancelledError(Exception):
+    """OCR处理被用户取消"""
+
+
+def covers_exact_pages(response: OCRResponse, pages: List[int]) -> bool:
+    """响应中的页码是否恰好是请求的页码，每页各一次"""
+    return sorted(page.index for page in response.pages) == sorted(pages)
+
+
+def merge_ocr_responses(responses: List[OCRResponse]) -> OCRResponse:
+    """
+    按页码顺序合并多个分片的OCR响应
+    
+    不同分片的图片ID可能重复，重复的图片会以页码为前缀重命名，并同步修改该页Markdown中的引用。
+    
+    Args:
+        responses: 各分片的OCR响应对象
+        
+    Returns:
+        合并后的OCR响应对象
+    """
+    pages = sorted((page for response in responses for page in response.pages), key=lambda page: page.index)
+    
+    seen_ids = set()
+    merged_pages = []
+    for page in pages:
+        renamed = {}
+        images = []
+        for img in page.images:
+            if img.id in seen_ids:
+                new_id = f"p{page.index}-{img.id}"
+                renamed[img.id] = new_id
+                img = img.model_copy(update={"id": new_id})
+            seen_ids.add(img.id)
+            images.append(img)
+        
+        if renamed:
+            markdown = page.markdown
+            for old_id, new_id in renamed.items():
+                markdown = markdown.replace(f"![{old_id}]({old_id})", f"![{new_id}]({new_id})")
+            page = page.model_copy(update={"images": images, "markdown": markdown})
+        merged_pages.append(page)
+    
+    update = {"pages": merged_pages}
+    usage_info = getattr(responses[0], "usage_info", None)
+    if usage_info is not None:
+        update["usage_info"] = usage_info.model_copy(update={"pages_processed": len(merged_pages)})
+    return responses[0].model_copy(update=update)
+
 
 class OCREngine:
     """Mistral OCR引擎，负责PDF文件的OCR处理"""
     
-    def __init__(self, api_key: str):
+    # 签名URL的有效期（小时）
+    signed_url_expiry = 1
+    
+    def __init__(self, api_key: str, model: str = "mistral-ocr-latest", include_image_base64: bool = True,
+                 cache: Optional[OCRCache] = None, shard_pages: Optional[int] = None,
+                 shard_workers: int = 4, shard_retries: int = 2, image_workers: int = 4,
+                 scheduler: Optional[RequestScheduler] = None, server_url: Optional[str] = None,
+                 metrics: Optional[PipelineMetrics] = None, journal_dir: Optional[str] = None,
+                 keep_raw: bool = False, image_format: Optional[str] = None, image_quality: int = 80,
+                 incremental: bool = False, page_index: bool = False, search_index: Optional[SearchIndex] = None,
+                 stream_response: bool = False):
         """
         初始化OCR引擎
         
         Args:
             api_key: Mistral API密钥
+            model: 使用的OCR模型名称
+            include_image_base64: 是否在OCR结果中返回图片数据，不需要图片时关闭可减小响应和磁盘占用
+            cache: OCR结果缓存，命中时跳过上传和OCR请求
+            shard_pages: 分片页数，页数超过该值的PDF按页码范围切分后并发OCR，为None时不分片
+            shard_workers: 并发处理的分片数
+            shard_retries: 失败分片的最大重试次数
+            image_workers: 保存结果时并行写入图片的线程数
+            scheduler: 请求调度器，负责限流和重试，可在多个引擎间共享
+            server_url: API服务地址，为None时使用默认地址
+            metrics: 指标汇总，记录每个文档各阶段的耗时和计数，可在多个引擎间共享
+            journal_dir: 任务日志目录，记录已完成的处理阶段，中断后重新处理同一文件时从中断处继续，为None时不记录
+            keep_raw: 是否在结果旁保存OCR原始结果（<PDF名称>.ocr目录），之后可用raw_store.py离线重新生成
+            image_format: 图片转码格式（webp或jpeg，需要Pillow），为None时按数据URL中的原格式保存
+            image_quality: 图片转码的有损压缩质量（1-100）
+            incremental: 是否按页增量处理，与上次保存的原始结果比较页面指纹，只OCR变化或新增的页（需要pypdf，隐含keep_raw）
+            page_index: 是否在结果Markdown旁写入页索引（<PDF名称>.index.json），可直接读取任意一页
+            search_index: 全文搜索索引，每个文档保存后按页更新，可在多个引擎间共享
+            stream_response: 是否流式接收OCR响应，每页接收完整后立即写入，内存占用与文档大小无关；
+                结果不写入缓存，与shard_pages或incremental同时使用时不生效
         """
         self.api_key = api_key
-        self.client = Mistral(api_key=api_key)
+        self.model = model
+        self.include_image_base64 = include_image_base64
+        self.cache = cache
+        self.shard_pages = shard_pages
+        self.shard_workers = shard_workers
+        self.shard_retries = shard_retries
+        self.image_workers = image_workers
+        self.scheduler = scheduler
+        self.server_url = server_url
+        self.metrics = metrics
+        self.journal_dir = journal_dir
+        self.incremental = incremental
+        self.keep_raw = keep_raw or incremental
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.page_index = page_index
+        self.search_index = search_index
+        self.stream_response = stream_response
+        # 同一API密钥共享客户端和连接池
+        self.client = get_registry().get_client(api_key, server_url)
+    
+    def cache_key(self, pdf_path: str) -> str:
+        """计算PDF文件在当前OCR选项下的缓存键"""
+        file_hash = OCRCache.hash_file(pdf_path)
+        return OCRCache.make_key(file_hash, self.model, self.include_image_base64)
         
     def replace_images_in_markdown(self, markdown_str: str, images_dict: dict) -> str:
         """
@@ -31,11 +146,13 @@ class OCREngine:
         Returns:
             替换后的Markdown字符串
         """
-        for img_name, img_path in images_dict.items():
-            markdown_str = markdown_str.replace(f"![{img_name}]({img_name})", f"![{img_name}]({img_path})")
-        return markdown_str
+        return replace_images_in_markdown(markdown_str, images_dict)
     
-    def save_ocr_results(self, ocr_response: OCRResponse, output_dir: str, pdf_name: str) -> str:
+    def save_ocr_results(self, ocr_response: OCRResponse, output_dir: str, pdf_name: str,
+                         cancel_event: Optional[threading.Event] = None,
+                         doc_metrics: Optional[DocumentMetrics] = None,
+                         journal: Optional[JobJournal] = None,
+                         fingerprints: Optional[List[str]] = None) -> str:
         """
         保存OCR结果
         
@@ -43,42 +160,546 @@ class OCREngine:
             ocr_response: OCR响应对象
             output_dir: 输出目录
             pdf_name: PDF文件名（不含扩展名）
+            cancel_event: 取消事件，设置后停止写入并删除已写入的部分结果
+            doc_metrics: 文档指标，记录图片解码和磁盘写入的耗时
+            journal: 任务日志，定期记录写入进度，上次写入中断时从最后记录的页继续
+            fingerprints: 每页PDF内容的指纹，与原始结果一起保存，供之后按页增量处理
             
         Returns:
             结果Markdown文件的路径
         """
-        # 创建输出目录
-        output_dir = Path(output_dir)
-        os.makedirs(output_dir, exist_ok=True)
-        images_dir = output_dir / "images"
-        os.makedirs(images_dir, exist_ok=True)
-        
-        all_markdowns = []
-        for page in ocr_response.pages:
-            # 保存图片
-            page_images = {}
-            for img in page.images:
+        md_file_path = Path(output_dir) / f"{pdf_name}.md"
+        resume_pages, resume_bytes = journal.save_progress(md_file_path) if journal else (0, 0)
+        
+        # 逐页追加Markdown，图片由线程池并行写入，不在内存中拼接整个文档
+        try:
+            with ResultWriter(output_dir, pdf_name, image_workers=self.image_workers, metrics=doc_metrics,
+                              resume_pages=resume_pages, resume_bytes=resume_bytes,
+                              image_format=self.image_format, image_quality=self.image_quality,
+                              page_index=self.page_index) as writer:
+                for page in ocr_response.pages[resume_pages:]:
+                    self._check_cancelled(cancel_event)
+                    writer.write_page(page)
+                    if journal and writer.page_count % journal.checkpoint_pages == 0:
+                        journal.record_progress(md_file_path, *writer.checkpoint())
+        except BaseException:
+            # 已写入的结果已被删除，下次需要从头写入
+            if journal:
+                journal.reset_progress()
+            raise
+        
+        if self.keep_raw:
+            # 原始结果只用于之后重新生成，保存失败不影响本次结果
+            try:
+                save_raw_response(ocr_response, str(raw_store_path(output_dir, pdf_name)), fingerprints,
+                                  self._ocr_options())
+            except Exception as e:
+                print(f"保存OCR原始结果时出错: {e}")
+        
+        self._update_search_index(str(writer.md_file_path), (page.markdown for page in ocr_response.pages),
+                                  pdf_name)
+        return str(writer.md_file_path)
+    
+    def _update_search_index(self, md_file_path: str, pages: Iterable[str], pdf_name: str):
+        """按页更新全文搜索索引"""
+        if self.search_index is None:
+            return
+        # 搜索索引可随时用search_index.py重建，更新失败不影响本次结果
+        try:
+            self.search_index.index_document(md_file_path, pages, pdf_name)
+        except Exception as e:
+            print(f"更新搜索索引时出错: {e}")
+    
+    @staticmethod
+    def _check_cancelled(cancel_event: Optional[threading.Event]):
+        """如果已请求取消则抛出OCRCancelledError"""
+        if cancel_event is not None and cancel_event.is_set():
+            raise OCRCancelledError("处理已取消")
+    
+    def _call_api(self, func: Callable, *args, cancel_event: Optional[threading.Event] = None,
+                  page_cost: int = 0, **kwargs):
+        """
+        调用API，经过调度器限流和重试，提供取消事件时可在请求返回前放弃等待
+        
+        阻塞的HTTP请求无法从外部中断，因此在后台线程中执行，取消后不再等待其结果。
+        
+        Args:
+            func: 要调用的API方法
+            *args: 位置参数
+            cancel_event: 取消事件
+            page_cost: 本次请求处理的页数，用于按页数限流
+            **kwargs: 关键字参数
+            
+        Returns:
+            API方法的返回值
+        """
+        if self.scheduler is not None:
+            args = (func,) + args
+            kwargs["page_cost"] = page_cost
+            func = self.scheduler.call
+        
+        if cancel_event is None:
+            return func(*args, **kwargs)
+        
+        self._check_cancelled(cancel_event)
+        outcome = {}
+        done = threading.Event()
+        
+        def target():
+            try:
+                outcome["value"] = func(*args, **kwargs)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                done.set()
+        
+        threading.Thread(target=target, name="ocr-request", daemon=True).start()
+        while not done.wait(0.1):
+            self._check_cancelled(cancel_event)
+        
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["value"]
+    
+    def _document_metrics(self, pdf_path: str) -> DocumentMetrics:
+        """创建文档指标，配置了指标汇总时阶段事件同时写入事件日志"""
+        return self.metrics.document(pdf_path) if self.metrics else DocumentMetrics(pdf_path)
+    
+    def _ocr_options(self) -> Dict[str, Any]:
+        """影响OCR结果的选项，选项不同的原始结果不能复用"""
+        return {"model": self.model, "include_image_base64": self.include_image_base64}
+    
+    def _reuse_previous_pages(self, fingerprints: Optional[List[str]], output_dir: str,
+                              pdf_name: str) -> Tuple[Optional[OCRResponse], List[int]]:
+        """
+        与上次保存的原始结果比较页面指纹，找出可以复用的页
+        
+        页面按指纹匹配，修订时插入、删除或移动页面不影响其他页的复用。
+        
+        Args:
+            fingerprints: 本次PDF每页的指纹
+            output_dir: 输出目录
+            pdf_name: PDF文件名（不含扩展名）
+            
+        Returns:
+            (由可复用的页组成的响应, 需要重新OCR的页码列表)，没有可复用的结果时响应为None
+        """
+        if not fingerprints:
+            return None, []
+        try:
+            store = RawStore(str(raw_store_path(output_dir, pdf_name)))
+        except FileNotFoundError:
+            return None, []
+        except Exception as e:
+            print(f"读取上次的OCR原始结果时出错，将处理全部页面: {e}")
+            return None, []
+        
+        previous_fingerprints = store.fingerprints
+        if (store.options != self._ocr_options() or not previous_fingerprints
+                or len(previous_fingerprints) != store.page_count):
+            return None, []
+        
+        previous_pages = {}
+        for index, fingerprint in enumerate(previous_fingerprints):
+            previous_pages.setdefault(fingerprint, index)
+        reused = {index: previous_pages[fingerprint] for index, fingerprint in enumerate(fingerprints)
+                  if fingerprint in previous_pages}
+        if not reused:
+            return None, []
+        
+        try:
+            previous = store.load_response()
+        except Exception as e:
+            print(f"读取上次的OCR原始结果时出错，将处理全部页面: {e}")
+            return None, []
+        pages = [previous.pages[old_index].model_copy(update={"index": index})
+                 for index, old_index in reused.items()]
+        changed = [index for index in range(len(fingerprints)) if index not in reused]
+        return previous.model_copy(update={"pages": pages}), changed
+    
+    def _needs_page_count(self) -> bool:
+        """分片或按页数限流时需要事先知道文档页数"""
+        return bool(self.shard_pages) or bool(self.scheduler and self.scheduler.pages_per_minute)
+    
+    def _upload_file(self, pdf_file: Path):
+        """上传文件，以文件句柄分块流式发送，内存占用与文件大小无关"""
+        with open(pdf_file, 'rb') as f:
+            return self.client.files.upload(
+                file={
+                    "file_name": pdf_file.stem,
+                    "content": f,
+                },
+                purpose="ocr",
+            )
+    
+    def _open_journal(self, key: Optional[str], output_dir: str, pdf_name: str) -> Optional[JobJournal]:
+        """
+        打开任务日志，未配置日志目录时返回None
+        
+        日志按缓存键和结果Markdown路径区分，同一PDF同时输出到不同位置的任务不会共用日志。
+        """
+        if not self.journal_dir or not key:
+            return None
+        md_file_path = os.path.abspath(os.path.join(output_dir, f"{pdf_name}.md"))
+        output_hash = hashlib.sha256(md_file_path.encode('utf-8')).hexdigest()[:16]
+        return JobJournal(self.journal_dir, f"{key}-{output_hash}")
+    
+    def _request_signed_url(self, file_id: str, cancel_event: Optional[threading.Event],
+                            doc_metrics: DocumentMetrics, journal: Optional[JobJournal]) -> str:
+        """获取已上传文件的签名URL并记录到任务日志"""
+        with doc_metrics.stage("signed_url"):
+            signed_url = self._call_api(self.client.files.get_signed_url, file_id=file_id,
+                                        expiry=self.signed_url_expiry, cancel_event=cancel_event)
+        if journal:
+            journal.record_signed_url(signed_url.url, self.signed_url_expiry)
+        return signed_url.url
+    
+    def _get_document_url(self, pdf_file: Path, progress_callback: Optional[Callable[[str, float], None]],
+                          cancel_event: Optional[threading.Event], doc_metrics: DocumentMetrics,
+                          journal: Optional[JobJournal]) -> str:
+        """
+        上传PDF并获取签名URL，任务日志中有未过期的签名URL或已上传的文件时跳过对应步骤
+        
+        Returns:
+            文档的签名URL
+        """
+        if journal:
+            document_url = journal.signed_url()
+            if document_url:
+                return document_url
+            
+            file_id = journal.uploaded_file_id()
+            if file_id:
+                try:
+                    return self._request_signed_url(file_id, cancel_event, doc_metrics, journal)
+                except OCRCancelledError:
+                    raise
+                except Exception as e:
+                    print(f"之前上传的文件已不可用，重新上传: {e}")
+        
+        # 上传文件
+        try:
+            with doc_metrics.stage("upload"):
+                uploaded_file = self._call_api(self._upload_file, pdf_file, cancel_event=cancel_event)
+        except OCRCancelledError:
+            raise
+        except Exception as e:
+            raise Exception(f"上传PDF文件失败: {str(e)}")
+        doc_metrics.add("bytes_uploaded", pdf_file.stat().st_size)
+        if journal:
+            journal.record_upload(uploaded_file.id)
+        
+        # 通知进度：上传完成
+        if progress_callback:
+            progress_callback("PDF上传完成，正在处理...", 0.3)
+        
+        # 获取签名URL
+        try:
+            return self._request_signed_url(uploaded_file.id, cancel_event, doc_metrics, journal)
+        except OCRCancelledError:
+            raise
+        except Exception as e:
+            raise Exception(f"获取签名URL失败: {str(e)}")
+    
+    def _run_remote_ocr(self, pdf_file: Path, progress_callback: Optional[Callable[[str, float], None]] = None,
+                        cancel_event: Optional[threading.Event] = None,
+                        doc_metrics: Optional[DocumentMetrics] = None,
+                        journal: Optional[JobJournal] = None,
+                        pages: Optional[List[int]] = None) -> OCRResponse:
+        """
+        上传PDF并调用OCR接口
+        
+        Args:
+            pdf_file: PDF文件路径
+            progress_callback: 进度回调函数
+            cancel_event: 取消事件
+            doc_metrics: 文档指标，记录上传、签名URL和OCR阶段的耗时
+            journal: 任务日志，记录上传的文件、签名URL和已完成的分片
+            pages: 需要处理的页码列表（从0开始），为None时处理全部页面
+            
+        Returns:
+            OCR响应对象
+        """
+        doc_metrics = doc_metrics or DocumentMetrics(str(pdf_file))
+        document_url = self._get_document_url(pdf_file, progress_callback, cancel_event, doc_metrics, journal)
+        
+        # 通知进度：开始OCR
+        if progress_callback:
+            progress_callback("正在进行OCR处理...", 0.5)
+        
+        # 处理PDF，超过分片页数的文档切分后并发处理
+        page_count = 0
+        if pages is None and self._needs_page_count():
+            with doc_metrics.stage("read"):
+                page_count = count_pdf_pages(str(pdf_file))
+        ocr_page_count = len(pages) if pages is not None else page_count
+        with doc_metrics.stage("ocr"):
+            if self.shard_pages and ocr_page_count > self.shard_pages:
+                pdf_response = self._run_sharded_ocr(document_url, page_count, progress_callback, cancel_event, journal,
+                                                     pages)
+            else:
                 try:
-                    img_data = base64.b64decode(img.image_base64.split(',')[1])
-                    img_path = images_dir / f"{img.id}.png"
-                    with open(img_path, 'wb') as f:
-                        f.write(img_data)
-                    page_images[img.id] = f"images/{img.id}.png"
+                    pdf_response = self._ocr_pages(document_url, pages, cancel_event=cancel_event, page_count=page_count)
+                except OCRCancelledError:
+                    raise
                 except Exception as e:
-                    print(f"保存图片时出错: {e}")
+                    raise Exception(f"OCR处理失败: {str(e)}")
+        doc_metrics.add("pages", len(pdf_response.pages))
+        
+        # 通知进度：OCR完成，保存结果
+        if progress_callback:
+            progress_callback("OCR处理完成，正在保存结果...", 0.8)
+        
+        return pdf_response
+    
+    def _ocr_pages(self, document_url: str, pages: Optional[List[int]] = None,
+                   cancel_event: Optional[threading.Event] = None, page_count: int = 0) -> OCRResponse:
+        """
+        对文档（或其中的指定页）调用OCR接口
+        
+        Args:
+            document_url: 文档的签名URL
+            pages: 需要处理的页码列表（从0开始），为None时处理全部页面
+            cancel_event: 取消事件
+            page_count: 处理全部页面时的文档页数，用于按页数限流
             
-            # 处理markdown内容
-            page_markdown = self.replace_images_in_markdown(page.markdown, page_images)
-            all_markdowns.append(page_markdown)
+        Returns:
+            OCR响应对象
+        """
+        kwargs = {"pages": pages} if pages is not None else {}
+        return self._call_api(
+            self.client.ocr.process,
+            document=DocumentURLChunk(document_url=document_url), 
+            model=self.model, 
+            include_image_base64=self.include_image_base64,
+            cancel_event=cancel_event,
+            page_cost=len(pages) if pages is not None else page_count,
+            **kwargs
+        )
+    
+    def _run_sharded_ocr(self, document_url: str, page_count: int, progress_callback: Optional[Callable[[str, float], None]] = None,
+                         cancel_event: Optional[threading.Event] = None,
+                         journal: Optional[JobJournal] = None,
+                         pages: Optional[List[int]] = None) -> OCRResponse:
+        """
+        按页码范围切分文档并发OCR，失败的分片单独重试，最后按页码顺序合并
         
-        # 保存完整markdown，使用PDF文件名
-        md_file_path = output_dir / f"{pdf_name}.md"
-        with open(md_file_path, 'w', encoding='utf-8') as f:
-            f.write("\n\n".join(all_markdowns))
+        Args:
+            document_url: 文档的签名URL
+            page_count: 文档总页数
+            progress_callback: 进度回调函数
+            cancel_event: 取消事件
+            journal: 任务日志，记录已完成的分片，之前完成的分片不再重复请求
+            pages: 只处理的页码列表，为None时处理全部页面
             
-        return str(md_file_path)
+        Returns:
+            合并后的OCR响应对象
+        """
+        if pages is None:
+            shards = split_page_ranges(page_count, self.shard_pages)
+        else:
+            shards = split_page_list(pages, self.shard_pages)
+        responses = {}
+        errors = {}
+        if journal:
+            for i in range(len(shards)):
+                response = journal.load_shard(i, shards)
+                if response is not None:
+                    responses[i] = response
+        pending = [i for i in range(len(shards)) if i not in responses]
+        
+        for attempt in range(self.shard_retries + 1):
+            with ThreadPoolExecutor(max_workers=max(1, min(self.shard_workers, len(pending)))) as executor:
+                futures = {executor.submit(self._ocr_pages, document_url, shards[i], cancel_event): i for i in pending}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        responses[i] = future.result()
+                        errors.pop(i, None)
+                    except Exception as e:
+                        errors[i] = e
+                        continue
+                    if journal:
+                        journal.save_shard(i, shards, responses[i])
+                    
+                    # 通知进度：OCR阶段按完成的分片比例推进
+                    if progress_callback:
+                        progress_callback(f"正在进行OCR处理（{len(responses)}/{len(shards)}）...", 
+                                          0.5 + 0.3 * len(responses) / len(shards))
+            
+            self._check_cancelled(cancel_event)
+            pending = sorted(errors)
+            if not pending:
+                break
+        
+        if pending:
+            first = shards[pending[0]]
+            raise Exception(f"OCR处理失败: {len(pending)}个分片重试后仍失败，"
+                            f"第{first[0] + 1}-{first[-1] + 1}页: {str(errors[pending[0]])}")
+        
+        return merge_ocr_responses([responses[i] for i in range(len(shards))])
+    
+    def _run_incremental_ocr(self, pdf_file: Path, output_dir: str, fingerprints: Optional[List[str]],
+                             progress_callback: Optional[Callable[[str, float], None]],
+                             cancel_event: Optional[threading.Event], doc_metrics: DocumentMetrics,
+                             journal: Optional[JobJournal]) -> OCRResponse:
+        """
+        只OCR与上次结果相比变化或新增的页，与复用的页按页码顺序拼接；没有可复用的结果时处理全部页面
+        
+        Args:
+            pdf_file: PDF文件路径
+            output_dir: 输出目录
+            fingerprints: 每页PDF内容的指纹，为None时处理全部页面
+            progress_callback: 进度回调函数
+            cancel_event: 取消事件
+            doc_metrics: 文档指标
+            journal: 任务日志
+            
+        Returns:
+            OCR响应对象
+        """
+        with doc_metrics.stage("read"):
+            previous, changed = self._reuse_previous_pages(fingerprints, output_dir, pdf_file.stem)
+        if previous is None:
+            return self._run_remote_ocr(pdf_file, progress_callback, cancel_event, doc_metrics, journal)
+        
+        if not changed:
+            doc_metrics.add("pages_reused", len(previous.pages))
+            return previous
+        if progress_callback:
+            progress_callback(f"复用上次结果中的{len(previous.pages)}页，重新处理{len(changed)}页...", 0.1)
+        fresh = self._run_remote_ocr(pdf_file, progress_callback, cancel_event, doc_metrics, journal, changed)
+        if not covers_exact_pages(fresh, changed):
+            # 返回的页与请求的页不一致时拼接会重复或缺页，改为重新处理全部页面
+            print(f"{pdf_file.name} 按页重新处理的结果与请求的页不一致，改为处理全部页面")
+            return self._run_remote_ocr(pdf_file, progress_callback, cancel_event, doc_metrics, journal)
+        doc_metrics.add("pages_reused", len(previous.pages))
+        return merge_ocr_responses([fresh, previous])
     
-    def process_pdf(self, pdf_path: str, output_dir: str, progress_callback: Optional[Callable[[str, float], None]] = None) -> Dict[str, Any]:
+    def _can_stream(self) -> bool:
+        """分片和增量处理需要完整的响应对象来合并，不能流式接收"""
+        return self.stream_response and not self.shard_pages and not self.incremental
+    
+    def _run_streaming_ocr(self, pdf_file: Path, output_dir: str,
+                           progress_callback: Optional[Callable[[str, float], None]],
+                           cancel_event: Optional[threading.Event], doc_metrics: DocumentMetrics,
+                           journal: Optional[JobJournal], fingerprints: Optional[List[str]]) -> str:
+        """
+        上传PDF并流式接收OCR结果，每页接收完整后立即写入Markdown和图片
+        
+        Args:
+            pdf_file: PDF文件路径
+            output_dir: 输出目录
+            progress_callback: 进度回调函数
+            cancel_event: 取消事件
+            doc_metrics: 文档指标
+            journal: 任务日志，记录上传的文件和签名URL
+            fingerprints: 每页PDF内容的指纹，与原始结果一起保存
+            
+        Returns:
+            结果Markdown文件的路径
+        """
+        document_url = self._get_document_url(pdf_file, progress_callback, cancel_event, doc_metrics, journal)
+        if progress_callback:
+            progress_callback("正在进行OCR处理...", 0.5)
+        
+        page_count = 0
+        if self._needs_page_count():
+            with doc_metrics.stage("read"):
+                page_count = count_pdf_pages(str(pdf_file))
+        # 整个请求和写入作为一次调用，出错重试时重新写入全部结果
+        with doc_metrics.stage("ocr"):
+            try:
+                output_file, pages = self._call_api(self._stream_ocr_to_disk, document_url, output_dir, pdf_file.stem,
+                                                    progress_callback, cancel_event, doc_metrics, fingerprints,
+                                                    cancel_event=cancel_event, page_cost=page_count)
+            except OCRCancelledError:
+                raise
+            except Exception as e:
+                raise Exception(f"OCR处理失败: {str(e)}")
+        doc_metrics.add("pages", pages)
+        return output_file
+    
+    def _stream_ocr_to_disk(self, document_url: str, output_dir: str, pdf_name: str,
+                            progress_callback: Optional[Callable[[str, float], None]],
+                            cancel_event: Optional[threading.Event], doc_metrics: DocumentMetrics,
+                            fingerprints: Optional[List[str]]) -> Tuple[str, int]:
+        """
+        发送OCR请求，边接收响应边写入结果，出错或取消时删除已写入的部分结果
+        
+        Returns:
+            (结果Markdown文件的路径, 页数)
+        """
+        body = {
+            "model": self.model,
+            "document": {"type": "document_url", "document_url": document_url},
+            "include_image_base64": self.include_image_base64
+        }
+        raw_writer = RawStoreWriter(str(raw_store_path(output_dir, pdf_name))) if self.keep_raw else None
+        markdowns = []
+        with ResultWriter(output_dir, pdf_name, image_workers=self.image_workers, metrics=doc_metrics,
+                          image_format=self.image_format, image_quality=self.image_quality,
+                          page_index=self.page_index) as writer:
+            # 原始结果在结果写入器清理输出目录之前删除
+            try:
+                if raw_writer:
+                    raw_writer.open()
+                with OCRResponseStream(self.client.sdk_configuration.client, self.api_key, body,
+                                       self.server_url) as stream:
+                    for page in stream.pages():
+                        self._check_cancelled(cancel_event)
+                        self._write_streamed_page(page, writer, raw_writer, doc_metrics)
+                        if self.search_index is not None:
+                            markdowns.append(page.get("markdown", ""))
+                        if progress_callback:
+                            progress_callback(f"正在接收OCR结果（已保存{writer.page_count}页）...", 0.8)
+            except BaseException:
+                if raw_writer:
+                    raw_writer.discard()
+                raise
+        doc_metrics.add("bytes_downloaded", stream.bytes_received)
+        
+        if raw_writer:
+            # 原始结果只用于之后重新生成，保存失败不影响本次结果
+            try:
+                raw_writer.close(stream.fields, fingerprints, self._ocr_options())
+            except Exception as e:
+                print(f"保存OCR原始结果时出错: {e}")
+        self._update_search_index(str(writer.md_file_path), markdowns, pdf_name)
+        return str(writer.md_file_path), writer.page_count
+    
+    @staticmethod
+    def _write_streamed_page(page: Dict[str, Any], writer: ResultWriter, raw_writer: Optional[RawStoreWriter],
+                             doc_metrics: DocumentMetrics):
+        """解码一页的图片并写入结果和原始结果，图片只解码一次"""
+        images = []
+        for img in page.get("images") or []:
+            image_base64 = img.get("image_base64")
+            if not image_base64:
+                images.append((img, None, ""))
+                continue
+            start = time.perf_counter()
+            try:
+                data = decode_data_url(image_base64)
+            except Exception as e:
+                print(f"保存图片时出错: {e}")
+                continue
+            doc_metrics.add_time("image_decode", time.perf_counter() - start)
+            comma = image_base64.find(',', 0, 256)
+            images.append((img, data, image_base64[:comma + 1] if comma >= 0 else ""))
+        
+        writer.write_raw_page(page.get("markdown", ""),
+                              [(img["id"], data, data_url_mime(prefix)) for img, data, prefix in images
+                               if data is not None])
+        if raw_writer:
+            raw_writer.write_decoded_page(
+                {key: value for key, value in page.items() if key != "images"},
+                [({key: value for key, value in img.items() if key != "image_base64"}, data, prefix)
+                 for img, data, prefix in images]
+            )
+    
+    def process_pdf(self, pdf_path: str, output_dir: str, progress_callback: Optional[Callable[[str, float], None]] = None,
+                    cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
         """
         处理PDF文件
         
@@ -86,6 +707,7 @@ class OCREngine:
             pdf_path: PDF文件路径
             output_dir: 输出目录
             progress_callback: 进度回调函数，接收状态消息和进度百分比
+            cancel_event: 取消事件，设置后放弃进行中的请求并删除已写入的部分结果
             
         Returns:
             处理结果信息的字典
@@ -96,60 +718,66 @@ class OCREngine:
             "output_file": "",
             "output_dir": ""
         }
+        doc_metrics = self._document_metrics(pdf_path)
+        journal = None
         
         try:
             # 确认PDF文件存在
             pdf_file = Path(pdf_path)
             if not pdf_file.is_file():
                 raise FileNotFoundError(f"PDF文件不存在: {pdf_path}")
+            output_dir = output_dir or f"ocr_results_{pdf_file.stem}"
             
             # 通知进度：开始处理
             if progress_callback:
                 progress_callback("正在准备PDF文件...", 0.1)
             
-            # 上传文件
-            try:
-                uploaded_file = self.client.files.upload(
-                    file={
-                        "file_name": pdf_file.stem,
-                        "content": pdf_file.read_bytes(),
-                    },
-                    purpose="ocr",
-                )
-            except Exception as e:
-                raise Exception(f"上传PDF文件失败: {str(e)}")
-            
-            # 通知进度：上传完成
-            if progress_callback:
-                progress_callback("PDF上传完成，正在处理...", 0.3)
-            
-            # 获取签名URL
-            try:
-                signed_url = self.client.files.get_signed_url(file_id=uploaded_file.id, expiry=1)
-            except Exception as e:
-                raise Exception(f"获取签名URL失败: {str(e)}")
-            
-            # 通知进度：开始OCR
-            if progress_callback:
-                progress_callback("正在进行OCR处理...", 0.5)
+            fingerprints = None
+            if self.incremental:
+                with doc_metrics.stage("read"):
+                    fingerprints = page_fingerprints(str(pdf_file))
             
-            # 处理PDF
-            try:
-                pdf_response = self.client.ocr.process(
-                    document=DocumentURLChunk(document_url=signed_url.url), 
-                    model="mistral-ocr-latest", 
-                    include_image_base64=True
-                )
-            except Exception as e:
-                raise Exception(f"OCR处理失败: {str(e)}")
+            # 查询缓存，命中时直接保存结果，不发起任何网络请求
+            pdf_response = None
+            cache_key = None
+            if self.cache or self.journal_dir:
+                with doc_metrics.stage("read"):
+                    cache_key = self.cache_key(pdf_path)
+                    if self.cache:
+                        pdf_response = self.cache.get(cache_key)
             
-            # 通知进度：OCR完成，保存结果
-            if progress_callback:
-                progress_callback("OCR处理完成，正在保存结果...", 0.8)
+            # 之前的处理中断时，从任务日志中恢复已完成的阶段
+            journal = self._open_journal(cache_key, output_dir, pdf_file.stem)
+            output_file = None
+            if pdf_response is not None:
+                doc_metrics.add("cache_hits")
+                if progress_callback:
+                    progress_callback("命中OCR缓存，正在保存结果...", 0.8)
+            else:
+                if journal and journal.resumed:
+                    if progress_callback:
+                        progress_callback("发现未完成的处理记录，从中断处继续...", 0.1)
+                    pdf_response = journal.load_response()
+                
+                if pdf_response is None and self._can_stream():
+                    output_file = self._run_streaming_ocr(pdf_file, output_dir, progress_callback, cancel_event,
+                                                          doc_metrics, journal, fingerprints)
+                elif pdf_response is None:
+                    pdf_response = self._run_incremental_ocr(pdf_file, output_dir, fingerprints, progress_callback,
+                                                             cancel_event, doc_metrics, journal)
+                    # 启用缓存时OCR结果已保存在缓存中，任务日志不再重复保存
+                    if self.cache:
+                        self.cache.put(cache_key, pdf_response)
+                    elif journal:
+                        journal.save_response(pdf_response)
             
-            # 保存结果
-            output_dir = output_dir or f"ocr_results_{pdf_file.stem}"
-            output_file = self.save_ocr_results(pdf_response, output_dir, pdf_file.stem)
+            # 保存结果，流式接收时已在接收过程中写入
+            if output_file is None:
+                with doc_metrics.stage("save"):
+                    output_file = self.save_ocr_results(pdf_response, output_dir, pdf_file.stem, cancel_event,
+                                                        doc_metrics, journal, fingerprints)
+            if journal:
+                journal.complete()
             
             # 通知进度：处理完成
             if progress_callback:
@@ -162,9 +790,15 @@ class OCREngine:
             
         except FileNotFoundError as e:
             result["message"] = str(e)
+        except OCRCancelledError as e:
+            result["message"] = str(e)
+            result["cancelled"] = True
         except Exception as e:
             result["message"] = f"处理PDF时出错: {str(e)}"
-            
+        
+        result["metrics"] = doc_metrics.to_dict()
+        if self.metrics:
+            self.metrics.observe(doc_metrics, result)
         return result
     
     def validate_connection(self) -> bool:
@@ -174,8 +808,4 @@ class OCREngine:
         Returns:
             连接有效返回True，否则返回False
         """
-        try:
-            self.client.models.list()
-            return True
-        except Exception:
-            return False 
\ No newline at end of file
+        return get_registry().validate(self.api_key, self.server_url) 
\ No newline at end of file
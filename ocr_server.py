@@ -0,0 +1,586 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mistral OCR HTTP服务
+作为共享的内部服务运行，多个客户端通过HTTP提交PDF、查询状态并下载结果，
+所有任务由同一个OCR引擎的工作线程池处理，共享连接池、限流和缓存
+
+接口:
+    POST   /jobs?filename=a.pdf      请求体为PDF内容，返回任务ID（队列已满时返回503）
+    GET    /jobs                     所有任务的状态
+    GET    /jobs/<id>                任务状态和进度
+    GET    /jobs/<id>/result         结果Markdown
+    GET    /jobs/<id>/result.zip     流式下载Markdown和图片目录的ZIP
+    GET    /jobs/<id>/pages/<页码>   单页Markdown和引用的图片（页码从0开始，需要--page-index）
+    GET    /jobs/<id>/files/<路径>   下载结果目录中的单个文件（如 images/img-0.jpeg）
+    DELETE /jobs/<id>                取消任务并删除其文件
+    GET    /health                   服务状态
+    GET    /metrics                  Prometheus格式的指标
+
+用法:
+    python ocr_server.py --port 8080 -w 8 --token secret
+    curl -H "Authorization: Bearer secret" --data-binary @a.pdf "http://127.0.0.1:8080/jobs?filename=a.pdf"
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import shutil
+import signal
+import zipfile
+import argparse
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlparse, parse_qs, unquote
+
+from ocr_engine import OCREngine, OCRCancelledError
+from batch_ocr import add_engine_arguments, prepare_engine
+from raw_store import RAW_STORE_SUFFIX
+from result_writer import PageIndex
+
+# 已压缩的图片格式在ZIP中直接存储，不再压缩
+_STORED_SUFFIXES = frozenset((".jpeg", ".jpg", ".png", ".webp", ".gif"))
+_COPY_CHUNK = 64 * 1024
+
+
+class OCRJob:
+    """服务中的单个OCR任务"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+    def __init__(self, job_id: str, filename: str, job_dir: Path):
+        """
+        初始化任务
+
+        Args:
+            job_id: 任务ID
+            filename: 客户端提交的文件名
+            job_dir: 任务目录，保存上传的PDF和输出结果
+        """
+        self.id = job_id
+        self.filename = filename
+        self.job_dir = job_dir
+        self.pdf_path = job_dir / "input" / filename
+        self.output_dir = job_dir / "output"
+        self.status = self.QUEUED
+        self.message = "等待处理"
+        self.progress = 0.0
+        self.output_file = ""
+        self.metrics: Optional[Dict[str, Any]] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务状态"""
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "message": self.message,
+            "progress": round(self.progress, 3),
+            "created_at": round(self.created_at, 3),
+            "started_at": round(self.started_at, 3) if self.started_at else None,
+            "finished_at": round(self.finished_at, 3) if self.finished_at else None,
+            "metrics": self.metrics
+        }
+
+
+class JobManager:
+    """有界任务队列和工作线程池，所有任务共享同一个OCR引擎"""
+
+    def __init__(self, engine: OCREngine, work_dir: str, workers: int = 4, queue_size: int = 100,
+                 retention_seconds: float = 24 * 3600):
+        """
+        初始化任务管理器
+
+        Args:
+            engine: OCR引擎实例（在多个工作线程间共享）
+            work_dir: 保存上传文件和结果的目录
+            workers: 工作线程数
+            queue_size: 等待处理的任务数上限，已满时拒绝新任务
+            retention_seconds: 已结束任务的文件保留时间（秒）
+        """
+        self.engine = engine
+        self.work_dir = Path(work_dir)
+        self.workers = max(1, workers)
+        self.retention_seconds = retention_seconds
+        self.jobs: Dict[str, OCRJob] = {}
+        self._queue: "queue.Queue[OCRJob]" = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        """启动工作线程"""
+        os.makedirs(self.work_dir, exist_ok=True)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ocr-server-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """停止接收任务，取消等待中的任务并等待处理中的任务结束"""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join()
+
+    def create_job(self, filename: str) -> OCRJob:
+        """创建任务目录，上传完成后调用submit加入队列"""
+        self.cleanup()
+        job_id = uuid.uuid4().hex
+        job = OCRJob(job_id, filename, self.work_dir / job_id)
+        os.makedirs(job.pdf_path.parent, exist_ok=True)
+        return job
+
+    def submit(self, job: OCRJob) -> bool:
+        """加入任务队列，队列已满时删除任务目录并返回False"""
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                shutil.rmtree(job.job_dir, ignore_errors=True)
+                return False
+            self.jobs[job.id] = job
+        return True
+
+    def get(self, job_id: str) -> Optional[OCRJob]:
+        """按ID查找任务"""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> List[OCRJob]:
+        """所有任务，按创建时间排序"""
+        with self._lock:
+            return sorted(self.jobs.values(), key=lambda job: job.created_at)
+
+    def delete(self, job_id: str) -> bool:
+        """取消任务并删除其文件，处理中的任务在工作线程结束后删除"""
+        with self._lock:
+            job = self.jobs.pop(job_id, None)
+        if job is None:
+            return False
+        job.cancel_event.set()
+        if job.status in OCRJob.FINISHED:
+            shutil.rmtree(job.job_dir, ignore_errors=True)
+        return True
+
+    def queue_length(self) -> int:
+        """等待处理的任务数"""
+        return self._queue.qsize()
+
+    def cleanup(self):
+        """删除超过保留时间的已结束任务"""
+        deadline = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [job for job in self.jobs.values()
+                       if job.status in OCRJob.FINISHED and job.finished_at and job.finished_at < deadline]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.job_dir, ignore_errors=True)
+
+    def _work(self):
+        """工作线程：从队列中取出任务并处理"""
+        while not self._stop_event.is_set():
+            try:
+                job = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+        # 服务停止时取消仍在排队的任务
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            job.status = OCRJob.CANCELLED
+            job.message = "服务已停止"
+            job.finished_at = time.time()
+
+    def _run(self, job: OCRJob):
+        """处理单个任务"""
+        if job.cancel_event.is_set():
+            job.status = OCRJob.CANCELLED
+            job.message = "处理已取消"
+            job.finished_at = time.time()
+        else:
+            job.status = OCRJob.RUNNING
+            job.started_at = time.time()
+
+            def on_progress(message: str, progress: float):
+                job.message = message
+                job.progress = progress
+
+            try:
+                result = self.engine.process_pdf(str(job.pdf_path), str(job.output_dir), on_progress,
+                                                 job.cancel_event)
+            except OCRCancelledError as e:
+                result = {"success": False, "message": str(e), "cancelled": True}
+            except Exception as e:
+                result = {"success": False, "message": f"处理PDF时出错: {str(e)}"}
+
+            if result.get("cancelled"):
+                job.status = OCRJob.CANCELLED
+            elif result["success"]:
+                job.status = OCRJob.SUCCEEDED
+                job.progress = 1.0
+                job.output_file = result["output_file"]
+            else:
+                job.status = OCRJob.FAILED
+            job.message = result["message"]
+            job.metrics = result.get("metrics")
+            job.finished_at = time.time()
+
+        # 处理期间被删除的任务
+        if self.get(job.id) is None:
+            shutil.rmtree(job.job_dir, ignore_errors=True)
+
+
+class _ChunkedWriter:
+    """以HTTP分块传输编码写出响应体，供zipfile流式写入"""
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+
+    def write(self, data: bytes) -> int:
+        if data:
+            self._wfile.write(f"{len(data):x}\r\n".encode("ascii"))
+            self._wfile.write(data)
+            self._wfile.write(b"\r\n")
+        return len(data)
+
+    def flush(self):
+        self._wfile.flush()
+
+    def close(self):
+        self._wfile.write(b"0\r\n\r\n")
+        self._wfile.flush()
+
+
+class OCRRequestHandler(BaseHTTPRequestHandler):
+    """处理任务API请求"""
+
+    protocol_version = "HTTP/1.1"
+    manager: JobManager = None
+    metrics = None
+    token: Optional[str] = None
+    max_upload_bytes = 200 * 1024 * 1024
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error_json(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        self._send_json(status, {"error": message}, headers)
+
+    def _authorized(self) -> bool:
+        """校验Bearer令牌，未配置令牌时不校验"""
+        if not self.token:
+            return True
+        if self.headers.get("Authorization", "") == f"Bearer {self.token}":
+            return True
+        self._send_error_json(401, "未授权", {"WWW-Authenticate": "Bearer"})
+        return False
+
+    def _route(self):
+        """解析路径，返回(路径段列表, 查询参数)"""
+        parsed = urlparse(self.path)
+        parts = [unquote(part) for part in parsed.path.split("/") if part]
+        return parts, parse_qs(parsed.query)
+
+    def _job_or_404(self, job_id: str) -> Optional[OCRJob]:
+        job = self.manager.get(job_id)
+        if job is None:
+            self._send_error_json(404, f"任务不存在: {job_id}")
+        return job
+
+    def do_GET(self):
+        parts, _ = self._route()
+        if parts == ["health"]:
+            self._send_json(200, {"status": "ok", "queued": self.manager.queue_length(),
+                                  "jobs": len(self.manager.jobs)})
+            return
+        if parts == ["metrics"] and self.metrics is not None:
+            body = self.metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if not self._authorized():
+            return
+
+        if parts == ["jobs"]:
+            self._send_json(200, [job.to_dict() for job in self.manager.list()])
+            return
+        if len(parts) < 2 or parts[0] != "jobs":
+            self._send_error_json(404, "未知的路径")
+            return
+
+        job = self._job_or_404(parts[1])
+        if job is None:
+            return
+        if len(parts) == 2:
+            self._send_json(200, job.to_dict())
+            return
+
+        if job.status != OCRJob.SUCCEEDED:
+            self._send_error_json(409, f"任务尚未成功完成: {job.status}")
+            return
+        if parts[2:] == ["result"]:
+            self._send_file(Path(job.output_file), "text/markdown; charset=utf-8")
+        elif parts[2:] == ["result.zip"]:
+            self._send_zip(job)
+        elif parts[2] == "pages" and len(parts) == 4:
+            self._send_page(job, parts[3])
+        elif parts[2] == "files" and len(parts) > 3:
+            output_dir = job.output_dir.resolve()
+            path = output_dir.joinpath(*parts[3:]).resolve()
+            if output_dir not in path.parents:
+                self._send_error_json(404, "文件不存在")
+                return
+            self._send_file(path, "application/octet-stream")
+        else:
+            self._send_error_json(404, "未知的路径")
+
+    def _send_file(self, path: Path, content_type: str):
+        """以固定长度流式发送文件"""
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self._send_error_json(404, "文件不存在")
+            return
+        with f:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, _COPY_CHUNK)
+
+    def _send_page(self, job: OCRJob, page: str):
+        """通过页索引直接读取一页，不读取整个Markdown文件"""
+        try:
+            index = PageIndex.for_markdown(job.output_file)
+        except (OSError, ValueError, KeyError):
+            self._send_error_json(404, "该任务没有页索引")
+            return
+        if not page.isdigit() or int(page) >= index.page_count:
+            self._send_error_json(404, f"页码超出范围: {page}")
+            return
+        page_number = int(page)
+        self._send_json(200, {"page": page_number, "page_count": index.page_count,
+                              "markdown": index.read_page(page_number), "images": index.page_images(page_number)})
+
+    def _send_zip(self, job: OCRJob):
+        """边压缩边发送结果目录，不在内存或磁盘中生成完整的ZIP文件"""
+        files = []
+        for root, dirs, names in os.walk(job.output_dir):
+            # 原始结果只供服务端增量处理和重新生成使用
+            dirs[:] = sorted(d for d in dirs if not d.endswith(RAW_STORE_SUFFIX))
+            files.extend(Path(root) / name for name in sorted(names))
+
+        archive_name = Path(job.filename).stem or job.id
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Disposition", f'attachment; filename="{job.id}.zip"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        writer = _ChunkedWriter(self.wfile)
+        with zipfile.ZipFile(writer, 'w') as archive:
+            for path in files:
+                compress_type = zipfile.ZIP_STORED if path.suffix.lower() in _STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+                arcname = str(Path(archive_name) / path.relative_to(job.output_dir))
+                archive.write(path, arcname, compress_type=compress_type)
+        writer.close()
+
+    def _read_body(self, f) -> int:
+        """把请求体写入文件，支持Content-Length和分块传输编码，返回字节数"""
+        total = 0
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    return total
+                total += size
+                if total > self.max_upload_bytes:
+                    raise ValueError("上传的文件过大")
+                remaining = size
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, _COPY_CHUNK))
+                    if not chunk:
+                        raise ValueError("请求体不完整")
+                    f.write(chunk)
+                    remaining -= len(chunk)
+                self.rfile.readline()
+
+        remaining = int(self.headers.get("Content-Length") or 0)
+        if remaining > self.max_upload_bytes:
+            raise ValueError("上传的文件过大")
+        while remaining:
+            chunk = self.rfile.read(min(remaining, _COPY_CHUNK))
+            if not chunk:
+                raise ValueError("请求体不完整")
+            f.write(chunk)
+            remaining -= len(chunk)
+            total += len(chunk)
+        return total
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        parts, query = self._route()
+        if parts != ["jobs"]:
+            self._send_error_json(404, "未知的路径")
+            return
+
+        # 只保留文件名部分，避免路径穿越
+        filename = Path(query.get("filename", ["document.pdf"])[0].replace("\\", "/")).name or "document.pdf"
+        if not filename.lower().endswith(".pdf"):
+            filename += ".pdf"
+
+        job = self.manager.create_job(filename)
+        try:
+            with open(job.pdf_path, 'wb') as f:
+                size = self._read_body(f)
+        except (ValueError, OSError) as e:
+            shutil.rmtree(job.job_dir, ignore_errors=True)
+            # 请求体可能没有读完，关闭连接
+            self.close_connection = True
+            self._send_error_json(413 if "过大" in str(e) else 400, str(e))
+            return
+        if size == 0:
+            shutil.rmtree(job.job_dir, ignore_errors=True)
+            self._send_error_json(400, "请求体为空")
+            return
+
+        if not self.manager.submit(job):
+            self._send_error_json(503, "任务队列已满，请稍后重试", {"Retry-After": "5"})
+            return
+        self._send_json(202, job.to_dict(), {"Location": f"/jobs/{job.id}"})
+
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != "jobs":
+            self._send_error_json(404, "未知的路径")
+            return
+        if self.manager.delete(parts[1]):
+            self._send_json(200, {"id": parts[1], "deleted": True})
+        else:
+            self._send_error_json(404, f"任务不存在: {parts[1]}")
+
+
+def create_server(manager: JobManager, host: str = "127.0.0.1", port: int = 8080, token: Optional[str] = None,
+                  metrics=None, max_upload_bytes: int = 200 * 1024 * 1024) -> ThreadingHTTPServer:
+    """
+    创建HTTP服务
+
+    Args:
+        manager: 任务管理器
+        host: 监听地址
+        port: 监听端口
+        token: 访问令牌，客户端需在Authorization头中提供 Bearer <令牌>，为None时不校验
+        metrics: 指标汇总，通过 /metrics 导出
+        max_upload_bytes: 上传文件的大小上限
+
+    Returns:
+        HTTP服务对象
+    """
+    handler = type("Handler", (OCRRequestHandler,), {
+        "manager": manager,
+        "metrics": metrics,
+        "token": token,
+        "max_upload_bytes": max_upload_bytes
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Mistral OCR HTTP服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认127.0.0.1）")
+    parser.add_argument("--port", type=int, default=8080, help="监听端口（默认8080）")
+    parser.add_argument("-o", "--output-dir", help="保存上传文件和结果的目录，默认使用已保存的输出目录下的ocr_server")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="并发处理的任务数（默认4）")
+    parser.add_argument("--queue-size", type=int, default=100, help="等待处理的任务数上限（默认100）")
+    parser.add_argument("--retention", type=float, default=24, help="已结束任务的保留时间（小时，默认24）")
+    parser.add_argument("--max-upload-mb", type=int, default=200, help="上传文件的大小上限（MB，默认200）")
+    parser.add_argument("--token", default=os.environ.get("OCR_SERVER_TOKEN"),
+                        help="访问令牌，默认读取OCR_SERVER_TOKEN环境变量，未设置时不校验")
+    add_engine_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """命令行入口函数"""
+    args = parse_args(argv)
+    setup = prepare_engine(args)
+    if setup is None:
+        return 1
+
+    metrics = setup["metrics"]
+    engine = OCREngine(setup["api_key"], cache=setup["cache"], **setup["engine_options"])
+    work_dir = args.output_dir or os.path.join(setup["output_root"], "ocr_server")
+    manager = JobManager(engine, work_dir, workers=args.workers, queue_size=args.queue_size,
+                         retention_seconds=args.retention * 3600)
+    server = create_server(manager, args.host, args.port, token=args.token, metrics=metrics,
+                           max_upload_bytes=args.max_upload_mb * 1024 * 1024)
+    metrics_server = metrics.serve(args.metrics_port) if args.metrics_port else None
+
+    def handle_signal(signum, frame):
+        # shutdown()会等待serve_forever退出，不能在同一线程中调用
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, handle_signal)
+
+    manager.start()
+    print(f"OCR服务已启动: http://{args.host}:{server.server_address[1]}，结果保存在 {work_dir}", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        print("正在停止，等待处理中的任务完成...", flush=True)
+        server.server_close()
+        manager.stop()
+        if metrics_server:
+            metrics_server.shutdown()
+        metrics.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
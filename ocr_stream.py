@@ -0,0 +1,218 @@
+"""
+流式读取OCR响应
+直接向OCR接口发送请求，边接收边解析响应体，pages数组中的每一页接收完整后立即交给调用方，
+内存中只保留正在接收的一页，不必等待并解析包含全部图片数据的完整响应
+"""
+
+import re
+import json
+from typing import Optional, Dict, Any, List, Iterator
+
+# 默认的API服务地址
+DEFAULT_SERVER_URL = "https://api.mistral.ai"
+
+# 每次从连接读取的字节数
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# OCR接口在处理完成后才开始返回，读取超时需要足够长
+STREAM_READ_TIMEOUT = 600.0
+
+# 字符串外需要关注的结构字符，字符串内需要关注的结束引号和转义符
+_STRUCTURE_PATTERN = re.compile(rb'[{}\[\]"]')
+_STRING_PATTERN = re.compile(rb'["\\]')
+
+
+class OCRStreamError(Exception):
+    """OCR接口返回错误状态码，status_code和raw_response供请求调度器判断是否重试"""
+
+    def __init__(self, message: str, status_code: int, raw_response=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.raw_response = raw_response
+
+
+class PageStreamParser:
+    """
+    增量解析OCR响应JSON
+
+    扫描时只关注括号和字符串边界，长字符串（图片的base64数据）通过正则直接跳过；
+    pages数组中的页面对象完整后单独解析并返回，其余的顶层字段在结束时一起解析。
+    """
+
+    def __init__(self):
+        self._data = bytearray()
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        # 当前字符串的起始位置和顶层对象中最近的一个字符串，用于识别pages键
+        self._string_start = 0
+        self._last_key = b""
+        # pages数组元素所在的深度，不在pages数组中时为None
+        self._pages_depth: Optional[int] = None
+        self._page_start: Optional[int] = None
+        # pages数组之外的内容，pages被替换为空数组
+        self._skeleton = bytearray()
+        self._copy_from: Optional[int] = 0
+        self.page_count = 0
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        """
+        输入一段响应数据
+
+        Args:
+            chunk: 响应体中的下一段字节
+
+        Returns:
+            本段数据中接收完整的页面字典列表
+        """
+        self._data += chunk
+        pages = []
+        data = self._data
+        while True:
+            if self._in_string:
+                match = _STRING_PATTERN.search(data, self._pos)
+                if match is None:
+                    self._pos = len(data)
+                    break
+                i = match.start()
+                if data[i] == 0x5c:
+                    # 转义符后的字符还没收到时等待下一段数据
+                    if i + 1 >= len(data):
+                        self._pos = i
+                        break
+                    self._pos = i + 2
+                    continue
+                self._in_string = False
+                self._pos = i + 1
+                if self._depth == 1 and i - self._string_start <= 16:
+                    self._last_key = bytes(data[self._string_start:i])
+                continue
+
+            match = _STRUCTURE_PATTERN.search(data, self._pos)
+            if match is None:
+                self._pos = len(data)
+                break
+            i = match.start()
+            char = data[i]
+            self._pos = i + 1
+            if char == 0x22:
+                self._in_string = True
+                self._string_start = i + 1
+            elif char in (0x7b, 0x5b):
+                if self._pages_depth is not None and self._depth == self._pages_depth and char == 0x7b:
+                    self._page_start = i
+                elif self._depth == 1 and char == 0x5b and self._last_key == b"pages":
+                    # 进入pages数组，数组内容不计入顶层字段
+                    self._skeleton += data[self._copy_from:i + 1]
+                    self._copy_from = None
+                    self._pages_depth = 2
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth < 0:
+                    raise ValueError("OCR响应格式错误：括号不匹配")
+                if self._page_start is not None and self._depth == self._pages_depth:
+                    pages.append(json.loads(bytes(data[self._page_start:i + 1])))
+                    self.page_count += 1
+                    self._page_start = None
+                elif self._pages_depth is not None and self._depth == self._pages_depth - 1:
+                    self._pages_depth = None
+                    self._copy_from = i
+        self._compact()
+        return pages
+
+    def _compact(self):
+        """丢弃已处理的数据，只保留未接收完整的页面"""
+        if self._page_start is not None:
+            cut = self._page_start
+            self._page_start = 0
+        else:
+            cut = self._pos
+            if self._in_string:
+                cut = min(cut, self._string_start)
+            if self._copy_from is not None:
+                self._skeleton += self._data[self._copy_from:cut]
+                self._copy_from = 0
+        if cut:
+            del self._data[:cut]
+            self._pos -= cut
+            self._string_start -= cut
+
+    def close(self) -> Dict[str, Any]:
+        """
+        结束解析
+
+        Returns:
+            pages以外的顶层字段（模型名称、用量信息等）
+
+        Raises:
+            ValueError: 响应不完整
+        """
+        if self._depth != 0 or self._in_string or self._page_start is not None:
+            raise ValueError("OCR响应不完整")
+        if self._copy_from is not None:
+            self._skeleton += self._data[self._copy_from:]
+        fields = json.loads(bytes(self._skeleton))
+        fields.pop("pages", None)
+        return fields
+
+
+class OCRResponseStream:
+    """
+    流式OCR请求，用法:
+
+        with OCRResponseStream(http_client, api_key, body) as stream:
+            for page in stream.pages():
+                ...
+        stream.fields  # pages以外的顶层字段
+    """
+
+    def __init__(self, http_client, api_key: str, body: Dict[str, Any], server_url: Optional[str] = None):
+        """
+        初始化请求
+
+        Args:
+            http_client: httpx.Client，通常是共享客户端的连接池
+            api_key: Mistral API密钥
+            body: OCR接口的请求体
+            server_url: API服务地址，为None时使用默认地址
+        """
+        self.http_client = http_client
+        self.api_key = api_key
+        self.body = body
+        self.url = (server_url or DEFAULT_SERVER_URL).rstrip("/") + "/v1/ocr"
+        self.fields: Dict[str, Any] = {}
+        self.bytes_received = 0
+        self._context = None
+        self._response = None
+
+    def __enter__(self):
+        import httpx
+
+        self._context = self.http_client.stream(
+            "POST", self.url, json=self.body,
+            headers={"Authorization": f"Bearer {self.api_key}", "Accept": "application/json"},
+            timeout=httpx.Timeout(STREAM_READ_TIMEOUT, connect=30.0)
+        )
+        response = self._context.__enter__()
+        if response.status_code != 200:
+            try:
+                detail = response.read().decode("utf-8", "replace")[:500]
+            finally:
+                self._context.__exit__(None, None, None)
+            raise OCRStreamError(f"OCR接口返回 {response.status_code}: {detail}", response.status_code, response)
+        self._response = response
+        return self
+
+    def pages(self) -> Iterator[Dict[str, Any]]:
+        """依次返回接收完整的页面字典，响应结束后顶层字段保存在fields中"""
+        parser = PageStreamParser()
+        for chunk in self._response.iter_bytes(STREAM_CHUNK_SIZE):
+            self.bytes_received += len(chunk)
+            for page in parser.feed(chunk):
+                yield page
+        self.fields = parser.close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._context.__exit__(exc_type, exc_value, traceback)
+        return False
@@ -0,0 +1,189 @@
+import re
+import glob
+import mmap
+import hashlib
+from pathlib import Path
+from typing import List, Optional
+
+# 未安装pypdf时用于粗略统计页数的模式，匹配 /Type /Page 但不匹配 /Type /Pages
+_PAGE_PATTERN = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+# 计算页面指纹时忽略的键：指向页面树或所在页面的反向引用，以及不影响内容的结构信息
+_FINGERPRINT_SKIP_KEYS = frozenset(("/Parent", "/P", "/StructParents", "/Thumb"))
+# 可从页面树父节点继承的页面属性
+_INHERITABLE_PAGE_KEYS = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    """
+    统计PDF文件的页数
+
+    优先使用pypdf解析；未安装pypdf或解析失败时，通过内存映射扫描页面对象进行估算，
+    估算结果对使用压缩对象流的PDF可能偏小。
+
+    Args:
+        pdf_path: PDF文件路径
+
+    Returns:
+        页数，无法识别时返回0
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        PdfReader = None
+
+    if PdfReader is not None:
+        try:
+            return len(PdfReader(pdf_path).pages)
+        except Exception as e:
+            print(f"解析PDF页数时出错，改用扫描方式: {e}")
+
+    with open(pdf_path, 'rb') as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return sum(1 for _ in _PAGE_PATTERN.finditer(data))
+        except ValueError:
+            # 空文件无法映射
+            return 0
+
+
+def page_fingerprints(pdf_path: str) -> Optional[List[str]]:
+    """
+    计算每页内容的指纹，用于判断修订后的PDF中哪些页发生了变化
+
+    指纹由页面内容流、页面尺寸以及引用的字体、图片等资源的数据计算，与对象编号无关，
+    页面被移动或文件被其他工具重新保存时指纹不变。被多个页面共享的资源只计算一次。
+
+    Args:
+        pdf_path: PDF文件路径
+
+    Returns:
+        按页码顺序的十六进制指纹列表，未安装pypdf或解析失败时返回None
+    """
+    try:
+        from pypdf import PdfReader
+        from pypdf.generic import IndirectObject, DictionaryObject, ArrayObject
+    except ImportError:
+        return None
+
+    digests = {}
+    active = set()
+
+    def digest(obj) -> bytes:
+        if isinstance(obj, IndirectObject):
+            key = (obj.idnum, obj.generation)
+            if key in digests:
+                return digests[key]
+            if key in active:
+                # 对象之间的循环引用
+                return b"cycle"
+            active.add(key)
+            try:
+                value = digest(obj.get_object())
+            finally:
+                active.discard(key)
+            digests[key] = value
+            return value
+
+        h = hashlib.sha256()
+        if isinstance(obj, DictionaryObject):
+            h.update(b"dict")
+            for key in sorted(obj.keys()):
+                if key not in _FINGERPRINT_SKIP_KEYS:
+                    h.update(key.encode('utf-8'))
+                    h.update(digest(obj.raw_get(key)))
+            # 流对象直接使用编码后的数据，无需解压
+            data = getattr(obj, "_data", None)
+            if data is not None:
+                h.update(b"stream")
+                h.update(data if isinstance(data, bytes) else str(data).encode('utf-8'))
+        elif isinstance(obj, ArrayObject):
+            h.update(b"array")
+            for item in obj:
+                h.update(digest(item))
+        else:
+            h.update(f"{type(obj).__name__}:{obj!r}".encode('utf-8'))
+        return h.digest()
+
+    try:
+        reader = PdfReader(pdf_path)
+        fingerprints = []
+        for page in reader.pages:
+            h = hashlib.sha256(digest(page))
+            # 从页面树继承的属性同样影响页面内容
+            for key in _INHERITABLE_PAGE_KEYS:
+                if key in page:
+                    continue
+                node = page.get("/Parent")
+                while node is not None:
+                    node = node.get_object()
+                    if key in node:
+                        h.update(key.encode('utf-8'))
+                        h.update(digest(node.raw_get(key)))
+                        break
+                    node = node.get("/Parent")
+            fingerprints.append(h.hexdigest())
+        return fingerprints
+    except Exception as e:
+        print(f"计算页面指纹时出错: {e}")
+        return None
+
+
+def split_page_list(pages: List[int], shard_pages: int) -> List[List[int]]:
+    """
+    将指定的页码列表按固定大小切分为分片
+
+    Args:
+        pages: 页码列表（从0开始）
+        shard_pages: 每个分片的页数
+
+    Returns:
+        每个分片包含的页码列表
+    """
+    shard_pages = max(1, shard_pages)
+    return [pages[start:start + shard_pages] for start in range(0, len(pages), shard_pages)]
+
+
+def split_page_ranges(page_count: int, shard_pages: int) -> List[List[int]]:
+    """
+    将页码（从0开始）按固定大小切分为连续的分片
+
+    Args:
+        page_count: 总页数
+        shard_pages: 每个分片的页数
+
+    Returns:
+        每个分片包含的页码列表
+    """
+    shard_pages = max(1, shard_pages)
+    return [list(range(start, min(start + shard_pages, page_count)))
+            for start in range(0, page_count, shard_pages)]
+
+
+def collect_pdf_files(inputs: List[str], recursive: bool = True) -> List[Path]:
+    """
+    根据输入的目录、文件或通配符收集PDF文件
+
+    Args:
+        inputs: 目录、PDF文件路径或通配符列表
+        recursive: 是否递归搜索子目录
+
+    Returns:
+        去重并排序后的PDF文件路径列表
+    """
+    found = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            pattern = "**/*" if recursive else "*"
+            candidates = path.glob(pattern)
+        elif path.is_file():
+            candidates = [path]
+        else:
+            candidates = (Path(p) for p in glob.glob(item, recursive=recursive))
+
+        for candidate in candidates:
+            if candidate.is_file() and candidate.suffix.lower() == ".pdf":
+                found.append(candidate.resolve())
+
+    return sorted(set(found))
@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+OCR原始结果存储
+按页保存OCR响应（pages.jsonl）和解码后的图片数据（images.bin），无需再次调用API即可重新生成Markdown和图片
+
+用法:
+    python raw_store.py results/ -o rerendered/
+"""
+
+import os
+import sys
+import json
+import base64
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterator, List, Tuple, TYPE_CHECKING
+
+from result_writer import ResultWriter, TRANSCODE_FORMATS, decode_data_url, data_url_mime
+
+if TYPE_CHECKING:
+    from mistralai.models import OCRResponse
+
+# 原始结果目录的后缀，保存在结果Markdown旁边：<输出目录>/<PDF名称>.ocr/
+RAW_STORE_SUFFIX = ".ocr"
+FORMAT_VERSION = 1
+
+
+def _to_dict(obj, exclude: set) -> Dict[str, Any]:
+    """将响应对象转换为可序列化为JSON的字典，跳过指定字段"""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude=exclude)
+    return {key: value for key, value in vars(obj).items() if key not in exclude}
+
+
+def raw_store_path(output_dir: str, pdf_name: str) -> Path:
+    """PDF的原始结果目录"""
+    return Path(output_dir) / f"{pdf_name}{RAW_STORE_SUFFIX}"
+
+
+class RawStoreWriter:
+    """
+    逐页写入OCR原始结果
+
+    每页的文本和图片元数据写为pages.jsonl中的一行，图片解码后顺序追加到images.bin，
+    行中记录图片在images.bin中的偏移和长度；manifest.json记录响应级字段和每页的行偏移，便于按页随机读取。
+    """
+
+    def __init__(self, store_dir: str):
+        """
+        初始化写入器
+
+        Args:
+            store_dir: 原始结果目录
+        """
+        self.store_dir = Path(store_dir)
+        self.page_offsets: List[int] = []
+        self._pages_file = None
+        self._images_file = None
+
+    def open(self):
+        """创建目录并打开数据文件，已有的内容会被覆盖"""
+        os.makedirs(self.store_dir, exist_ok=True)
+        # 先删除旧的manifest，写入中断时不会把新数据误认为完整的旧结果
+        try:
+            os.remove(self.store_dir / "manifest.json")
+        except FileNotFoundError:
+            pass
+        self._pages_file = open(self.store_dir / "pages.jsonl", 'wb')
+        self._images_file = open(self.store_dir / "images.bin", 'wb')
+        return self
+
+    def write_page(self, page):
+        """
+        写入一页OCR结果
+
+        Args:
+            page: OCR页面对象
+        """
+        images = []
+        for img in page.images:
+            data = None
+            prefix = ""
+            if img.image_base64:
+                try:
+                    data = decode_data_url(img.image_base64)
+                except Exception as e:
+                    print(f"保存原始图片数据时出错: {e}")
+                else:
+                    comma = img.image_base64.find(',')
+                    prefix = img.image_base64[:comma + 1] if comma >= 0 else ""
+            images.append((_to_dict(img, {"image_base64"}), data, prefix))
+        self.write_decoded_page(_to_dict(page, {"images"}), images)
+
+    def write_decoded_page(self, record: Dict[str, Any], images: List[Tuple[Dict[str, Any], Optional[bytes], str]]):
+        """
+        写入一页图片已解码的OCR结果
+
+        Args:
+            record: 页面字段（不含images）
+            images: (图片元数据（不含image_base64）, 图片字节, 数据URL前缀)列表，没有图片数据时图片字节为None
+        """
+        metas = []
+        for meta, data, prefix in images:
+            meta = dict(meta)
+            if data is not None:
+                meta["prefix"] = prefix
+                meta["offset"] = self._images_file.tell()
+                meta["length"] = len(data)
+                self._images_file.write(data)
+            metas.append(meta)
+        record = dict(record, images=metas)
+
+        self.page_offsets.append(self._pages_file.tell())
+        self._pages_file.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b"\n")
+
+    def close(self, response_fields: Optional[Dict[str, Any]] = None, fingerprints: Optional[List[str]] = None,
+              options: Optional[Dict[str, Any]] = None):
+        """
+        关闭数据文件并写入manifest.json
+
+        Args:
+            response_fields: 响应级字段（模型名称、用量信息等）
+            fingerprints: 每页PDF内容的指纹，用于之后按页增量处理
+            options: 生成这些结果的OCR选项
+        """
+        for f in (self._pages_file, self._images_file):
+            if f:
+                f.close()
+        self._pages_file = self._images_file = None
+
+        manifest = {
+            "version": FORMAT_VERSION,
+            "response": response_fields or {},
+            "page_offsets": self.page_offsets,
+            "fingerprints": fingerprints,
+            "options": options or {}
+        }
+        # manifest最后写入，存在即表示数据完整
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.store_dir / "manifest.json")
+
+    def discard(self):
+        """删除已写入的原始结果"""
+        for f in (self._pages_file, self._images_file):
+            if f:
+                f.close()
+        self._pages_file = self._images_file = None
+        for name in ("pages.jsonl", "images.bin", "manifest.json"):
+            try:
+                os.remove(self.store_dir / name)
+            except OSError:
+                pass
+        try:
+            os.rmdir(self.store_dir)
+        except OSError:
+            pass
+
+
+def save_raw_response(ocr_response: "OCRResponse", store_dir: str, fingerprints: Optional[List[str]] = None,
+                      options: Optional[Dict[str, Any]] = None):
+    """
+    保存完整的OCR响应，写入失败时删除不完整的数据
+
+    Args:
+        ocr_response: OCR响应对象
+        store_dir: 原始结果目录
+        fingerprints: 每页PDF内容的指纹，页数与响应不一致时不保存
+        options: 生成这些结果的OCR选项
+    """
+    if fingerprints is not None and len(fingerprints) != len(ocr_response.pages):
+        fingerprints = None
+    writer = RawStoreWriter(store_dir).open()
+    try:
+        for page in ocr_response.pages:
+            writer.write_page(page)
+        writer.close(_to_dict(ocr_response, {"pages"}), fingerprints, options)
+    except BaseException:
+        writer.discard()
+        raise
+
+
+class RawStore:
+    """读取原始结果，支持顺序遍历和按页随机读取"""
+
+    def __init__(self, store_dir: str):
+        """
+        打开原始结果目录
+
+        Args:
+            store_dir: 原始结果目录
+        """
+        self.store_dir = Path(store_dir)
+        manifest_path = self.store_dir / "manifest.json"
+        if not manifest_path.is_file():
+            raise FileNotFoundError(f"原始结果不完整或不存在: {store_dir}")
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"不支持的原始结果版本: {self.manifest.get('version')}")
+        self.page_offsets = self.manifest["page_offsets"]
+
+    @property
+    def page_count(self) -> int:
+        """页数"""
+        return len(self.page_offsets)
+
+    @property
+    def fingerprints(self) -> Optional[List[str]]:
+        """每页PDF内容的指纹，未记录时为None"""
+        return self.manifest.get("fingerprints")
+
+    @property
+    def options(self) -> Dict[str, Any]:
+        """生成这些结果的OCR选项"""
+        return self.manifest.get("options") or {}
+
+    def _read_images(self, record: Dict[str, Any], images_file) -> Dict[str, Any]:
+        """读取页面记录中各图片的数据"""
+        for meta in record["images"]:
+            if "offset" in meta:
+                images_file.seek(meta["offset"])
+                meta["data"] = images_file.read(meta["length"])
+            else:
+                meta["data"] = None
+        return record
+
+    def read_page(self, index: int) -> Dict[str, Any]:
+        """
+        读取第index个保存的页面（按保存顺序，从0开始）
+
+        Returns:
+            页面字典，images中每张图片的data为解码后的字节
+        """
+        with open(self.store_dir / "pages.jsonl", 'rb') as pages_file, \
+                open(self.store_dir / "images.bin", 'rb') as images_file:
+            pages_file.seek(self.page_offsets[index])
+            return self._read_images(json.loads(pages_file.readline()), images_file)
+
+    def iter_pages(self) -> Iterator[Dict[str, Any]]:
+        """按保存顺序遍历所有页面"""
+        with open(self.store_dir / "pages.jsonl", 'rb') as pages_file, \
+                open(self.store_dir / "images.bin", 'rb') as images_file:
+            for line in pages_file:
+                yield self._read_images(json.loads(line), images_file)
+
+    def load_response(self) -> "OCRResponse":
+        """还原为OCR响应对象"""
+        from mistralai.models import OCRResponse
+
+        pages = []
+        for record in self.iter_pages():
+            for meta in record["images"]:
+                data = meta.pop("data")
+                prefix = meta.pop("prefix", "")
+                meta.pop("offset", None)
+                meta.pop("length", None)
+                meta["image_base64"] = prefix + base64.b64encode(data).decode() if data is not None else None
+            pages.append(record)
+        return OCRResponse.model_validate(dict(self.manifest["response"], pages=pages))
+
+    def render(self, output_dir: str, pdf_name: str, image_workers: int = 4,
+               image_format: Optional[str] = None, image_quality: int = 80, page_index: bool = False) -> str:
+        """
+        从原始结果重新生成Markdown和图片，不经过base64编解码
+
+        Args:
+            output_dir: 输出目录
+            pdf_name: 结果Markdown的文件名（不含扩展名）
+            image_workers: 写入图片的线程数
+            image_format: 图片转码格式（webp或jpeg），为None时按原格式保存
+            image_quality: 转码的有损压缩质量（1-100）
+            page_index: 是否同时写入页索引
+
+        Returns:
+            结果Markdown文件的路径
+        """
+        with ResultWriter(output_dir, pdf_name, image_workers=image_workers,
+                          image_format=image_format, image_quality=image_quality,
+                          page_index=page_index) as writer:
+            for record in self.iter_pages():
+                images = [(meta["id"], meta["data"], data_url_mime(meta.get("prefix", "")))
+                          for meta in record["images"] if meta["data"] is not None]
+                writer.write_raw_page(record["markdown"], images)
+        return str(writer.md_file_path)
+
+
+def find_raw_stores(inputs: List[str]) -> List[Tuple[Path, Path]]:
+    """
+    在输入的目录中递归查找原始结果目录
+
+    Returns:
+        (原始结果目录, 结果所在目录相对于输入目录的路径) 列表；直接输入原始结果目录时相对路径为其所在目录的名称
+    """
+    found = {}
+    for item in inputs:
+        path = Path(item).resolve()
+        if path.name.endswith(RAW_STORE_SUFFIX) and (path / "manifest.json").is_file():
+            found.setdefault(path, Path(path.parent.name))
+        elif path.is_dir():
+            for manifest in path.glob(f"**/*{RAW_STORE_SUFFIX}/manifest.json"):
+                store_dir = manifest.parent
+                found.setdefault(store_dir, store_dir.parent.relative_to(path))
+    return sorted(found.items())
+
+
+def assign_render_dirs(stores: List[Tuple[Path, Path]], output_root: str) -> Dict[Path, Path]:
+    """
+    为每个原始结果分配输出目录，保留相对于输入目录的层级；
+    来自不同输入目录的结果落到同一目录时加序号后缀，避免互相覆盖
+
+    Args:
+        stores: find_raw_stores返回的列表
+        output_root: 输出根目录
+
+    Returns:
+        原始结果目录到输出目录的映射
+    """
+    output_dirs = {}
+    used = set()
+    for store_dir, relative in stores:
+        pdf_name = store_dir.name[:-len(RAW_STORE_SUFFIX)]
+        output_dir = Path(output_root) / relative
+        count = 1
+        while (output_dir, pdf_name) in used:
+            count += 1
+            # 结果直接位于输入目录时，在输出根目录下另建子目录
+            if relative.parts:
+                output_dir = Path(output_root) / relative.parent / f"{relative.name}_{count}"
+            else:
+                output_dir = Path(output_root) / f"{pdf_name}_{count}"
+        used.add((output_dir, pdf_name))
+        output_dirs[store_dir] = output_dir
+    return output_dirs
+
+
+def main(argv=None) -> int:
+    """命令行入口：从原始结果重新生成Markdown和图片，全部成功返回0"""
+    parser = argparse.ArgumentParser(description="从保存的OCR原始结果重新生成Markdown和图片（无需联网）")
+    parser.add_argument("inputs", nargs="+", help="原始结果目录（*.ocr），或包含它们的目录")
+    parser.add_argument("-o", "--output-dir", help="输出根目录，默认写回原始结果所在的目录")
+    parser.add_argument("--image-workers", type=int, default=4, help="写入图片的线程数（默认4）")
+    parser.add_argument("--image-format", choices=sorted(TRANSCODE_FORMATS), help="将图片转码为指定格式（需要Pillow）")
+    parser.add_argument("--image-quality", type=int, default=80, help="图片转码的压缩质量（1-100，默认80）")
+    parser.add_argument("--page-index", action="store_true", help="同时写入页索引（<PDF名称>.index.json）")
+    args = parser.parse_args(argv)
+
+    stores = find_raw_stores(args.inputs)
+    if not stores:
+        print("未找到任何OCR原始结果", file=sys.stderr)
+        return 1
+
+    output_dirs = assign_render_dirs(stores, args.output_dir) if args.output_dir else {}
+
+    failed = 0
+    for store_dir, _ in stores:
+        pdf_name = store_dir.name[:-len(RAW_STORE_SUFFIX)]
+        output_dir = output_dirs.get(store_dir, store_dir.parent)
+        try:
+            output_file = RawStore(str(store_dir)).render(str(output_dir), pdf_name, args.image_workers,
+                                                            args.image_format, args.image_quality, args.page_index)
+            print(f"已生成 {output_file}")
+        except Exception as e:
+            failed += 1
+            print(f"重新生成 {store_dir} 失败: {e}", file=sys.stderr)
+
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional, Dict, Any
+
+# 可重试的HTTP状态码：请求超时、限流和服务端临时错误
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+def _transient_errors() -> tuple:
+    """可重试的网络异常类型，httpx在首次判断时才导入"""
+    try:
+        import httpx
+    except ImportError:
+        return ()
+    return (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+
+class TokenBucket:
+    """令牌桶限流器，按每分钟速率补充令牌，令牌不足时计算需要等待的时间"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        初始化令牌桶
+
+        Args:
+            rate_per_minute: 每分钟补充的令牌数
+            capacity: 桶容量（允许的突发量），默认等于每分钟速率
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        """
+        预留令牌，令牌可以透支，透支部分按补充速率折算为等待时间
+
+        Args:
+            amount: 需要的令牌数
+
+        Returns:
+            调用方需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RequestScheduler:
+    """
+    API请求调度器，在上传、签名URL和OCR调用前统一限流并重试
+
+    按每分钟请求数和页数两个令牌桶限流；遇到429和5xx等可重试错误时按带抖动的指数退避重试，
+    响应带有Retry-After时，所有共享该调度器的调用都暂停到指定时间之后。
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, pages_per_minute: Optional[float] = None,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        """
+        初始化调度器
+
+        Args:
+            requests_per_minute: 每分钟请求数上限，为None时不限制
+            pages_per_minute: 每分钟OCR页数上限，为None时不限制
+            max_retries: 可重试错误的最大重试次数
+            base_delay: 指数退避的初始等待秒数
+            max_delay: 单次退避的最长等待秒数
+        """
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.page_bucket = TokenBucket(pages_per_minute) if pages_per_minute else None
+        self.pages_per_minute = pages_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._metrics = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "throttled_requests": 0,
+            "throttle_wait_seconds": 0.0,
+            "backoff_wait_seconds": 0.0
+        }
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """判断错误是否可以重试"""
+        transient_errors = _transient_errors()
+        if transient_errors and isinstance(error, transient_errors):
+            return True
+        status_code = getattr(error, "status_code", None)
+        return status_code in RETRYABLE_STATUS_CODES
+
+    @staticmethod
+    def retry_after(error: Exception) -> Optional[float]:
+        """
+        从错误响应的Retry-After头中解析需要等待的秒数
+
+        Returns:
+            等待秒数，响应中没有该头时返回None
+        """
+        response = getattr(error, "raw_response", None) or getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        value = headers.get("retry-after") if headers is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _record(self, key: str, value=1):
+        """累加统计指标"""
+        with self._lock:
+            self._metrics[key] += value
+
+    def _acquire(self, page_cost: int) -> float:
+        """预留请求和页数配额，返回需要等待的秒数"""
+        wait = 0.0
+        with self._lock:
+            blocked = self._blocked_until - time.monotonic()
+        if blocked > 0:
+            wait = blocked
+        if self.request_bucket:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.page_bucket and page_cost:
+            wait = max(wait, self.page_bucket.reserve(page_cost))
+        if wait > 0:
+            with self._lock:
+                self._metrics["throttled_requests"] += 1
+                self._metrics["throttle_wait_seconds"] += wait
+        return wait
+
+    def _backoff(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        计算失败后的等待时间
+
+        Returns:
+            重试前需要等待的秒数；不可重试或已达到重试上限时返回None
+        """
+        if attempt >= self.max_retries or not self.is_retryable(error):
+            return None
+
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            # 服务端要求的等待时间对所有共享调度器的调用生效
+            with self._lock:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            delay = retry_after + random.uniform(0, self.base_delay)
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+        with self._lock:
+            self._metrics["retries"] += 1
+            self._metrics["backoff_wait_seconds"] += delay
+        return delay
+
+    def call(self, func: Callable, *args, page_cost: int = 0, **kwargs):
+        """
+        限流后调用API，可重试错误自动重试
+
+        Args:
+            func: 要调用的API方法
+            *args: 位置参数
+            page_cost: 本次请求处理的页数，用于页数限流（不叫pages，避免与OCR接口的pages参数冲突）
+            **kwargs: 关键字参数
+
+        Returns:
+            API方法的返回值
+        """
+        attempt = 0
+        while True:
+            wait = self._acquire(page_cost)
+            if wait > 0:
+                time.sleep(wait)
+            self._record("requests")
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    self._record("failures")
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    async def call_async(self, func: Callable, *args, page_cost: int = 0, **kwargs):
+        """call的异步版本，func为返回协程的API方法"""
+        attempt = 0
+        while True:
+            wait = self._acquire(page_cost)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._record("requests")
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    self._record("failures")
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """返回调度统计信息"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["throttle_wait_seconds"] = round(metrics["throttle_wait_seconds"], 3)
+        metrics["backoff_wait_seconds"] = round(metrics["backoff_wait_seconds"], 3)
+        return metrics
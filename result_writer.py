@@ -0,0 +1,577 @@
+import io
+import os
+import re
+import json
+import time
+import binascii
+import threading
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, Tuple, List, Dict, Any
+
+from metrics import DocumentMetrics
+
+# Markdown图片引用 ![名称](地址)，名称中不含方括号，地址中不含圆括号
+_IMAGE_REF_PATTERN = re.compile(r"!\[([^\[\]]*)\]\(([^()]*)\)")
+_IMAGE_REF_SPECIAL_CHARS = frozenset("[]()")
+
+# 数据URL中的MIME类型对应的图片扩展名
+_MIME_EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpeg",
+    "image/jpg": "jpeg",
+    "image/gif": "gif",
+    "image/webp": "webp",
+    "image/bmp": "bmp",
+    "image/tiff": "tiff"
+}
+_EXTENSION_ALIASES = {"jpg": "jpeg", "tif": "tiff"}
+
+# 文件头特征，数据URL没有MIME类型时按文件头判断格式
+_MAGIC_EXTENSIONS = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF8", "gif"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff")
+)
+
+# 可转码的目标格式及对应的Pillow格式名
+TRANSCODE_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+
+# 页索引文件的后缀，保存在结果Markdown旁边：<输出目录>/<PDF名称>.index.json
+PAGE_INDEX_SUFFIX = ".index.json"
+PAGE_INDEX_VERSION = 1
+
+# 页之间的分隔符
+_PAGE_SEPARATOR = "\n\n"
+
+_transcode_pool: Optional[ProcessPoolExecutor] = None
+_transcode_pool_lock = threading.Lock()
+
+
+def replace_images_in_markdown(markdown_str: str, images_dict: dict) -> str:
+    """
+    替换Markdown中的图片引用
+
+    一次扫描找出所有 ![名称](名称) 形式的引用并通过字典查找替换，耗时与图片数量无关。
+    图片ID中含有方括号或圆括号时无法用正则准确切分，退回逐个替换。
+
+    Args:
+        markdown_str: Markdown字符串
+        images_dict: 图片ID到图片路径的映射
+
+    Returns:
+        替换后的Markdown字符串
+    """
+    if not images_dict:
+        return markdown_str
+
+    if any(not _IMAGE_REF_SPECIAL_CHARS.isdisjoint(img_name) for img_name in images_dict):
+        for img_name, img_path in images_dict.items():
+            markdown_str = markdown_str.replace(f"![{img_name}]({img_name})", f"![{img_name}]({img_path})")
+        return markdown_str
+
+    def replace(match):
+        img_name = match.group(1)
+        if img_name == match.group(2) and img_name in images_dict:
+            return f"![{img_name}]({images_dict[img_name]})"
+        return match.group(0)
+
+    return _IMAGE_REF_PATTERN.sub(replace, markdown_str)
+
+
+def decode_data_url(data_url: str) -> bytes:
+    """
+    解码base64图片数据，支持带 data:...;base64, 前缀的数据URL
+
+    Args:
+        data_url: 数据URL或纯base64字符串
+
+    Returns:
+        解码后的图片字节
+    """
+    comma = data_url.find(',')
+    return binascii.a2b_base64(data_url[comma + 1:] if comma >= 0 else data_url)
+
+
+def data_url_mime(data_url: str) -> Optional[str]:
+    """返回数据URL中的MIME类型，纯base64字符串返回None"""
+    comma = data_url.find(',', 0, 256)
+    if not data_url.startswith("data:") or comma < 0:
+        return None
+    return data_url[5:comma].split(';')[0].strip().lower() or None
+
+
+def detect_image_extension(data: bytes, mime: Optional[str] = None) -> str:
+    """
+    判断图片格式对应的扩展名，优先使用MIME类型，其次按文件头判断，都无法识别时使用png
+
+    Args:
+        data: 图片字节
+        mime: 数据URL中的MIME类型
+
+    Returns:
+        不含点的扩展名
+    """
+    if mime in _MIME_EXTENSIONS:
+        return _MIME_EXTENSIONS[mime]
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    for magic, extension in _MAGIC_EXTENSIONS:
+        if data.startswith(magic):
+            return extension
+    return "png"
+
+
+def image_file_name(img_id: str, extension: str) -> str:
+    """
+    图片的文件名：图片ID已带有同类扩展名时直接使用，否则替换或追加扩展名
+
+    Args:
+        img_id: 图片ID，如 img-0.jpeg
+        extension: 不含点的扩展名
+    """
+    stem, dot, suffix = img_id.rpartition('.')
+    suffix = _EXTENSION_ALIASES.get(suffix.lower(), suffix.lower())
+    if dot and stem and suffix in _MIME_EXTENSIONS.values():
+        return img_id if suffix == extension else f"{stem}.{extension}"
+    return f"{img_id}.{extension}"
+
+
+def transcode_image(data: bytes, image_format: str, quality: int) -> bytes:
+    """
+    用Pillow将图片转码为指定格式
+
+    Args:
+        data: 原始图片字节
+        image_format: 目标格式，取值见TRANSCODE_FORMATS
+        quality: 有损压缩质量（1-100）
+
+    Returns:
+        转码后的图片字节
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        pil_format = TRANSCODE_FORMATS[image_format]
+        if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+        buffer = io.BytesIO()
+        if pil_format == "JPEG":
+            image.save(buffer, pil_format, quality=quality, optimize=True)
+        else:
+            image.save(buffer, pil_format, quality=quality, method=4)
+        return buffer.getvalue()
+
+
+def _transcode_and_write(path: Path, data: bytes, image_format: str, quality: int) -> Tuple[float, float, int]:
+    """
+    在子进程中转码并写入图片，转码失败时抛出异常且不写入文件，由写入器按原格式保存
+
+    Returns:
+        (转码耗时, 写入耗时, 写入的字节数)
+    """
+    start = time.perf_counter()
+    data = transcode_image(data, image_format, quality)
+    transcode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with open(path, 'wb') as f:
+        f.write(data)
+    return transcode_seconds, time.perf_counter() - start, len(data)
+
+
+def get_transcode_pool() -> ProcessPoolExecutor:
+    """所有写入器共享的转码进程池，首次使用时创建"""
+    global _transcode_pool
+    with _transcode_pool_lock:
+        if _transcode_pool is None:
+            _transcode_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+        return _transcode_pool
+
+
+def page_index_path(output_dir: str, pdf_name: str) -> Path:
+    """PDF文件对应的页索引文件路径"""
+    return Path(output_dir) / f"{pdf_name}{PAGE_INDEX_SUFFIX}"
+
+
+def _encoded_length(text: str) -> int:
+    """文本以UTF-8写入文本模式文件后的字节数，换行符会被转换为os.linesep"""
+    return len(text.encode('utf-8')) + text.count("\n") * (len(os.linesep) - 1)
+
+
+def _write_json_atomic(path: Path, data: Dict[str, Any]):
+    """先写入临时文件再替换，读取方不会看到写了一半的JSON"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class PageIndex:
+    """
+    结果Markdown的页索引：记录每页在文件中的字节偏移和引用的图片，
+    读取任意一页时直接定位，无需读取整个文件
+    """
+
+    def __init__(self, index_path: str):
+        """
+        加载页索引
+
+        Args:
+            index_path: 页索引文件路径（<PDF名称>.index.json）
+
+        Raises:
+            ValueError: 索引版本不支持，或Markdown文件在生成索引后被修改
+        """
+        self.index_path = Path(index_path)
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != PAGE_INDEX_VERSION:
+            raise ValueError(f"不支持的页索引版本: {data.get('version')}")
+        if not data.get("complete"):
+            raise ValueError(f"{self.index_path} 尚未写完")
+        self.md_file_path = self.index_path.parent / data["markdown"]
+        if os.path.getsize(self.md_file_path) != data["size"]:
+            raise ValueError(f"{self.md_file_path} 在生成页索引后已被修改")
+        self.pages: List[Dict[str, Any]] = data["pages"]
+
+    @classmethod
+    def for_markdown(cls, md_file_path: str) -> "PageIndex":
+        """加载结果Markdown旁边的页索引"""
+        md_file_path = Path(md_file_path)
+        return cls(str(page_index_path(str(md_file_path.parent), md_file_path.stem)))
+
+    @property
+    def page_count(self) -> int:
+        """索引中的页数"""
+        return len(self.pages)
+
+    def read_page(self, page: int) -> str:
+        """
+        读取一页Markdown
+
+        Args:
+            page: 页码（从0开始）
+
+        Returns:
+            该页的Markdown，图片引用为相对结果目录的路径
+        """
+        entry = self.pages[page]
+        with open(self.md_file_path, 'rb') as f:
+            f.seek(entry["offset"])
+            data = f.read(entry["length"])
+        return data.decode('utf-8').replace("\r\n", "\n")
+
+    def page_images(self, page: int) -> List[str]:
+        """返回一页引用的图片路径（相对结果目录）"""
+        return list(self.pages[page]["images"])
+
+
+def _write_file(path: Path, data: bytes, metrics: Optional[DocumentMetrics] = None):
+    """写入单个文件"""
+    start = time.perf_counter()
+    with open(path, 'wb') as f:
+        f.write(data)
+    if metrics:
+        metrics.add_time("disk_write", time.perf_counter() - start)
+
+
+class ResultWriter:
+    """流式写入OCR结果：逐页追加Markdown，图片交由线程池并行写入"""
+
+    def __init__(self, output_dir: str, pdf_name: str, image_workers: int = 4, max_pending_images: int = 64,
+                 metrics: Optional[DocumentMetrics] = None, resume_pages: int = 0, resume_bytes: int = 0,
+                 image_format: Optional[str] = None, image_quality: int = 80, page_index: bool = False):
+        """
+        初始化结果写入器
+
+        Args:
+            output_dir: 输出目录
+            pdf_name: PDF文件名（不含扩展名）
+            image_workers: 写入图片的线程数
+            max_pending_images: 等待写入的图片数上限，用于限制内存占用
+            metrics: 文档指标，记录图片解码和磁盘写入的耗时
+            resume_pages: 之前已完整写入的页数，大于0时在已有的Markdown文件后继续写入
+            resume_bytes: 已写入页在Markdown文件中的字节数，之后的内容会被截断
+            image_format: 图片转码格式（webp或jpeg），在进程池中转码，为None时按原格式保存
+            image_quality: 转码的有损压缩质量（1-100）
+            page_index: 是否在Markdown旁写入页索引（<PDF名称>.index.json），记录每页的字节偏移和图片
+        """
+        if image_format is not None and image_format not in TRANSCODE_FORMATS:
+            raise ValueError(f"不支持的图片格式: {image_format}")
+        if image_format is not None:
+            try:
+                import PIL  # noqa: F401
+            except ImportError:
+                raise ImportError("图片转码需要安装Pillow")
+        self.output_dir = Path(output_dir)
+        self.images_dir = self.output_dir / "images"
+        self.md_file_path = self.output_dir / f"{pdf_name}.md"
+        self.index_path = page_index_path(output_dir, pdf_name)
+        self.image_workers = image_workers
+        self.max_pending_images = max_pending_images
+        self.metrics = metrics
+        self.resume_pages = resume_pages
+        self.resume_bytes = resume_bytes
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.page_index = page_index
+        self.page_count = 0
+        self.image_count = 0
+        self.image_bytes = 0
+        self._md_file = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = deque()
+        # 等待图片转码完成后才写入的页：(页面Markdown, [(图片ID, 原始字节, 原格式扩展名, 转码任务)])
+        self._pages = deque()
+        self._transcoding = 0
+        self._md_pages = 0
+        self._written_images = []
+        self._md_size = 0
+        self._index_pages: List[Dict[str, Any]] = []
+
+    def open(self):
+        """创建输出目录并打开Markdown文件"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        os.makedirs(self.images_dir, exist_ok=True)
+        if self.resume_pages:
+            # 丢弃上次中断时最后一个检查点之后写入的不完整内容
+            os.truncate(self.md_file_path, self.resume_bytes)
+            self._md_file = open(self.md_file_path, 'a', encoding='utf-8')
+            self.page_count = self.resume_pages
+            self._md_pages = self.resume_pages
+            self._md_size = self.resume_bytes
+            if self.page_index:
+                self._load_index_progress()
+        else:
+            self._md_file = open(self.md_file_path, 'w', encoding='utf-8')
+        if not self.page_index:
+            # 上次生成的页索引与新结果不一致
+            self._remove_index()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, self.image_workers), thread_name_prefix="ocr-image")
+        return self
+
+    def write_page(self, page):
+        """
+        写入一页OCR结果：提交图片写入任务并把该页Markdown追加到文件
+
+        Args:
+            page: OCR页面对象，需包含markdown和images属性
+        """
+        images = []
+        for img in page.images:
+            # 未请求图片数据（include_image_base64=False）时只保留Markdown
+            if not img.image_base64:
+                continue
+            start = time.perf_counter()
+            try:
+                img_data = decode_data_url(img.image_base64)
+            except Exception as e:
+                print(f"保存图片时出错: {e}")
+                continue
+            if self.metrics:
+                self.metrics.add_time("image_decode", time.perf_counter() - start)
+            images.append((img.id, img_data, data_url_mime(img.image_base64)))
+
+        self.write_raw_page(page.markdown, images)
+
+    def write_raw_page(self, markdown: str, images: List[Tuple[str, bytes, Optional[str]]]):
+        """
+        写入一页已解码的结果
+
+        转码图片时该页Markdown在其图片转码完成后才写入，转码失败的图片按原格式保存，
+        Markdown引用的始终是实际保存的文件
+
+        Args:
+            markdown: 页面Markdown
+            images: (图片ID, 图片字节, MIME类型)列表，MIME类型未知时为None
+        """
+        self.page_count += 1
+        if not self.image_format:
+            page_images = {}
+            for img_id, img_data, mime in images:
+                file_name = image_file_name(img_id, detect_image_extension(img_data, mime))
+                self._submit_image(self.images_dir / file_name, img_data)
+                page_images[img_id] = f"images/{file_name}"
+            self._write_markdown(markdown, page_images)
+            return
+
+        transcodes = []
+        for img_id, img_data, mime in images:
+            while self._transcoding >= self.max_pending_images and self._pages:
+                self._write_oldest_page()
+            # 转码是CPU密集的，交给进程池，写入的字节数在任务完成后统计
+            img_path = self.images_dir / image_file_name(img_id, self.image_format)
+            future = get_transcode_pool().submit(_transcode_and_write, img_path, img_data,
+                                                 self.image_format, self.image_quality)
+            self._transcoding += 1
+            transcodes.append((img_id, img_data, detect_image_extension(img_data, mime), future))
+        self._pages.append((markdown, transcodes))
+        # 按顺序写入图片已全部转码完成的页
+        while self._pages and all(item[3].done() for item in self._pages[0][1]):
+            self._write_oldest_page()
+
+    def _write_oldest_page(self):
+        """等待最早一页的图片转码完成，确定图片文件名后写入该页Markdown"""
+        markdown, transcodes = self._pages.popleft()
+        page_images = {}
+        for img_id, img_data, extension, future in transcodes:
+            self._transcoding -= 1
+            img_path = self.images_dir / image_file_name(img_id, self.image_format)
+            try:
+                transcode_seconds, write_seconds, size = future.result()
+            except Exception as e:
+                print(f"图片 {img_id} 转码失败，按原格式保存: {e}")
+                img_path = self.images_dir / image_file_name(img_id, extension)
+                self._submit_image(img_path, img_data)
+            else:
+                self._written_images.append(img_path)
+                self.image_count += 1
+                self.image_bytes += size
+                if self.metrics:
+                    self.metrics.add_time("image_transcode", transcode_seconds)
+                    self.metrics.add_time("disk_write", write_seconds)
+            page_images[img_id] = f"images/{img_path.name}"
+        self._write_markdown(markdown, page_images)
+
+    def _write_markdown(self, markdown: str, page_images: Dict[str, str]):
+        """替换图片引用后把一页Markdown追加到文件，并记录该页在文件中的位置"""
+        page_markdown = replace_images_in_markdown(markdown, page_images)
+        start = time.perf_counter()
+        if self._md_pages:
+            self._md_file.write(_PAGE_SEPARATOR)
+        self._md_file.write(page_markdown)
+        if self.metrics:
+            self.metrics.add_time("disk_write", time.perf_counter() - start)
+        if self.page_index:
+            if self._md_pages:
+                self._md_size += _encoded_length(_PAGE_SEPARATOR)
+            length = _encoded_length(page_markdown)
+            self._index_pages.append({"offset": self._md_size, "length": length,
+                                      "images": list(page_images.values())})
+            self._md_size += length
+        self._md_pages += 1
+
+    def _submit_image(self, img_path: Path, img_data: bytes):
+        """提交图片写入任务，等待中的任务过多时先等待最早的任务完成"""
+        while len(self._pending) >= self.max_pending_images:
+            self._wait_oldest()
+        future = self._executor.submit(_write_file, img_path, img_data, self.metrics)
+        self.image_bytes += len(img_data)
+        self._pending.append(future)
+        self._written_images.append(img_path)
+        self.image_count += 1
+
+    def _wait_oldest(self):
+        """等待最早提交的图片写入任务完成"""
+        future = self._pending.popleft()
+        try:
+            future.result()
+        except Exception as e:
+            print(f"保存图片时出错: {e}")
+
+    def checkpoint(self) -> Tuple[int, int]:
+        """
+        等待已提交的图片写入完成并刷新Markdown文件
+
+        Returns:
+            (已完整写入的页数, Markdown文件的字节数)
+        """
+        while self._pages:
+            self._write_oldest_page()
+        while self._pending:
+            self._wait_oldest()
+        self._md_file.flush()
+        if self.page_index:
+            # 中断后继续写入时需要之前各页的偏移
+            self._write_index(complete=False)
+        return self.page_count, os.fstat(self._md_file.fileno()).st_size
+
+    def _load_index_progress(self):
+        """继续写入时读取上次检查点保存的页索引，不完整时本次不生成页索引"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                pages = json.load(f)["pages"]
+        except (OSError, ValueError, KeyError) as e:
+            pages = []
+            print(f"读取页索引时出错: {e}")
+        if len(pages) < self.resume_pages:
+            print(f"{self.index_path} 缺少已写入页的偏移，本次不生成页索引")
+            self.page_index = False
+            return
+        self._index_pages = pages[:self.resume_pages]
+
+    def _write_index(self, complete: bool):
+        """写入页索引，未完成时只供继续写入使用"""
+        _write_json_atomic(self.index_path, {
+            "version": PAGE_INDEX_VERSION,
+            "markdown": self.md_file_path.name,
+            "complete": complete,
+            "size": self._md_size,
+            "pages": self._index_pages
+        })
+
+    def _remove_index(self):
+        """删除页索引文件"""
+        try:
+            os.remove(self.index_path)
+        except OSError:
+            pass
+
+    def close(self) -> str:
+        """
+        等待所有图片写入完成并关闭Markdown文件
+
+        Returns:
+            结果Markdown文件的路径
+        """
+        if self._md_file:
+            while self._pages:
+                self._write_oldest_page()
+        while self._pending:
+            self._wait_oldest()
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._md_file:
+            self._md_file.close()
+            self._md_file = None
+            if self.page_index:
+                self._write_index(complete=True)
+        return str(self.md_file_path)
+
+    def discard(self):
+        """删除已写入的Markdown和图片，并移除因此变空的输出目录"""
+        self.page_index = False
+        self.close()
+        for path in [self.md_file_path, self.index_path] + self._written_images:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._written_images = []
+        for directory in (self.images_dir, self.output_dir):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # 写入中途出错或被取消时清理不完整的结果
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
+            if self.metrics:
+                self.metrics.add("images", self.image_count)
+                self.metrics.add("bytes_written", self.image_bytes + os.path.getsize(self.md_file_path))
+        return False
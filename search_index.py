@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mistral OCR 全文搜索索引
+基于SQLite FTS5按页索引OCR结果，处理文档时增量更新，搜索时按相关度返回命中的文档、页码和摘要
+
+用法:
+    python search_index.py update results/
+    python search_index.py search "合同 违约金"
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+
+# 页在FTS表中的rowid为 文档ID << _PAGE_BITS | 页码，删除文档时按rowid范围删除，无需扫描全表
+_PAGE_BITS = 20
+_MAX_PAGES = 1 << _PAGE_BITS
+
+# trigram分词器按三个字符切分，中文等不以空格分词的文字也能按子串搜索，SQLite 3.34之前不支持时退回unicode61
+_TOKENIZERS = ("trigram", "unicode61 remove_diacritics 2")
+
+# Markdown图片引用，不参与索引
+_IMAGE_REF_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    md_path TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    paged INTEGER NOT NULL,
+    md_size INTEGER NOT NULL,
+    md_mtime REAL NOT NULL,
+    indexed_at REAL NOT NULL
+);
+"""
+
+
+def page_text(markdown: str) -> str:
+    """去掉图片引用后的页面文本"""
+    return _IMAGE_REF_PATTERN.sub("", markdown)
+
+
+def _match_query(terms: List[str]) -> str:
+    """把搜索词转换为FTS5查询：每个词作为短语，多个词同时出现才命中"""
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def _like_pattern(term: str) -> str:
+    """把搜索词转换为LIKE子串匹配模式"""
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _make_snippet(text: str, terms: List[str], width: int = 32) -> str:
+    """截取第一个搜索词附近的文本，并用方括号标出搜索词"""
+    lower_text = text.lower()
+    start = min((pos for pos in (lower_text.find(term.lower()) for term in terms) if pos >= 0), default=0)
+    begin = max(0, start - width)
+    snippet = text[begin:start + width * 2]
+    for term in terms:
+        snippet = re.sub(re.escape(term), lambda m: f"[{m.group(0)}]", snippet, flags=re.IGNORECASE)
+    prefix = "…" if begin > 0 else ""
+    suffix = "…" if start + width * 2 < len(text) else ""
+    return (prefix + snippet + suffix).replace("\n", " ")
+
+
+class SearchIndex:
+    """
+    OCR结果的全文搜索索引
+
+    每个结果Markdown是一个文档，每页是FTS5表中的一行。重新索引同一文档时先删除它的所有页，
+    更新在写事务中完成，多个线程或进程可同时写入同一个索引。
+    """
+
+    def __init__(self, db_path: str):
+        """
+        打开（或创建）搜索索引
+
+        Args:
+            db_path: SQLite数据库文件路径，应放在本地磁盘上（使用WAL日志模式，搜索和写入互不阻塞）
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'pages'").fetchone()
+        if row is None:
+            row = (self._create_pages_table(conn),)
+        self.trigram = "trigram" in row[0]
+
+    @staticmethod
+    def _create_pages_table(conn: sqlite3.Connection) -> str:
+        """创建按页索引的FTS5表，返回使用的建表语句"""
+        for tokenizer in _TOKENIZERS:
+            sql = f"CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(content, tokenize='{tokenizer}')"
+            try:
+                conn.execute(sql)
+                return sql
+            except sqlite3.OperationalError:
+                continue
+        raise Exception("当前SQLite不支持FTS5全文索引")
+
+    def _connect(self) -> sqlite3.Connection:
+        """当前线程的数据库连接（sqlite3连接不能跨线程使用）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _delete_pages(self, conn: sqlite3.Connection, doc_id: int):
+        """删除文档的所有页"""
+        first = doc_id << _PAGE_BITS
+        conn.execute("DELETE FROM pages WHERE rowid BETWEEN ? AND ?", (first, first + _MAX_PAGES - 1))
+
+    def index_document(self, md_path: str, pages: Iterable[str], title: Optional[str] = None,
+                       paged: bool = True) -> int:
+        """
+        索引一个结果文档，替换该文档之前的索引
+
+        Args:
+            md_path: 结果Markdown文件路径
+            pages: 每页的Markdown
+            title: 文档标题，默认使用文件名
+            paged: pages是否按PDF页划分；为False时只有一行，搜索结果不显示页码
+
+        Returns:
+            索引的页数
+        """
+        md_path = os.path.abspath(md_path)
+        stat = os.stat(md_path)
+        title = title or Path(md_path).stem
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id FROM documents WHERE md_path = ?", (md_path,)).fetchone()
+            if row is None:
+                doc_id = conn.execute(
+                    "INSERT INTO documents (md_path, title, page_count, paged, md_size, md_mtime, indexed_at) "
+                    "VALUES (?, ?, 0, ?, 0, 0, 0)", (md_path, title, int(paged))
+                ).lastrowid
+            else:
+                doc_id = row[0]
+                self._delete_pages(conn, doc_id)
+
+            page_count = 0
+            for page_count, markdown in enumerate(pages, 1):
+                if page_count > _MAX_PAGES:
+                    raise Exception(f"页数超过上限 {_MAX_PAGES}")
+                conn.execute("INSERT INTO pages (rowid, content) VALUES (?, ?)",
+                             ((doc_id << _PAGE_BITS) + page_count - 1, page_text(markdown)))
+            conn.execute(
+                "UPDATE documents SET title = ?, page_count = ?, paged = ?, md_size = ?, md_mtime = ?, "
+                "indexed_at = ? WHERE id = ?",
+                (title, page_count, int(paged), stat.st_size, stat.st_mtime, time.time(), doc_id)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return page_count
+
+    def is_current(self, md_path: str) -> bool:
+        """文档已索引且结果文件在索引后没有变化"""
+        md_path = os.path.abspath(md_path)
+        row = self._connect().execute("SELECT md_size, md_mtime FROM documents WHERE md_path = ?",
+                                      (md_path,)).fetchone()
+        if row is None:
+            return False
+        try:
+            stat = os.stat(md_path)
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime) == tuple(row)
+
+    def remove_document(self, md_path: str) -> bool:
+        """
+        从索引中删除文档
+
+        Returns:
+            文档之前已被索引时返回True
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id FROM documents WHERE md_path = ?",
+                               (os.path.abspath(md_path),)).fetchone()
+            if row is not None:
+                self._delete_pages(conn, row[0])
+                conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row is not None
+
+    def prune(self) -> int:
+        """
+        删除结果文件已不存在的文档
+
+        Returns:
+            删除的文档数
+        """
+        paths = [row[0] for row in self._connect().execute("SELECT md_path FROM documents")]
+        return sum(1 for path in paths if not os.path.exists(path) and self.remove_document(path))
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        搜索包含所有搜索词的页，按相关度排序
+
+        Args:
+            query: 以空格分隔的搜索词
+            limit: 最多返回的结果数
+
+        Returns:
+            结果字典列表，包含md_path、title、page（从1开始，文档未分页时为None）、snippet和score
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        conn = self._connect()
+        if self.trigram and any(len(term) < 3 for term in terms):
+            # trigram索引无法匹配少于三个字符的词，改为逐行子串匹配
+            conditions = " AND ".join("content LIKE ? ESCAPE '\\'" for _ in terms)
+            rows = conn.execute(f"SELECT rowid, content, 0 FROM pages WHERE {conditions} LIMIT ?",
+                                [_like_pattern(term) for term in terms] + [limit]).fetchall()
+            rows = [(rowid, _make_snippet(content, terms), score) for rowid, content, score in rows]
+        else:
+            rows = conn.execute(
+                "SELECT rowid, snippet(pages, 0, '[', ']', '…', 16), rank FROM pages "
+                "WHERE pages MATCH ? ORDER BY rank LIMIT ?",
+                (_match_query(terms), limit)
+            ).fetchall()
+
+        documents = {}
+        results = []
+        for rowid, snippet, score in rows:
+            doc_id = rowid >> _PAGE_BITS
+            if doc_id not in documents:
+                documents[doc_id] = conn.execute("SELECT md_path, title, paged FROM documents WHERE id = ?",
+                                                 (doc_id,)).fetchone()
+            document = documents[doc_id]
+            if document is None:
+                continue
+            md_path, title, paged = document
+            results.append({
+                "md_path": md_path,
+                "title": title,
+                "page": (rowid & (_MAX_PAGES - 1)) + 1 if paged else None,
+                "snippet": snippet.replace("\n", " "),
+                "score": -score
+            })
+        return results
+
+    def counts(self) -> Dict[str, int]:
+        """已索引的文档数和页数"""
+        documents, pages = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(page_count), 0) FROM documents").fetchone()
+        return {"documents": documents, "pages": pages}
+
+    def close(self):
+        """关闭当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def read_result_pages(md_path: Path) -> Tuple[List[str], bool]:
+    """
+    读取结果文档的每页Markdown：优先使用原始结果，其次使用页索引，都没有时整个文件作为一行
+
+    Returns:
+        (每页Markdown列表, 是否按页划分)
+    """
+    from raw_store import RawStore, raw_store_path
+    from result_writer import PageIndex
+
+    # 通过RawStore打开，只使用写完manifest.json的完整原始结果；只读取文本，不读取图片数据
+    try:
+        store = RawStore(str(raw_store_path(str(md_path.parent), md_path.stem)))
+        with open(store.store_dir / "pages.jsonl", 'r', encoding='utf-8') as f:
+            pages = [json.loads(f.readline())["markdown"] for _ in range(store.page_count)]
+        return pages, True
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        index = PageIndex.for_markdown(str(md_path))
+        return [index.read_page(page) for page in range(index.page_count)], True
+    except (OSError, ValueError, KeyError):
+        pass
+    with open(md_path, 'r', encoding='utf-8') as f:
+        return [f.read()], False
+
+
+def update_index(search_index: SearchIndex, inputs: List[str], quiet: bool = False) -> Dict[str, int]:
+    """
+    索引输入目录中的结果Markdown，跳过索引后没有变化的文件，并删除结果已不存在的文档
+
+    Returns:
+        包含indexed、skipped、failed和removed的计数字典
+    """
+    counts = {"indexed": 0, "skipped": 0, "failed": 0, "removed": 0}
+    md_files = []
+    for item in inputs:
+        path = Path(item)
+        md_files.extend([path] if path.is_file() else sorted(path.glob("**/*.md")))
+    for md_path in md_files:
+        if search_index.is_current(str(md_path)):
+            counts["skipped"] += 1
+            continue
+        try:
+            pages, paged = read_result_pages(md_path)
+            search_index.index_document(str(md_path), pages, paged=paged)
+            counts["indexed"] += 1
+            if not quiet:
+                print(f"已索引 {md_path}（{len(pages)} 页）")
+        except Exception as e:
+            counts["failed"] += 1
+            print(f"索引 {md_path} 失败: {e}", file=sys.stderr)
+    counts["removed"] = search_index.prune()
+    return counts
+
+
+def default_index_path() -> str:
+    """默认的索引文件路径（应用数据目录下的search_index.db）"""
+    from config_manager import ConfigManager
+    return ConfigManager().get_search_index_path()
+
+
+def main(argv=None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="Mistral OCR 结果全文搜索")
+    parser.add_argument("--db", help="索引文件路径，默认使用应用数据目录下的search_index.db")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update = subparsers.add_parser("update", help="索引已有的OCR结果，跳过没有变化的文件")
+    update.add_argument("inputs", nargs="+", help="结果Markdown文件或包含它们的目录")
+    update.add_argument("-q", "--quiet", action="store_true", help="不输出每个文件的索引信息")
+
+    search = subparsers.add_parser("search", help="搜索OCR结果")
+    search.add_argument("query", nargs="+", help="搜索词，多个词同时出现的页才会命中")
+    search.add_argument("-n", "--limit", type=int, default=20, help="最多显示的结果数（默认20）")
+    search.add_argument("--json", action="store_true", help="以JSON格式输出结果")
+
+    subparsers.add_parser("status", help="显示已索引的文档数和页数")
+    args = parser.parse_args(argv)
+
+    search_index = SearchIndex(args.db or default_index_path())
+    if args.command == "update":
+        counts = update_index(search_index, args.inputs, args.quiet)
+        print(f"索引 {counts['indexed']} 个，跳过 {counts['skipped']} 个未变化的文件，"
+              f"失败 {counts['failed']} 个，移除 {counts['removed']} 个已删除的结果")
+        return 0 if counts["failed"] == 0 else 1
+    if args.command == "search":
+        start = time.perf_counter()
+        results = search_index.search(" ".join(args.query), args.limit)
+        if args.json:
+            print(json.dumps(results, ensure_ascii=False, indent=2))
+            return 0
+        for result in results:
+            location = f"第{result['page']}页" if result["page"] else "全文"
+            print(f"{result['md_path']}  {location}\n    {result['snippet']}")
+        print(f"共 {len(results)} 条结果，用时 {(time.perf_counter() - start) * 1000:.1f} 毫秒")
+        return 0
+    counts = search_index.counts()
+    print(f"已索引 {counts['documents']} 个文档，{counts['pages']} 页")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,477 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mistral OCR 监视目录模式
+持续监视一个或多个输入目录，新PDF写入完成后自动OCR，结果保存到输出目录
+
+Linux上使用inotify接收文件事件，其他平台或inotify不可用时定期扫描目录。
+
+用法:
+    python watch_folder.py inbox/ -o results/ -w 4
+"""
+
+import os
+import sys
+import time
+import queue
+import ctypes
+import ctypes.util
+import select
+import signal
+import struct
+import argparse
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Dict, List, Tuple
+
+from ocr_engine import OCREngine
+from batch_ocr import add_engine_arguments, prepare_engine, process_one
+
+# inotify事件掩码，见 <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct("iIII")
+
+# 文件停止变化后仍未找到PDF结束标记时，再等待该倍数的稳定时间后也视为写入完成
+_NO_EOF_SETTLE_FACTOR = 5
+
+
+class Inotify:
+    """通过ctypes调用Linux inotify接口"""
+
+    def __init__(self):
+        """初始化inotify实例，当前系统不支持时抛出OSError"""
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify仅支持Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1失败: {os.strerror(errno)}")
+
+    def add_watch(self, path: str, mask: int = _WATCH_MASK) -> int:
+        """监视目录，返回监视描述符"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"监视目录失败: {os.strerror(errno)}", path)
+        return wd
+
+    def read_events(self, timeout: float) -> List[Tuple[int, int, str]]:
+        """
+        读取事件，最多等待timeout秒
+
+        Returns:
+            (监视描述符, 事件掩码, 文件名)列表
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        """关闭inotify实例"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class FolderWatcher:
+    """
+    监视目录中的PDF文件，文件写入完成后回调
+
+    事件或扫描发现的文件先进入候选列表，大小和修改时间在settle_seconds内不再变化且末尾有PDF结束标记时才视为写入完成，
+    避免处理仍在复制或上传中的文件。已回调的文件之后被修改（如替换为修订版）时会再次回调。
+    """
+
+    def __init__(self, directories: List[str], recursive: bool = True, settle_seconds: float = 2.0,
+                 poll_interval: float = 2.0, rescan_interval: float = 60.0, use_inotify: bool = True):
+        """
+        初始化目录监视器
+
+        Args:
+            directories: 要监视的目录列表
+            recursive: 是否同时监视子目录
+            settle_seconds: 文件停止变化多少秒后视为写入完成
+            poll_interval: 扫描模式下两次扫描的间隔（秒）
+            rescan_interval: inotify模式下完整扫描一次的间隔（秒），用于补上丢失的事件
+            use_inotify: 是否尝试使用inotify，为False或不可用时使用扫描模式
+        """
+        self.directories = [Path(directory).resolve() for directory in directories]
+        self.recursive = recursive
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.use_inotify = use_inotify
+        self.mode = "polling"
+        self._inotify: Optional[Inotify] = None
+        self._watches: Dict[int, Path] = {}
+        # 候选文件: 路径 -> (大小, 修改时间, 最后一次变化的时间)
+        self._candidates: Dict[Path, Tuple[int, int, float]] = {}
+        # 已回调的文件: 路径 -> (大小, 修改时间)
+        self._dispatched: Dict[Path, Tuple[int, int]] = {}
+
+    def _open_inotify(self):
+        """尝试启用inotify，失败时保持扫描模式"""
+        if not self.use_inotify:
+            return
+        try:
+            self._inotify = Inotify()
+        except OSError as e:
+            print(f"无法使用inotify，改为定期扫描目录: {e}")
+            return
+        self.mode = "inotify"
+        for directory in self.directories:
+            self._watch_tree(directory)
+
+    def _watch_tree(self, directory: Path):
+        """监视目录及（递归模式下的）所有子目录"""
+        directories = [directory]
+        if self.recursive:
+            try:
+                directories.extend(path for path in directory.rglob("*") if path.is_dir())
+            except OSError as e:
+                print(f"列出子目录 {directory} 时出错: {e}")
+        for path in directories:
+            try:
+                self._watches[self._inotify.add_watch(str(path))] = path
+            except OSError as e:
+                print(f"监视目录 {path} 时出错: {e}")
+
+    def _iter_pdfs(self, directory: Path):
+        """列出目录中的PDF文件"""
+        pattern = "**/*" if self.recursive else "*"
+        for path in directory.glob(pattern):
+            if path.suffix.lower() == ".pdf" and path.is_file():
+                yield path
+
+    def scan(self):
+        """扫描所有监视目录，新增或变化的PDF加入候选列表"""
+        for directory in self.directories:
+            try:
+                for path in self._iter_pdfs(directory):
+                    self._touch(path)
+            except OSError as e:
+                print(f"扫描目录 {directory} 时出错: {e}")
+
+    def mark_existing(self, is_done: Optional[Callable[[Path], bool]] = None):
+        """
+        将当前已有的PDF记为已处理，启动时跳过它们
+
+        Args:
+            is_done: 判断文件是否已处理的函数，为None时所有已有文件都跳过
+        """
+        for directory in self.directories:
+            for path in self._iter_pdfs(directory):
+                if is_done is None or is_done(path):
+                    stat = self._stat(path)
+                    if stat:
+                        self._dispatched[path] = stat
+
+    @staticmethod
+    def _stat(path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _touch(self, path: Path):
+        """文件有变化时加入候选列表，并重新开始计算稳定时间"""
+        stat = self._stat(path)
+        if stat is None:
+            self._candidates.pop(path, None)
+            return
+        if self._dispatched.get(path) == stat:
+            return
+        candidate = self._candidates.get(path)
+        if candidate is None or candidate[:2] != stat:
+            self._candidates[path] = stat + (time.monotonic(),)
+
+    @staticmethod
+    def _has_eof_marker(path: Path) -> bool:
+        """文件末尾是否有PDF结束标记%%EOF"""
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 1024))
+                return b"%%EOF" in f.read()
+        except OSError:
+            return False
+
+    def _collect_ready(self) -> List[Path]:
+        """返回已写入完成的候选文件"""
+        now = time.monotonic()
+        ready = []
+        for path, (size, mtime, changed_at) in list(self._candidates.items()):
+            stat = self._stat(path)
+            if stat is None:
+                del self._candidates[path]
+            elif stat != (size, mtime):
+                self._candidates[path] = stat + (now,)
+            elif size > 0 and now - changed_at >= self.settle_seconds:
+                if self._has_eof_marker(path) or now - changed_at >= self.settle_seconds * _NO_EOF_SETTLE_FACTOR:
+                    ready.append(path)
+        return ready
+
+    def _handle_events(self, events: List[Tuple[int, int, str]]):
+        """处理inotify事件"""
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，部分事件已丢失
+                self.scan()
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                if mask & IN_IGNORED:
+                    del self._watches[wd]
+                continue
+            path = directory / name
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    # 新目录在开始监视前可能已有文件
+                    self._watch_tree(path)
+                    for pdf in self._iter_pdfs(path):
+                        self._touch(pdf)
+            elif path.suffix.lower() == ".pdf":
+                self._touch(path)
+
+    def run(self, on_ready: Callable[[Path], bool], stop_event: threading.Event):
+        """
+        持续监视目录，直到stop_event被设置
+
+        Args:
+            on_ready: 文件写入完成时的回调，返回False表示暂时无法接收，稍后会再次回调
+            stop_event: 停止事件
+        """
+        self._open_inotify()
+        self.scan()
+        last_scan = time.monotonic()
+        try:
+            while not stop_event.is_set():
+                for path in self._collect_ready():
+                    if stop_event.is_set():
+                        break
+                    stat = self._candidates[path][:2]
+                    if on_ready(path):
+                        del self._candidates[path]
+                        self._dispatched[path] = stat
+
+                # 有候选文件时缩短等待时间，及时判断是否写入完成
+                wait = min(0.5, self.settle_seconds / 2) if self._candidates else 1.0
+                if self._inotify:
+                    self._handle_events(self._inotify.read_events(wait))
+                    interval = self.rescan_interval
+                else:
+                    stop_event.wait(min(wait, self.poll_interval))
+                    interval = self.poll_interval
+                if time.monotonic() - last_scan >= interval:
+                    self.scan()
+                    last_scan = time.monotonic()
+        finally:
+            if self._inotify:
+                self._inotify.close()
+                self._inotify = None
+
+
+class WatchDaemon:
+    """监视目录并把写入完成的PDF交给有界工作队列，由多个工作线程调用OCR引擎处理"""
+
+    def __init__(self, engine, watcher: FolderWatcher, output_root: str, workers: int = 4,
+                 queue_size: int = 100, quiet: bool = False):
+        """
+        初始化监视服务
+
+        Args:
+            engine: OCR引擎实例（在多个工作线程间共享）
+            watcher: 目录监视器
+            output_root: 输出根目录
+            workers: 工作线程数
+            queue_size: 等待处理的文件数上限，队列满时暂停接收新文件
+            quiet: 是否关闭逐个文件的输出
+        """
+        self.engine = engine
+        self.watcher = watcher
+        self.output_root = Path(output_root)
+        self.workers = max(1, workers)
+        self.quiet = quiet
+        self.stop_event = threading.Event()
+        self.stats = {"succeeded": 0, "failed": 0}
+        self._queue: "queue.Queue[Path]" = queue.Queue(maxsize=max(1, queue_size))
+        self._queued = set()
+        self._lock = threading.Lock()
+
+    def output_dir_for(self, pdf_path: Path) -> str:
+        """
+        PDF的输出目录：保持其在监视目录中的相对位置，同一文件每次处理都使用同一目录
+
+        监视多个目录时以监视目录的名称作为第一级子目录。
+        """
+        for root in self.watcher.directories:
+            try:
+                relative = pdf_path.relative_to(root)
+            except ValueError:
+                continue
+            if len(self.watcher.directories) > 1:
+                relative = Path(root.name) / relative
+            return str(self.output_root / relative.with_suffix(""))
+        return str(self.output_root / pdf_path.stem)
+
+    def is_done(self, pdf_path: Path) -> bool:
+        """结果Markdown已存在且不早于PDF时视为已处理"""
+        md_file = Path(self.output_dir_for(pdf_path)) / f"{pdf_path.stem}.md"
+        try:
+            return md_file.stat().st_mtime >= pdf_path.stat().st_mtime
+        except OSError:
+            return False
+
+    def submit(self, pdf_path: Path) -> bool:
+        """把文件加入工作队列，队列已满或该文件正在等待处理时返回False"""
+        with self._lock:
+            if pdf_path in self._queued:
+                return False
+            try:
+                self._queue.put_nowait(pdf_path)
+            except queue.Full:
+                return False
+            self._queued.add(pdf_path)
+        return True
+
+    def _work(self):
+        """工作线程：从队列中取出文件并处理"""
+        while not self.stop_event.is_set():
+            try:
+                pdf_path = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                result = process_one(self.engine, pdf_path, self.output_dir_for(pdf_path))
+            finally:
+                with self._lock:
+                    self._queued.discard(pdf_path)
+                self._queue.task_done()
+
+            with self._lock:
+                self.stats["succeeded" if result["success"] else "failed"] += 1
+            if not self.quiet:
+                status = "成功" if result["success"] else "失败"
+                line = f"{status} {pdf_path} ({result['duration']:.1f}s)"
+                if not result["success"]:
+                    line += f" - {result['message']}"
+                print(line, flush=True)
+
+    def run(self, process_existing: bool = False):
+        """
+        启动工作线程并持续监视目录，直到stop()被调用
+
+        Args:
+            process_existing: 是否处理启动时已有且没有最新结果的文件
+        """
+        self.watcher.mark_existing(self.is_done if process_existing else None)
+        threads = [threading.Thread(target=self._work, name=f"watch-worker-{i}", daemon=True)
+                   for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            self.watcher.run(self.submit, self.stop_event)
+        finally:
+            self.stop_event.set()
+            # 等待正在处理的文件完成，队列中尚未开始的文件下次启动时会重新发现
+            for thread in threads:
+                thread.join()
+
+    def stop(self):
+        """请求停止，正在处理的文件完成后退出"""
+        self.stop_event.set()
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Mistral OCR 监视目录模式")
+    parser.add_argument("directories", nargs="+", help="要监视的输入目录")
+    parser.add_argument("-o", "--output-dir", help="输出根目录，默认使用已保存的输出目录")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="并发处理的文件数（默认4）")
+    parser.add_argument("--queue-size", type=int, default=100, help="等待处理的文件数上限（默认100）")
+    parser.add_argument("--settle", type=float, default=2.0, help="文件停止变化多少秒后开始处理（默认2）")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="扫描模式下的扫描间隔（秒，默认2）")
+    parser.add_argument("--polling", action="store_true", help="不使用inotify，定期扫描目录")
+    parser.add_argument("--process-existing", action="store_true",
+                        help="启动时处理目录中已有且没有最新结果的PDF，默认只处理启动后新增或修改的文件")
+    parser.add_argument("--no-recursive", action="store_true", help="不监视子目录")
+    add_engine_arguments(parser)
+    parser.add_argument("-q", "--quiet", action="store_true", help="不输出逐个文件的处理结果")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """命令行入口函数"""
+    args = parse_args(argv)
+
+    missing = [directory for directory in args.directories if not os.path.isdir(directory)]
+    if missing:
+        print(f"目录不存在: {', '.join(missing)}", file=sys.stderr)
+        return 1
+
+    setup = prepare_engine(args)
+    if setup is None:
+        return 1
+    metrics = setup["metrics"]
+    metrics_server = metrics.serve(args.metrics_port) if args.metrics_port else None
+
+    engine = OCREngine(setup["api_key"], cache=setup["cache"], **setup["engine_options"])
+    watcher = FolderWatcher(args.directories, recursive=not args.no_recursive, settle_seconds=args.settle,
+                            poll_interval=args.poll_interval, use_inotify=not args.polling)
+    daemon = WatchDaemon(engine, watcher, setup["output_root"], workers=args.workers,
+                         queue_size=args.queue_size, quiet=args.quiet)
+
+    def handle_signal(signum, frame):
+        print("正在停止，等待处理中的文件完成...", flush=True)
+        daemon.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, handle_signal)
+
+    print(f"正在监视 {', '.join(str(d) for d in watcher.directories)}，结果保存到 {setup['output_root']}", flush=True)
+    try:
+        daemon.run(process_existing=args.process_existing)
+    finally:
+        if metrics_server:
+            metrics_server.shutdown()
+        metrics.close()
+
+    print(f"已停止（{watcher.mode}），成功 {daemon.stats['succeeded']} 个，失败 {daemon.stats['failed']} 个")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
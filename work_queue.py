@@ -0,0 +1,460 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mistral OCR 多节点任务队列
+任务保存在SQLite数据库中，多个工作进程（可在不同机器上，通过共享文件系统访问数据库和PDF）租用任务并定期续租，
+租约过期的任务重新排队，由其他工作进程接手
+
+用法:
+    python work_queue.py enqueue /shared/queue.db scans/ -o /shared/results
+    python work_queue.py worker /shared/queue.db -w 4 --journal-dir /shared/journal
+    python work_queue.py status /shared/queue.db
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+from ocr_engine import OCREngine
+from batch_ocr import add_engine_arguments, prepare_engine, assign_output_dirs, process_one
+from pdf_utils import collect_pdf_files
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pdf_path TEXT NOT NULL,
+    output_dir TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires);
+CREATE INDEX IF NOT EXISTS jobs_output_dir ON jobs (output_dir);
+"""
+
+
+class WorkQueue:
+    """
+    基于SQLite的任务队列
+
+    任务状态依次为queued（等待）、leased（已被工作进程租用）、succeeded或failed。
+    租用和状态更新都在写事务中完成，多个进程同时租用时每个任务只会交给一个进程。
+    租约到期未续租的任务重新排队，尝试次数达到上限后标记为失败。
+    """
+
+    QUEUED = "queued"
+    LEASED = "leased"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    def __init__(self, db_path: str, wal: bool = False):
+        """
+        打开（或创建）任务队列
+
+        Args:
+            db_path: SQLite数据库文件路径
+            wal: 是否使用WAL日志模式；WAL并发性能更好，但要求所有进程在同一台机器上，数据库放在网络文件系统上时不能启用
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(f"PRAGMA journal_mode={'WAL' if wal else 'DELETE'}")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """当前线程的数据库连接（sqlite3连接不能跨线程使用）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        """开始写事务，立即获取写锁，避免多个进程读到同一个待租用的任务"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        return _Transaction(conn)
+
+    def enqueue(self, jobs: List[Tuple[str, str]], max_attempts: int = 3) -> int:
+        """
+        添加任务，已在等待或处理中的同一文件不重复添加
+
+        输出目录已被队列中其他文件使用时（例如之前另一次添加的同名文件）自动加序号后缀，
+        避免两个任务的结果互相覆盖
+
+        Args:
+            jobs: (PDF文件路径, 输出目录)列表
+            max_attempts: 每个任务的最大尝试次数
+
+        Returns:
+            新添加的任务数
+        """
+        now = time.time()
+        added = 0
+        with self._transaction() as conn:
+            for pdf_path, output_dir in jobs:
+                exists = conn.execute("SELECT 1 FROM jobs WHERE pdf_path = ? AND status IN (?, ?)",
+                                      (pdf_path, self.QUEUED, self.LEASED)).fetchone()
+                if exists:
+                    continue
+                output_dir = self._unique_output_dir(conn, pdf_path, output_dir)
+                conn.execute(
+                    "INSERT INTO jobs (pdf_path, output_dir, status, max_attempts, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (pdf_path, output_dir, self.QUEUED, max(1, max_attempts), now, now)
+                )
+                added += 1
+        return added
+
+    @staticmethod
+    def _unique_output_dir(conn: sqlite3.Connection, pdf_path: str, output_dir: str) -> str:
+        """返回未被其他文件的任务使用的输出目录，同一文件重复添加时沿用相同的目录"""
+        candidate = output_dir
+        count = 1
+        while conn.execute("SELECT 1 FROM jobs WHERE output_dir = ? AND pdf_path != ? LIMIT 1",
+                           (candidate, pdf_path)).fetchone():
+            count += 1
+            candidate = f"{output_dir}_{count}"
+        return candidate
+
+    def lease(self, owner: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """
+        租用最早的可用任务（等待中或租约已过期）
+
+        Args:
+            owner: 工作进程标识
+            lease_seconds: 租约时长（秒）
+
+        Returns:
+            任务字典，没有可用任务时返回None
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            # 租约过期且已用完尝试次数的任务不再重试
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, lease_owner = NULL, updated_at = ? "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts",
+                (self.FAILED, "租约过期且已达到最大尝试次数", now, self.LEASED, now)
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY id LIMIT 1",
+                (self.QUEUED, self.LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                (self.LEASED, owner, now + lease_seconds, now, row["id"])
+            )
+        job = dict(row)
+        job["attempts"] += 1
+        return job
+
+    def heartbeat(self, job_id: int, owner: str, lease_seconds: float) -> bool:
+        """
+        续租任务
+
+        Returns:
+            租约仍属于该工作进程时返回True；返回False说明租约已过期并被其他进程接手
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                (now + lease_seconds, now, job_id, self.LEASED, owner)
+            )
+            return cursor.rowcount == 1
+
+    def finish(self, job_id: int, owner: str, result: Dict[str, Any]) -> bool:
+        """
+        记录任务结果，失败且未用完尝试次数的任务重新排队
+
+        Args:
+            job_id: 任务ID
+            owner: 工作进程标识
+            result: process_pdf返回的结果字典
+
+        Returns:
+            租约仍属于该工作进程、结果已记录时返回True
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = ? AND lease_owner = ?",
+                               (job_id, self.LEASED, owner)).fetchone()
+            if row is None:
+                return False
+            if result.get("success"):
+                status = self.SUCCEEDED
+            elif row["attempts"] < row["max_attempts"]:
+                status = self.QUEUED
+            else:
+                status = self.FAILED
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, message = ?, result = ?, "
+                "updated_at = ? WHERE id = ?",
+                (status, result.get("message", ""), json.dumps(result, ensure_ascii=False), now, job_id)
+            )
+        return True
+
+    def retry_failed(self) -> int:
+        """将失败的任务重新排队并重置尝试次数，返回任务数"""
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE jobs SET status = ?, attempts = 0, updated_at = ? WHERE status = ?",
+                                  (self.QUEUED, time.time(), self.FAILED))
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        counts = {status: 0 for status in (self.QUEUED, self.LEASED, self.SUCCEEDED, self.FAILED)}
+        for row in self._connect().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        return counts
+
+    def failures(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """最近失败的任务"""
+        rows = self._connect().execute(
+            "SELECT id, pdf_path, attempts, message FROM jobs WHERE status = ? ORDER BY updated_at DESC LIMIT ?",
+            (self.FAILED, limit)
+        )
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """关闭当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class _Transaction:
+    """写事务的上下文管理器，正常退出时提交，出错时回滚"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class QueueWorker:
+    """从任务队列租用任务并调用OCR引擎处理，处理期间在后台线程中定期续租"""
+
+    def __init__(self, work_queue: WorkQueue, engine, owner: str, lease_seconds: float = 120.0,
+                 poll_interval: float = 5.0, quiet: bool = False):
+        """
+        初始化工作线程
+
+        Args:
+            work_queue: 任务队列
+            engine: OCR引擎实例
+            owner: 工作进程标识，在所有节点中唯一
+            lease_seconds: 租约时长（秒），每隔三分之一租约时长续租一次
+            poll_interval: 没有任务时的等待间隔（秒）
+            quiet: 是否关闭逐个文件的输出
+        """
+        self.work_queue = work_queue
+        self.engine = engine
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.quiet = quiet
+        self.stats = {"succeeded": 0, "failed": 0, "lost": 0}
+
+    def _keep_alive(self, job_id: int, done: threading.Event, lost: threading.Event):
+        """定期续租，租约被其他进程接手时设置lost"""
+        while not done.wait(self.lease_seconds / 3):
+            try:
+                alive = self.work_queue.heartbeat(job_id, self.owner, self.lease_seconds)
+            except sqlite3.Error as e:
+                # 数据库暂时不可用时继续处理，租约到期前还有机会续租
+                print(f"续租任务 {job_id} 时出错: {e}")
+                continue
+            if not alive:
+                lost.set()
+                return
+
+    def run_one(self) -> bool:
+        """
+        租用并处理一个任务
+
+        Returns:
+            处理了任务返回True，没有可用任务时返回False
+        """
+        job = self.work_queue.lease(self.owner, self.lease_seconds)
+        if job is None:
+            return False
+
+        done = threading.Event()
+        lost = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_alive, args=(job["id"], done, lost),
+                                     name=f"lease-{job['id']}", daemon=True)
+        heartbeat.start()
+        try:
+            # 租约被其他进程接手时取消处理
+            result = process_one(self.engine, Path(job["pdf_path"]), job["output_dir"], lost)
+        finally:
+            done.set()
+            heartbeat.join()
+
+        if lost.is_set() or not self.work_queue.finish(job["id"], self.owner, result):
+            # 租约已过期，任务由其他进程重新处理，本次结果不记录
+            self.stats["lost"] += 1
+            if not self.quiet:
+                print(f"租约已失效，放弃 {job['pdf_path']}", flush=True)
+            return True
+
+        self.stats["succeeded" if result["success"] else "failed"] += 1
+        if not self.quiet:
+            status = "成功" if result["success"] else "失败"
+            line = f"[{self.owner}] {status} {job['pdf_path']} ({result['duration']:.1f}s，第{job['attempts']}次)"
+            if not result["success"]:
+                line += f" - {result['message']}"
+            print(line, flush=True)
+        return True
+
+    def run(self, stop_event: threading.Event, exit_when_empty: bool = False):
+        """
+        持续处理任务，直到stop_event被设置
+
+        Args:
+            stop_event: 停止事件，设置后处理完当前任务即退出
+            exit_when_empty: 队列中没有可用任务时是否退出
+        """
+        try:
+            while not stop_event.is_set():
+                try:
+                    processed = self.run_one()
+                except sqlite3.Error as e:
+                    print(f"访问任务队列时出错: {e}")
+                    processed = False
+                if not processed:
+                    if exit_when_empty:
+                        return
+                    stop_event.wait(self.poll_interval)
+        finally:
+            self.work_queue.close()
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Mistral OCR 多节点任务队列")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = subparsers.add_parser("enqueue", help="添加任务")
+    enqueue.add_argument("db", help="任务队列数据库")
+    enqueue.add_argument("inputs", nargs="+", help="PDF文件、目录或通配符，所有工作节点都需能以相同路径访问")
+    enqueue.add_argument("-o", "--output-dir", required=True, help="共享的输出根目录")
+    enqueue.add_argument("--max-attempts", type=int, default=3, help="每个任务的最大尝试次数（默认3）")
+    enqueue.add_argument("--no-recursive", action="store_true", help="不递归搜索子目录")
+    enqueue.add_argument("--wal", action="store_true", help="使用WAL日志模式（仅限所有进程在同一台机器上）")
+
+    worker = subparsers.add_parser("worker", help="运行工作进程")
+    worker.add_argument("db", help="任务队列数据库")
+    worker.add_argument("-w", "--workers", type=int, default=4, help="本进程并发处理的任务数（默认4）")
+    worker.add_argument("--lease", type=float, default=120, help="租约时长（秒，默认120）")
+    worker.add_argument("--poll-interval", type=float, default=5, help="没有任务时的等待间隔（秒，默认5）")
+    worker.add_argument("--exit-when-empty", action="store_true", help="队列中没有可用任务时退出")
+    worker.add_argument("--wal", action="store_true", help="使用WAL日志模式（仅限所有进程在同一台机器上）")
+    worker.add_argument("-q", "--quiet", action="store_true", help="不输出逐个文件的处理结果")
+    add_engine_arguments(worker)
+    worker.set_defaults(output_dir=None)
+
+    status = subparsers.add_parser("status", help="查看队列状态")
+    status.add_argument("db", help="任务队列数据库")
+
+    retry = subparsers.add_parser("retry", help="将失败的任务重新排队")
+    retry.add_argument("db", help="任务队列数据库")
+    return parser.parse_args(argv)
+
+
+def run_workers(args) -> int:
+    """运行工作进程"""
+    setup = prepare_engine(args)
+    if setup is None:
+        return 1
+
+    engine = OCREngine(setup["api_key"], cache=setup["cache"], **setup["engine_options"])
+    metrics = setup["metrics"]
+    metrics_server = metrics.serve(args.metrics_port) if args.metrics_port else None
+    work_queue = WorkQueue(args.db, wal=args.wal)
+    stop_event = threading.Event()
+
+    node = f"{socket.gethostname()}:{os.getpid()}"
+    workers = [QueueWorker(work_queue, engine, f"{node}:{i}", lease_seconds=args.lease,
+                           poll_interval=args.poll_interval, quiet=args.quiet)
+               for i in range(max(1, args.workers))]
+    threads = [threading.Thread(target=worker.run, args=(stop_event, args.exit_when_empty),
+                                name=f"queue-worker-{i}", daemon=True)
+               for i, worker in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    print(f"工作进程 {node} 已启动，{len(threads)} 个并发", flush=True)
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=0.5)
+    except KeyboardInterrupt:
+        print("正在停止，等待处理中的任务完成...", flush=True)
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        if metrics_server:
+            metrics_server.shutdown()
+        metrics.close()
+
+    totals = {key: sum(worker.stats[key] for worker in workers) for key in ("succeeded", "failed", "lost")}
+    print(f"成功 {totals['succeeded']} 个，失败 {totals['failed']} 个，放弃 {totals['lost']} 个")
+    return 0
+
+
+def main(argv=None) -> int:
+    """命令行入口函数"""
+    args = parse_args(argv)
+
+    if args.command == "worker":
+        return run_workers(args)
+
+    work_queue = WorkQueue(args.db, wal=getattr(args, "wal", False))
+    if args.command == "enqueue":
+        pdf_files = collect_pdf_files(args.inputs, recursive=not args.no_recursive)
+        if not pdf_files:
+            print("未找到任何PDF文件", file=sys.stderr)
+            return 1
+        output_dirs = assign_output_dirs(pdf_files, os.path.abspath(args.output_dir))
+        added = work_queue.enqueue([(str(pdf_file), output_dirs[pdf_file]) for pdf_file in pdf_files],
+                                   max_attempts=args.max_attempts)
+        print(f"已添加 {added} 个任务，跳过 {len(pdf_files) - added} 个已在队列中的文件")
+    elif args.command == "status":
+        counts = work_queue.counts()
+        print(f"等待 {counts['queued']}，处理中 {counts['leased']}，成功 {counts['succeeded']}，失败 {counts['failed']}")
+        for failure in work_queue.failures():
+            print(f"  [{failure['id']}] {failure['pdf_path']}（{failure['attempts']}次）: {failure['message']}")
+    elif args.command == "retry":
+        print(f"已重新排队 {work_queue.retry_failed()} 个任务")
+    work_queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
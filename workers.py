@@ -0,0 +1,129 @@
+import threading
+from typing import Optional
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+from ocr_cache import OCRCache
+from request_scheduler import RequestScheduler
+from search_index import SearchIndex
+
+
+class WorkerSignals(QObject):
+    """后台任务向界面线程发送的信号"""
+
+    progress = Signal(str, float)   # 状态消息, 进度(0-1)
+    finished = Signal(dict)         # 处理结果字典
+    validated = Signal(bool, str)   # 是否有效, 错误信息
+    searched = Signal(str, list)    # 搜索词, 结果列表
+
+
+class OCRWorker(QRunnable):
+    """在线程池中执行PDF OCR处理，支持取消"""
+
+    def __init__(self, api_key: str, pdf_path: str, output_dir: str, cache: Optional[OCRCache] = None,
+                 scheduler: Optional[RequestScheduler] = None, journal_dir: Optional[str] = None,
+                 search_index: Optional[SearchIndex] = None):
+        """
+        初始化OCR任务
+
+        Args:
+            api_key: Mistral API密钥
+            pdf_path: PDF文件路径
+            output_dir: 输出目录
+            cache: OCR结果缓存
+            scheduler: 各任务共享的请求调度器
+            journal_dir: 任务日志目录，程序中断后重新处理时从中断处继续
+            search_index: 全文搜索索引，处理完成后按页更新
+        """
+        super().__init__()
+        self.api_key = api_key
+        self.pdf_path = pdf_path
+        self.output_dir = output_dir
+        self.cache = cache
+        self.scheduler = scheduler
+        self.journal_dir = journal_dir
+        self.search_index = search_index
+        self.signals = WorkerSignals()
+        self.cancel_event = threading.Event()
+        # 由界面线程持有信号对象，避免任务结束后被提前回收
+        self.setAutoDelete(False)
+
+    def run(self):
+        """执行OCR处理，进度和结果通过信号发送"""
+        try:
+            # OCR引擎和mistralai在首次处理时才在后台线程中导入，不拖慢启动
+            from ocr_engine import OCREngine
+            engine = OCREngine(self.api_key, cache=self.cache, scheduler=self.scheduler,
+                               journal_dir=self.journal_dir, search_index=self.search_index)
+            result = engine.process_pdf(
+                self.pdf_path,
+                self.output_dir,
+                progress_callback=self.signals.progress.emit,
+                cancel_event=self.cancel_event
+            )
+        except Exception as e:
+            result = {
+                "success": False,
+                "message": f"处理过程中出错: {str(e)}",
+                "output_file": "",
+                "output_dir": ""
+            }
+        self.signals.finished.emit(result)
+
+    def cancel(self):
+        """请求取消：放弃等待进行中的请求并清理已写入的部分结果"""
+        self.cancel_event.set()
+
+
+class ValidateWorker(QRunnable):
+    """在线程池中验证API密钥"""
+
+    def __init__(self, api_key: str):
+        """
+        初始化验证任务
+
+        Args:
+            api_key: 待验证的Mistral API密钥
+        """
+        super().__init__()
+        self.api_key = api_key
+        self.signals = WorkerSignals()
+        self.setAutoDelete(False)
+
+    def run(self):
+        """执行验证，结果通过validated信号发送"""
+        try:
+            from ocr_engine import OCREngine
+            valid = OCREngine(self.api_key).validate_connection()
+            self.signals.validated.emit(valid, "")
+        except Exception as e:
+            self.signals.validated.emit(False, str(e))
+
+
+class SearchWorker(QRunnable):
+    """在线程池中搜索OCR结果"""
+
+    def __init__(self, search_index: SearchIndex, query: str, limit: int = 100):
+        """
+        初始化搜索任务
+
+        Args:
+            search_index: 全文搜索索引
+            query: 搜索词
+            limit: 最多返回的结果数
+        """
+        super().__init__()
+        self.search_index = search_index
+        self.query = query
+        self.limit = limit
+        self.signals = WorkerSignals()
+        self.setAutoDelete(False)
+
+    def run(self):
+        """执行搜索，结果通过searched信号发送"""
+        try:
+            results = self.search_index.search(self.query, self.limit)
+        except Exception as e:
+            print(f"搜索时出错: {e}")
+            results = []
+        self.signals.searched.emit(self.query, results)